@@ -0,0 +1,158 @@
+"""Benchmark of polling single resources through the generic routes.
+
+Without the read cache, every `GET /v1/{resource}/{id}` reads the row and its
+associations from the database, and validates and encodes them. With it, the
+encoded response is served from the cache backend, and a request whose
+`If-None-Match` matches its entity tag gets an empty 304. This compares the
+three with each backend, on resources created in the configured database and
+deleted afterwards. The Redis protocol backend runs against the in-process fake
+server of the unit tests, so its numbers include a local round trip.
+
+It then simulates several workers polling the same resources, and counts the
+database reads they make with a cache per worker, and with a shared cache.
+
+Run with `make bench`.
+"""
+import os
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+from data_api.api.generic.cache_backends import (
+    CacheBackend,
+    MemoryBackend,
+    RespBackend,
+    SharedMemoryBackend,
+)
+from data_api.api.generic.read_cache import ReadCache, read_cache
+from data_api.main import app
+from fastapi.testclient import TestClient
+from tests.unit.testutils import FakeRespServer
+
+RESOURCES = 100
+ROUNDS = 10
+WORKERS = 8
+
+
+def per_request_us(poll: Callable[[str], None], ids: List[str]) -> float:
+    started = time.perf_counter()
+
+    for _ in range(ROUNDS):
+        for resource_id in ids:
+            poll(resource_id)
+
+    return (time.perf_counter() - started) / (ROUNDS * len(ids)) * 1e6
+
+
+def database_reads(caches: List[ReadCache]) -> int:
+    """Poll every resource from every worker, round-robin, and count the misses."""
+    reads = 0
+
+    for _ in range(ROUNDS):
+        for i in range(RESOURCES):
+            for cache in caches:
+                resource_id = str(i)
+                cached, versions = cache.get("users", resource_id)
+
+                if cached is None:
+                    reads += 1
+                    cache.put("users", resource_id, b'{"id":"%s"}' % resource_id.encode(), versions)
+
+    return reads
+
+
+def empty_backends(server: FakeRespServer) -> Dict[str, Callable[[], CacheBackend]]:
+    """Get factories of empty backends, with room for twice the resources polled."""
+    path = os.path.join(tempfile.mkdtemp(), "read-cache")
+    server.data.clear()
+
+    # Each cached response takes two entries: the response and its version token.
+    return {
+        "memory": lambda: MemoryBackend(4 * RESOURCES),
+        "shared": lambda: SharedMemoryBackend(path, 4 * RESOURCES, 16384),
+        "resp": lambda: RespBackend(server.url),
+    }
+
+
+def main() -> None:
+    server = FakeRespServer().start()
+
+    with TestClient(app) as client:
+        groups = [
+            client.post("/v1/groups", json={"name": f"bench {i}"}).json()["id"] for i in range(3)
+        ]
+        ids = [
+            client.post(
+                "/v1/users",
+                json={
+                    "first_name": f"first {i}",
+                    "last_name": "last",
+                    "email": f"bench{i}@example.com",
+                    "primary_phone": "555",
+                    "groups": groups,
+                },
+            ).json()["id"]
+            for i in range(RESOURCES)
+        ]
+
+        etags = {}
+
+        def get(resource_id: str) -> None:
+            response = client.get(f"/v1/users/{resource_id}")
+            assert response.status_code == 200
+            etags[resource_id] = response.headers["etag"]
+
+        def conditional_get(resource_id: str) -> None:
+            response = client.get(
+                f"/v1/users/{resource_id}", headers={"If-None-Match": etags[resource_id]}
+            )
+            assert response.status_code == 304
+
+        backend = read_cache.backend
+        results = {}
+
+        try:
+            read_cache.backend = None
+            uncached = per_request_us(get, ids)
+
+            for name, create in empty_backends(server).items():
+                read_cache.backend = create()
+
+                for resource_id in ids:
+                    get(resource_id)
+
+                results[name] = (per_request_us(get, ids), per_request_us(conditional_get, ids))
+        finally:
+            read_cache.backend = backend
+
+            for resource_id in ids:
+                client.delete(f"/v1/users/{resource_id}")
+
+            for group_id in groups:
+                client.delete(f"/v1/groups/{group_id}")
+
+    print(f"{'GET /v1/users/{id}':<24}{'200 (us)':>12}{'304 (us)':>12}{'speedup':>10}")
+    print(f"{'database':<24}{uncached:>12.1f}{'':>12}{1:>10.1f}")
+
+    for name, (cached, not_modified) in results.items():
+        print(f"{name:<24}{cached:>12.1f}{not_modified:>12.1f}{uncached / cached:>10.1f}")
+
+    print()
+    print(f"{f'{WORKERS} workers':<24}{'database reads':>16}{'hit ratio':>12}")
+
+    # Each worker has its own backend: memory backends are separate stores, while
+    # shared memory backends map the same file and RESP backends use the same server.
+    for name, create in empty_backends(server).items():
+        caches = [ReadCache(create(), 60) for _ in range(WORKERS)]
+
+        reads = database_reads(caches)
+        hits = sum(cache.hits for cache in caches)
+        lookups = hits + sum(cache.misses for cache in caches)
+
+        print(f"{name:<24}{reads:>16}{hits / lookups:>12.2f}")
+
+    server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Benchmark of loading the database schema at application start.
+
+The schema used to be reflected from the database on import, which issues several
+queries per table, and the executioner's statements were then built for every
+table. With a schema snapshot configured, the schema is read from the snapshot
+file instead, and the statements are built in the background, along with checking
+the snapshot against a fingerprint of the schema computed by the database in a
+single query. This compares the two on a schema of 200 tables, created in a
+temporary schema of the configured database and dropped afterwards.
+
+Run with `make bench`.
+"""
+import os
+import tempfile
+import time
+from typing import Callable
+
+from data_api.core.config import settings
+from data_api.db.exc.statements import StatementCache
+from data_api.db.reflection import SchemaReflector
+from sqlalchemy import create_engine  # type: ignore
+
+TABLES = 200
+BENCH_SCHEMA = "bench_reflection"
+
+engine = create_engine(settings.sqlalchemy_database_uri)
+
+
+def create_schema() -> None:
+    with engine.begin() as conn:
+        conn.exec_driver_sql(f"DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE")
+        conn.exec_driver_sql(f"CREATE SCHEMA {BENCH_SCHEMA}")
+
+        for i in range(TABLES):
+            parent = f", parent_id uuid REFERENCES {BENCH_SCHEMA}.table_{i - 1} (id)" if i else ""
+
+            conn.exec_driver_sql(
+                f"CREATE TABLE {BENCH_SCHEMA}.table_{i} ("
+                "id uuid PRIMARY KEY, name text NOT NULL, description text, "
+                "count integer DEFAULT 0, price numeric, active boolean DEFAULT true, "
+                "created_at timestamp NOT NULL DEFAULT now(), updated_at timestamp, "
+                f"deleted_at timestamp{parent})"
+            )
+
+
+def drop_schema() -> None:
+    with engine.begin() as conn:
+        conn.exec_driver_sql(f"DROP SCHEMA {BENCH_SCHEMA} CASCADE")
+
+
+def elapsed_ms(func: Callable[[], None]) -> float:
+    started = time.perf_counter()
+    func()
+
+    return (time.perf_counter() - started) * 1e3
+
+
+def main() -> None:
+    create_schema()
+
+    # Created once the schema exists, since its default schema is detected on connect.
+    bench_engine = create_engine(
+        settings.sqlalchemy_database_uri,
+        connect_args={"options": f"-csearch_path={BENCH_SCHEMA}"},
+    )
+
+    try:
+        path = os.path.join(tempfile.mkdtemp(), "schema.pickle")
+
+        cold = SchemaReflector(bench_engine)
+
+        def reflect() -> None:
+            cold.load()
+            StatementCache().build(cold.tables.values())
+
+        reflected = elapsed_ms(reflect)
+
+        # Write the snapshot, as the first start with a snapshot path does.
+        SchemaReflector(bench_engine, path).load()
+
+        warm = SchemaReflector(bench_engine, path)
+        snapshot = elapsed_ms(warm.load)
+
+        def background() -> None:
+            StatementCache().warm(warm.tables.values())
+            warm.validate()
+
+        validated = elapsed_ms(background)
+
+        assert len(warm.tables) == TABLES
+
+        print(f"{'startup':<24}{f'{TABLES} tables (ms)':>18}{'speedup':>10}")
+        print(f"{'reflect + statements':<24}{reflected:>18.1f}{1:>10.1f}")
+        print(f"{'snapshot':<24}{snapshot:>18.1f}{reflected / snapshot:>10.1f}")
+        print(f"{'background warm-up':<24}{validated:>18.1f}")
+    finally:
+        drop_schema()
+
+
+if __name__ == "__main__":
+    main()
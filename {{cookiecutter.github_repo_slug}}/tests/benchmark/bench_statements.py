@@ -0,0 +1,102 @@
+"""Micro-benchmark of the per-request statement preparation of each CRUD path.
+
+Before a statement is executed, SQLAlchemy generates its cache key to look up
+its compiled form in the engine's compiled cache. For a statement built per
+request that means constructing the statement and walking it to generate the
+key; for a prebuilt statement from the statement cache the key is memoized on
+the statement object. This compares the two, without a database round trip.
+
+Run with `make bench`.
+"""
+import timeit
+from typing import Any, Callable, Dict
+
+from data_api.db.exc.statements import TableStatements
+from sqlalchemy import (  # type: ignore
+    Column,
+    DateTime,
+    MetaData,
+    String,
+    Table,
+    insert,
+    select,
+    tuple_,
+    update,
+)
+from sqlalchemy.sql import func  # type: ignore
+
+NUMBER = 20000
+
+table = Table(
+    "users",
+    MetaData(),
+    Column("id", String, primary_key=True),
+    Column("first_name", String),
+    Column("last_name", String),
+    Column("email", String),
+    Column("created_at", DateTime, nullable=False),
+    Column("deleted_at", DateTime),
+)
+
+statements = TableStatements(table)
+statements.build()
+
+payload = {"first_name": "a", "last_name": "b", "email": "c"}
+
+# Statements as built per request, before the statement cache.
+ad_hoc: Dict[str, Callable[[], Any]] = {
+    "read one": lambda: select(table).where(table.c.id == "x", table.c.deleted_at == None),
+    "read some": lambda: select(table).where(
+        table.c.id.in_(["x", "y"]), table.c.deleted_at == None
+    ),
+    "read page": lambda: (
+        select(table)
+        .where(table.c.deleted_at == None)
+        .where(tuple_(table.c.created_at, table.c.id) > tuple_("2022-01-01", "x"))
+        .order_by(table.c.created_at, table.c.id)
+        .limit(101)
+    ),
+    "create": lambda: insert(table).values(payload).returning(table),
+    "update": lambda: (
+        update(table)
+        .where(table.c.id == "x", table.c.deleted_at == None)
+        .values(payload)
+        .returning(table)
+    ),
+    "delete": lambda: (
+        update(table)
+        .where(table.c.id == "x", table.c.deleted_at == None)
+        .values(deleted_at=func.current_timestamp())
+        .returning(table)
+    ),
+}
+
+prebuilt: Dict[str, Callable[[], Any]] = {
+    "read one": lambda: statements.select_by_id,
+    "read some": lambda: statements.select_by_ids,
+    "read page": lambda: statements.page(101, ["2022-01-01", "x"])[0],
+    "create": lambda: statements.insert,
+    "update": lambda: statements.update_by_id,
+    "delete": lambda: statements.delete_by_id,
+}
+
+
+def per_request_us(build: Callable[[], Any]) -> float:
+    """Get the CPU time to prepare a statement for execution, in microseconds."""
+    seconds = min(timeit.repeat(lambda: build()._generate_cache_key(), number=NUMBER, repeat=5))
+
+    return seconds / NUMBER * 1e6
+
+
+def main() -> None:
+    print(f"{'path':<12}{'ad hoc (us)':>14}{'prebuilt (us)':>16}{'saved (us)':>14}")
+
+    for path, build in ad_hoc.items():
+        before = per_request_us(build)
+        after = per_request_us(prebuilt[path])
+
+        print(f"{path:<12}{before:>14.2f}{after:>16.2f}{before - after:>14.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+import socket
+import threading
+from unittest import mock
+
+import pytest
+import testutils  # tests/unit/testutils.py
+from data_api.api.generic.cache_backends import (
+    CacheBackend,
+    MemoryBackend,
+    RespBackend,
+    RespError,
+    SharedMemoryBackend,
+)
+
+
+@pytest.fixture()
+def resp_server():
+    with testutils.FakeRespServer(password="secret") as server:
+        yield server
+
+
+@pytest.fixture(params=["memory", "shared", "resp"])
+def backend(request, tmp_path, resp_server):
+    if request.param == "memory":
+        backend = MemoryBackend(100)
+    elif request.param == "shared":
+        backend = SharedMemoryBackend(str(tmp_path / "cache"), 100, 256)
+    else:
+        backend = RespBackend(resp_server.url)
+
+    yield backend
+
+    backend.close()
+
+
+def test_get_set_delete(backend) -> None:
+    """Values are set, got and deleted several at a time."""
+
+    backend.set_many({"a": b"1", "b": b"2\r\n"}, 60)
+
+    assert backend.get_many(["a", "b", "c"]) == [b"1", b"2\r\n", None]
+
+    backend.set_many({"a": b"3", "c": b"4"}, None, only_new=True)
+    backend.delete(["b"])
+
+    assert backend.get_many(["a", "b", "c"]) == [b"1", None, b"4"]
+
+
+def test_ttl(backend) -> None:
+    """Values are not returned once they expire."""
+
+    backend.set_many({"a": b"1"}, 0.001)
+
+    threading.Event().wait(0.01)
+
+    assert backend.get_many(["a"]) == [None]
+
+    backend.set_many({"a": b"2"}, 60, only_new=True)
+
+    assert backend.get_many(["a"]) == [b"2"]
+
+
+def test_memory_lru() -> None:
+    """The least recently used values are evicted beyond the maximum size."""
+
+    backend = MemoryBackend(2)
+    backend.set_many({"a": b"1", "b": b"2"}, None)
+    backend.get_many(["a"])
+    backend.set_many({"c": b"3"}, None)
+
+    assert backend.get_many(["a", "b", "c"]) == [b"1", None, b"3"]
+
+
+def test_shared_between_processes(tmp_path) -> None:
+    """Backends on the same file see each other's values, as the workers of a host do."""
+
+    path = str(tmp_path / "cache")
+    one, other = SharedMemoryBackend(path, 100, 256), SharedMemoryBackend(path, 100, 256)
+
+    one.set_many({"a": b"1"}, 60)
+    assert other.get_many(["a"]) == [b"1"]
+
+    other.delete(["a"])
+    assert one.get_many(["a"]) == [None]
+
+    # A backend laid out differently has a file of its own.
+    one.set_many({"a": b"1"}, 60)
+    resized = SharedMemoryBackend(path, 200, 256)
+    resized.set_many({"b": b"2"}, 60)
+
+    assert resized.path != one.path
+    assert resized.get_many(["a", "b"]) == [None, b"2"]
+    assert one.get_many(["a", "b"]) == [b"1", None]
+
+
+def test_shared_foreign_file(tmp_path) -> None:
+    """A file which is not laid out as expected is never reset, as other processes may
+    have it mapped."""
+
+    backend = SharedMemoryBackend(str(tmp_path / "cache"), 100, 256)
+
+    with open(backend.path, "wb") as f:
+        f.write(b"not a cache")
+
+    with pytest.raises(ValueError, match="not a read cache file"):
+        backend.get_many(["a"])
+
+    with open(backend.path, "rb") as f:
+        assert f.read() == b"not a cache"
+
+
+def test_backend_is_abstract() -> None:
+    """A backend must define how keys are got, set and deleted."""
+
+    with pytest.raises(TypeError, match="delete, get_many, set_many"):
+        CacheBackend()  # type: ignore
+
+
+def test_shared_eviction(tmp_path) -> None:
+    """A full set evicts the value which expires first, and values which do not fit
+    in a slot are not stored."""
+
+    backend = SharedMemoryBackend(str(tmp_path / "cache"), SharedMemoryBackend.WAYS, 64)
+    others = {str(i): b"%d" % i for i in range(backend.WAYS - 1)}
+
+    backend.set_many({"a": b"a"}, 10)
+    backend.set_many(others, 60)
+    backend.set_many({"b": b"b"}, 60)
+
+    assert backend.get_many(["a", "b", *others]) == [None, b"b", *others.values()]
+
+    backend.set_many({"b": b"x" * 64}, 60)
+
+    assert backend.get_many(["b"]) == [None]
+
+
+def test_resp_commands(resp_server) -> None:
+    """Each operation is a single pipelined round trip, after authenticating."""
+
+    backend = RespBackend(resp_server.url)
+
+    backend.set_many({"a": b"1", "b": b"2"}, 1.5, only_new=True)
+    backend.get_many(["a", "b"])
+
+    assert resp_server.commands == [
+        [b"SELECT", b"1"],
+        [b"SET", b"a", b"1", b"PX", b"1500", b"NX"],
+        [b"SET", b"b", b"2", b"PX", b"1500", b"NX"],
+        [b"MGET", b"a", b"b"],
+    ]
+
+
+def test_resp_errors(resp_server) -> None:
+    """Error replies are raised, and failed connections are opened again."""
+
+    with pytest.raises(RespError, match="WRONGPASS"):
+        RespBackend(resp_server.url.replace("secret", "wrong")).get_many(["a"])
+
+    backend = RespBackend(resp_server.url)
+
+    with pytest.raises(RespError, match="unknown command"):
+        backend.execute([("NOPE",)])
+
+    with mock.patch.object(socket.socket, "sendall", side_effect=ConnectionResetError):
+        with pytest.raises(ConnectionResetError):
+            backend.get_many(["a"])
+
+    assert backend.get_many(["a"]) == [None]
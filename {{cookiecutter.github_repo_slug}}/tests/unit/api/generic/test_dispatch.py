@@ -0,0 +1,80 @@
+from typing import Iterator
+
+import pytest
+from data_api.api.generic.dispatch import ResourceDispatcher
+from data_api.db.reflection import SchemaGeneration, schema_generation
+from fastapi import HTTPException
+from sqlalchemy import Column, DateTime, MetaData, String, Table  # type: ignore
+
+metadata = MetaData()
+
+users_groups = Table(
+    "users_groups",
+    metadata,
+    Column("id", String, primary_key=True),
+    Column("deleted_at", DateTime),
+)
+operations = Table("operations", metadata, Column("id", String, primary_key=True))
+
+
+@pytest.fixture()
+def dispatcher() -> Iterator[ResourceDispatcher]:
+    """Get a dispatcher, with the test tables pinned as the schema."""
+
+    token = schema_generation.set(SchemaGeneration(1, "test", metadata))
+
+    yield ResourceDispatcher()
+
+    schema_generation.reset(token)
+
+
+@pytest.mark.parametrize(
+    "path,resource_id",
+    [
+        ("users-groups", None),
+        ("users-groups/", None),
+        ("users-groups/abc", "abc"),
+        ("users-groups/abc/", "abc"),
+    ],
+)
+def test_resolve(dispatcher: ResourceDispatcher, path: str, resource_id) -> None:
+    """Paths resolve to the resource of their hyphenated name, and the rest of the path."""
+
+    resource, rest = dispatcher.resolve(path)
+
+    assert resource.table is users_groups
+    assert resource.soft_delete
+    assert rest == resource_id
+
+
+@pytest.mark.parametrize("path", ["", "users_groups", "users-groups-x/abc", "nope"])
+def test_resolve_unknown(dispatcher: ResourceDispatcher, path: str) -> None:
+    """Unknown resources are rejected with a 404."""
+
+    with pytest.raises(HTTPException) as exc_info:
+        dispatcher.resolve(path)
+
+    assert exc_info.value.status_code == 404
+
+
+def test_operations_unrestricted(dispatcher: ResourceDispatcher) -> None:
+    """The operations table can always be operated on."""
+
+    assert dispatcher.get("operations").permits("delete_op")
+
+
+def test_generations(dispatcher: ResourceDispatcher) -> None:
+    """Each schema generation is resolved against the resources of its own tables."""
+
+    assert dispatcher.get("users-groups").table is users_groups
+
+    reloaded = users_groups.to_metadata(MetaData())
+    token = schema_generation.set(SchemaGeneration(2, "reloaded", reloaded.metadata))
+
+    try:
+        assert dispatcher.get("users-groups").table is reloaded
+        assert dispatcher.get("operations") is None
+    finally:
+        schema_generation.reset(token)
+
+    assert dispatcher.get("users-groups").table is users_groups
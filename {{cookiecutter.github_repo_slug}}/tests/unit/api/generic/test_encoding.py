@@ -0,0 +1,69 @@
+import uuid
+from decimal import Decimal
+from typing import Optional
+
+import pytest
+from data_api.api.generic import encoding
+from pydantic import BaseModel, ValidationError
+
+
+class Thing(BaseModel):
+    id: uuid.UUID
+    name: str
+    price: Optional[Decimal]
+
+
+ID = uuid.UUID("c2f4a1f8-1b0b-4c3e-9a57-6d4f0f3d2b1a")
+
+
+def test_encode() -> None:
+    """Models and types orjson does not support are encoded as FastAPI encodes them."""
+
+    content = [Thing(id=ID, name="a", price=Decimal("1.5")), {"id": ID, "price": Decimal("2")}]
+
+    assert encoding.encode(content) == (
+        b'[{"id":"c2f4a1f8-1b0b-4c3e-9a57-6d4f0f3d2b1a","name":"a","price":1.5},'
+        b'{"id":"c2f4a1f8-1b0b-4c3e-9a57-6d4f0f3d2b1a","price":2}]'
+    )
+
+
+def test_encode_ndjson() -> None:
+    """Rows are encoded one per line."""
+
+    assert encoding.encode_ndjson([{"a": 1}, {"a": 2}]) == b'{"a":1}\n{"a":2}\n'
+
+
+def test_validate_strict(monkeypatch) -> None:
+    """Every row is validated into its model."""
+
+    monkeypatch.setattr(encoding.settings, "response_validation", "strict")
+
+    validated = encoding.validate_rows(Thing, [{"id": str(ID), "name": "a", "price": None}])
+    assert validated == [Thing(id=ID, name="a", price=None)]
+
+    with pytest.raises(ValidationError):
+        encoding.validate_row(Thing, {"id": "nope", "name": "a"})
+
+
+def test_validate_sampled(monkeypatch) -> None:
+    """One in every sample rate rows is validated, and the rows are returned as is."""
+
+    monkeypatch.setattr(encoding.settings, "response_validation", "sampled")
+    monkeypatch.setattr(encoding.settings, "response_validation_sample_rate", 2)
+    monkeypatch.setattr(encoding, "_sampled", iter(range(4)))
+
+    rows = [{"id": str(ID), "name": "a"}, {"id": "nope", "name": "b"}]
+    assert encoding.validate_rows(Thing, rows) == rows
+
+    with pytest.raises(ValidationError):
+        encoding.validate_rows(Thing, list(reversed(rows)))
+
+
+def test_validate_off(monkeypatch) -> None:
+    """No rows are validated."""
+
+    monkeypatch.setattr(encoding.settings, "response_validation", "off")
+
+    rows = [{"id": "nope"}]
+    assert encoding.validate_rows(Thing, rows) == rows
+    assert encoding.validate_row(Thing, rows[0]) is rows[0]
@@ -0,0 +1,239 @@
+from typing import Any, AsyncIterator, Dict, Iterator, List
+from unittest import mock
+
+import pytest
+from data_api.api.generic import generic_routes
+from data_api.db.exc import async_executioner, executioner
+from fastapi import HTTPException, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+
+class Thing(BaseModel):
+    id: str
+
+
+def get_request(query: bytes = b"", accept: str = "application/json") -> Request:
+    """Get a request for the things collection."""
+
+    return Request(
+        {
+            "type": "http",
+            "method": "GET",
+            "scheme": "http",
+            "server": ("test", 80),
+            "root_path": "",
+            "path": "/v1/things",
+            "query_string": query,
+            "headers": [(b"accept", accept.encode())],
+        }
+    )
+
+
+@pytest.fixture()
+def things() -> Iterator[None]:
+    """Resolve every path to the things collection, on which every operation is permitted."""
+
+    resource = mock.Mock(table_name="things", schema_models={"ModelReturn": Thing})
+
+    with mock.patch.object(
+        generic_routes.dispatcher, "resolve", return_value=(resource, None)
+    ), mock.patch.object(generic_routes, "check_operation", mock.AsyncMock()):
+        yield
+
+
+async def get_things(request: Request, **params: Any) -> Any:
+    params = {"limit": None, "cursor": None, "stream": False, **params}
+
+    return await generic_routes.get_resources(request, "things", None, db=None, **params)
+
+
+@pytest.mark.asyncio
+async def test_execute_sync() -> None:
+    """In the sync execution mode, the executioner command is called directly."""
+
+    with mock.patch.object(executioner, "get_resource", return_value={"id": "x"}) as command:
+        result = await generic_routes.execute(executioner.get_resource, "x", "things", "db")
+
+    assert result == {"id": "x"}
+    command.assert_called_once_with("x", "things", "db")
+
+
+@pytest.mark.asyncio
+async def test_execute_async() -> None:
+    """In the async execution mode, the async twin of the command is awaited."""
+
+    twin = mock.AsyncMock(return_value={"id": "x"})
+
+    with mock.patch.object(generic_routes.settings, "db_execution_mode", "async"), mock.patch(
+        "data_api.db.exc.async_executioner.get_resource", twin
+    ):
+        result = await generic_routes.execute(executioner.get_resource, "x", "things", "db")
+
+    assert result == {"id": "x"}
+    twin.assert_awaited_once_with("x", "things", "db")
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("loaded", [True, False])
+async def test_check_operation(loaded: bool) -> None:
+    """Catalogs are reloaded through the executioner before the operation is checked."""
+
+    resource = mock.Mock(table_name="things")
+
+    with mock.patch.object(
+        generic_routes, "operations_catalog", mock.Mock(loaded=loaded)
+    ), mock.patch.object(
+        generic_routes, "relationship_catalog", mock.Mock(loaded=True)
+    ), mock.patch.object(
+        generic_routes, "execute", mock.AsyncMock()
+    ) as execute:
+        await generic_routes.check_operation(resource, "read_op", "db")
+
+        resource.permits.return_value = False
+
+        with pytest.raises(NotImplementedError):
+            await generic_routes.check_operation(resource, "read_op", "db")
+
+    if loaded:
+        execute.assert_not_awaited()
+    else:
+        execute.assert_awaited_with(executioner.load_catalogs, "db")
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "request_params",
+    [
+        {"request": get_request(b"stream=true"), "stream": True},
+        {"request": get_request(accept="application/x-ndjson")},
+    ],
+)
+async def test_get_resources_stream(things, request_params: Dict[str, Any]) -> None:
+    """Collections are streamed on request, in the execution mode configured."""
+
+    with mock.patch.object(generic_routes, "stream_ndjson") as stream_ndjson:
+        response = await get_things(**request_params)
+
+    assert isinstance(response, StreamingResponse)
+    assert response.media_type == "application/x-ndjson"
+    stream_ndjson.assert_called_once_with("things", Thing)
+
+    with mock.patch.object(
+        generic_routes.settings, "db_execution_mode", "async"
+    ), mock.patch.object(generic_routes, "stream_ndjson_async") as stream_ndjson_async:
+        await get_things(**request_params)
+
+    stream_ndjson_async.assert_called_once_with("things", Thing)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("params", [{"limit": 10}, {"cursor": "abc"}])
+async def test_get_resources_stream_paginated(things, params: Dict[str, Any]) -> None:
+    """Streamed collections can not be paginated."""
+
+    with pytest.raises(HTTPException) as exc_info:
+        await get_things(get_request(b"stream=true"), stream=True, **params)
+
+    assert exc_info.value.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_get_resources_page(things) -> None:
+    """Collections are not streamed unless requested."""
+
+    with mock.patch.object(
+        generic_routes, "execute", mock.AsyncMock(return_value=([{"id": "a"}], None))
+    ) as execute:
+        response = await get_things(get_request())
+
+    assert response.body == b'[{"id":"a"}]'
+    assert execute.await_args.args[0] is executioner.get_resources
+
+
+def batches() -> List[List[Dict[str, str]]]:
+    return [[{"id": "a"}, {"id": "b"}], [{"id": "c"}]]
+
+
+@pytest.mark.asyncio
+async def test_stream_ndjson() -> None:
+    """Each batch of resources is read on the database worker pool, and validated and
+    written as a chunk."""
+
+    run = mock.AsyncMock(side_effect=lambda func, *args: func(*args))
+
+    with mock.patch.object(
+        executioner, "stream_resources", return_value=(batch for batch in batches())
+    ), mock.patch.object(generic_routes.db_workers, "run", run):
+        chunks = [chunk async for chunk in generic_routes.stream_ndjson("things", Thing)]
+
+    assert chunks == [b'{"id":"a"}\n{"id":"b"}\n', b'{"id":"c"}\n']
+    assert run.await_count == 3
+
+
+@pytest.mark.asyncio
+async def test_stream_ndjson_closed() -> None:
+    """The stream of resources, and so its session, is closed when the client goes away
+    before the stream ends."""
+
+    closed = []
+
+    def stream_resources(resource_table_name: str) -> Iterator[List[Dict[str, str]]]:
+        try:
+            yield from batches()
+        finally:
+            closed.append(resource_table_name)
+
+    with mock.patch.object(executioner, "stream_resources", stream_resources):
+        chunks = generic_routes.stream_ndjson("things", Thing)
+
+        assert await chunks.__anext__() == b'{"id":"a"}\n{"id":"b"}\n'
+
+        await chunks.aclose()
+
+    assert closed == ["things"]
+
+
+@pytest.mark.asyncio
+async def test_stream_ndjson_async() -> None:
+    """Each batch of resources is validated and written as a chunk, in the async
+    execution mode."""
+
+    async def stream_resources(resource_table_name: str) -> AsyncIterator[List[Dict[str, str]]]:
+        for batch in batches():
+            yield batch
+
+    with mock.patch.object(async_executioner, "stream_resources", stream_resources):
+        chunks = [chunk async for chunk in generic_routes.stream_ndjson_async("things", Thing)]
+
+    assert chunks == [b'{"id":"a"}\n{"id":"b"}\n', b'{"id":"c"}\n']
+
+
+def test_validate_bulk_payload() -> None:
+    """Every item of a bulk payload is validated, and errors are located by item."""
+
+    assert generic_routes.validate_bulk_payload([{"id": "a"}, {"id": "b"}], Thing) == [
+        Thing(id="a"),
+        Thing(id="b"),
+    ]
+
+    with pytest.raises(RequestValidationError) as exc_info:
+        generic_routes.validate_bulk_payload([{"id": "a"}, {}, {"id": None}], Thing)
+
+    assert [error["loc"] for error in exc_info.value.errors()] == [
+        ("body", 1, "id"),
+        ("body", 2, "id"),
+    ]
+
+
+@pytest.mark.parametrize("size", [0, 3])
+def test_validate_bulk_payload_size(size: int) -> None:
+    """Bulk payloads must have at least one item, and at most the maximum bulk size."""
+
+    with mock.patch.object(generic_routes.settings, "max_bulk_size", 2), pytest.raises(
+        HTTPException
+    ) as exc_info:
+        generic_routes.validate_bulk_payload([{"id": "a"}] * size, Thing)
+
+    assert exc_info.value.status_code == 400
@@ -0,0 +1,148 @@
+from unittest import mock
+
+import pytest
+import testutils  # tests/unit/testutils.py
+from data_api.api.generic import read_cache as read_cache_module
+from data_api.api.generic.cache_backends import MemoryBackend, RespBackend
+from data_api.api.generic.read_cache import ReadCache, etag_matches, make_etag
+from data_api.db.invalidation import Invalidation
+
+
+@pytest.fixture()
+def cache():
+    return ReadCache(MemoryBackend(100), 60)
+
+
+def fill(cache, *keys) -> None:
+    for table_name, resource_id in keys:
+        _, versions = cache.get(table_name, resource_id)
+        cache.put(table_name, resource_id, b'{"id":"' + resource_id.encode() + b'"}', versions)
+
+
+def cached(cache, *keys):
+    return [key for key in keys if cache.get(*key)[0] is not None]
+
+
+def test_etag_matches() -> None:
+    """If-None-Match matches the tag, any tag, or the tag in a list, weakly or not."""
+
+    etag = make_etag(b'{"id":"x"}')
+
+    assert etag == make_etag(b'{"id":"x"}')
+    assert etag != make_etag(b'{"id":"y"}')
+
+    assert etag_matches(etag, etag)
+    assert etag_matches(etag, "*")
+    assert etag_matches(etag, f'"other", W/{etag}')
+    assert not etag_matches(etag, '"other"')
+    assert not etag_matches(etag, None)
+
+
+def test_get_put(cache) -> None:
+    """A stored response is served with its entity tag, and counted as a hit."""
+
+    assert cache.get("things", "x")[0] is None
+
+    fill(cache, ("things", "x"))
+    response, versions = cache.get("things", "x")
+
+    assert response.body == b'{"id":"x"}'
+    assert response.etag == make_etag(b'{"id":"x"}')
+    assert versions is None
+    assert (cache.hits, cache.misses) == (1, 2)
+    assert cache.hit_ratio == 1 / 3
+
+
+def test_disabled() -> None:
+    """Nothing is cached without a backend."""
+
+    cache = ReadCache(None, 60)
+    fill(cache, ("things", "x"))
+
+    assert cache.put("things", "x", b"{}", None).etag == make_etag(b"{}")
+    assert cached(cache, ("things", "x")) == []
+
+
+def test_put_after_invalidate(cache) -> None:
+    """A read which raced with a write is not served, since it may be stale."""
+
+    _, versions = cache.get("things", "x")
+    cache.invalidate("things", ["x"])
+    cache.put("things", "x", b"{}", versions)
+
+    assert cached(cache, ("things", "x")) == []
+
+
+def test_evicted_version(cache) -> None:
+    """Entries are not served once the version they were stored under is evicted."""
+
+    fill(cache, ("things", "x"))
+    cache.backend.delete(["rc:v:things"])
+
+    assert cached(cache, ("things", "x")) == []
+
+
+def test_apply(cache) -> None:
+    """Invalidations invalidate the resources and tables they name, or everything."""
+
+    keys = [("users", "u1"), ("users", "u2"), ("groups", "g1"), ("posts", "p1")]
+    fill(cache, *keys)
+
+    cache.apply(Invalidation("users", {"users": ["u1"]}, ["groups"]), False)
+
+    assert cached(cache, *keys) == [("users", "u2"), ("posts", "p1")]
+
+    cache.apply(Invalidation("relationships", everything=True), False)
+
+    assert cached(cache, *keys) == []
+
+
+def test_apply_remote(cache) -> None:
+    """Invalidations of other processes are only applied to a backend of this process."""
+
+    with testutils.FakeRespServer() as server:
+        shared = ReadCache(RespBackend(server.url), 60)
+
+        for read_cache in (cache, shared):
+            fill(read_cache, ("users", "u1"))
+            read_cache.apply(Invalidation("users", {"users": ["u1"]}), True)
+
+        assert cached(cache, ("users", "u1")) == []
+        assert cached(shared, ("users", "u1")) == [("users", "u1")]
+
+
+def test_shared_invalidation() -> None:
+    """Workers sharing a backend see each other's responses and invalidations."""
+
+    with testutils.FakeRespServer() as server:
+        one = ReadCache(RespBackend(server.url), 60)
+        other = ReadCache(RespBackend(server.url), 60)
+
+        fill(one, ("users", "u1"), ("groups", "g1"))
+
+        assert cached(other, ("users", "u1"), ("groups", "g1")) == [
+            ("users", "u1"),
+            ("groups", "g1"),
+        ]
+
+        other.apply(Invalidation("users", {"users": ["u1"], "groups": ["g1"]}), False)
+
+        assert cached(one, ("users", "u1"), ("groups", "g1")) == []
+
+
+def test_backend_failure() -> None:
+    """Reads fall back to the database when the backend fails, and failures are counted."""
+
+    cache = ReadCache(RespBackend("redis://127.0.0.1:1", timeout=0.1), 60)
+
+    with mock.patch.object(read_cache_module, "READ_CACHE_ERRORS_TOTAL") as errors:
+        assert cache.get("things", "x") == (None, None)
+        assert cache.put("things", "x", b"{}", b"a\nb\nc\n").etag == make_etag(b"{}")
+
+        cache.invalidate("things", ["x"])
+
+    assert [c.args for c in errors.labels.call_args_list] == [
+        ("resp", "get"),
+        ("resp", "put"),
+        ("resp", "invalidate"),
+    ]
@@ -1,3 +1,6 @@
+from unittest import mock
+
+import pytest
 from data_api.api import depends
 from sqlalchemy.orm import Session
 
@@ -7,3 +10,12 @@ def test_get_db():
 
     sess = next(depends.get_db())
     assert isinstance(sess, Session)
+
+
+@pytest.mark.asyncio
+async def test_get_async_db_not_configured():
+    """An asyncio session can not be got outside of the async execution mode."""
+
+    with mock.patch.object(depends, "AsyncSessionLocal", None):
+        with pytest.raises(RuntimeError, match="async execution mode"):
+            await depends.get_async_db().__anext__()
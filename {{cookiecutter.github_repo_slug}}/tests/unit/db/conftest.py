@@ -0,0 +1,86 @@
+from unittest import mock
+
+import pytest
+from data_api.db.exc import catalog, executioner
+from sqlalchemy import Column, DateTime, MetaData, String, Table  # type: ignore
+
+
+class FakeRow(dict):
+    """A dict which quacks like an sqlalchemy row for `dict_from_row`."""
+
+    @property
+    def _fields(self):
+        return tuple(self.keys())
+
+
+def relationship_row(primary, secondary, alias=None, associative=None) -> FakeRow:
+    return FakeRow(
+        id=f"{primary}-{secondary}",
+        primary_table_name=primary,
+        secondary_table_name=secondary,
+        primary_table_alias=alias,
+        associative_table_name=associative,
+    )
+
+
+@pytest.fixture()
+def schema():
+    """Serve the executioner a schema of users, which are in groups (many to many),
+    write posts (one to many, on the aliased `author_id`) and have notes (one to
+    many, on `users_id`).
+
+    Yields:
+        The tables of the schema, by name.
+    """
+
+    metadata = MetaData()
+
+    Table(
+        "users",
+        metadata,
+        Column("id", String, primary_key=True),
+        Column("name", String),
+        Column("created_at", DateTime, nullable=False),
+        Column("deleted_at", DateTime),
+    )
+    Table("groups", metadata, Column("id", String, primary_key=True), Column("name", String))
+    Table("users_groups", metadata, Column("users_id", String), Column("groups_id", String))
+    Table(
+        "posts",
+        metadata,
+        Column("id", String, primary_key=True),
+        Column("author_id", String),
+        Column("deleted_at", DateTime),
+    )
+    Table("notes", metadata, Column("id", String, primary_key=True), Column("users_id", String))
+    Table(
+        "relationships",
+        metadata,
+        *(
+            Column(name, String)
+            for name in (
+                "id",
+                "primary_table_name",
+                "secondary_table_name",
+                "primary_table_alias",
+                "associative_table_name",
+            )
+        ),
+    )
+
+    db = mock.Mock()
+    db.execute.return_value.fetchall.return_value = [
+        relationship_row("users", "groups", associative="users_groups"),
+        relationship_row("users", "posts", alias="author_id"),
+        relationship_row("users", "notes"),
+    ]
+
+    relationships = catalog.RelationshipCatalog()
+
+    with mock.patch.object(catalog, "table_from_name", metadata.tables.get):
+        relationships.load(db)
+
+    with mock.patch.object(executioner, "table_from_name", metadata.tables.get), mock.patch.object(
+        executioner, "relationship_catalog", relationships
+    ):
+        yield metadata.tables
@@ -0,0 +1,70 @@
+import threading
+from datetime import datetime
+from unittest import mock
+
+import pytest
+import testutils  # tests/unit/testutils.py
+from data_api.db.exc import async_executioner, executioner
+
+
+@pytest.mark.asyncio
+async def test_stream_resources(schema) -> None:
+    """Collections are streamed in batches of the stream batch size, with the
+    associations of each batch read with it."""
+
+    rows = [(f"u{i}", None, datetime(2022, 1, i), None) for i in range(1, 4)]
+    db = testutils.FakeSession({"FROM users \n": rows, "FROM users_groups": [("u3", "g1")]})
+
+    with mock.patch.object(
+        async_executioner, "AsyncSessionLocal", return_value=testutils.FakeAsyncSession(db)
+    ), mock.patch.object(async_executioner, "table_from_name", executioner.table_from_name):
+        batches = [batch async for batch in async_executioner.stream_resources("users", 2)]
+
+    assert [[resource["id"] for resource in batch] for batch in batches] == [["u1", "u2"], ["u3"]]
+    assert batches[1][0]["groups"] == ["g1"]
+
+    owner_ids = [params["_owner_ids"] for sql, params in db.statements if "users_groups" in sql]
+    assert owner_ids == [["u1", "u2"], ["u3"]]
+
+
+@pytest.mark.asyncio
+async def test_load_catalogs() -> None:
+    """Catalogs are loaded on the sync side of the async session."""
+
+    db = testutils.FakeAsyncSession(testutils.FakeSession())
+
+    with mock.patch.object(executioner, "load_catalogs") as load_catalogs:
+        await async_executioner.load_catalogs(db)
+
+    load_catalogs.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_run_write() -> None:
+    """The invalidations of a write are published off the event loop, once it returns."""
+
+    db = testutils.FakeAsyncSession(testutils.FakeSession())
+    published = []
+
+    def command(session: testutils.FakeSession) -> str:
+        session.info[executioner.PENDING_INVALIDATIONS].append("invalidation")
+        return "written"
+
+    def publish(invalidation: str) -> None:
+        published.append((invalidation, threading.current_thread()))
+
+    with mock.patch.object(async_executioner.invalidation_bus, "publish", publish):
+        assert await async_executioner.run_write(db, command) == "written"
+
+    assert [invalidation for invalidation, _ in published] == ["invalidation"]
+    assert published[0][1] is not threading.current_thread()
+    assert db.info == {}
+
+
+@pytest.mark.asyncio
+async def test_stream_resources_not_configured() -> None:
+    """Collections can not be streamed outside of the async execution mode."""
+
+    with mock.patch.object(async_executioner, "AsyncSessionLocal", None):
+        with pytest.raises(RuntimeError, match="async execution mode"):
+            await async_executioner.stream_resources("users").__anext__()
@@ -0,0 +1,126 @@
+from unittest import mock
+
+import pytest
+from data_api.db.exc import catalog
+
+
+class FakeRow(dict):
+    """A dict which quacks like an sqlalchemy row for `dict_from_row`."""
+
+    @property
+    def _fields(self):
+        return tuple(self.keys())
+
+
+def relationship_row(primary, secondary, alias=None, associative=None) -> FakeRow:
+    return FakeRow(
+        id=f"{primary}-{secondary}",
+        primary_table_name=primary,
+        secondary_table_name=secondary,
+        primary_table_alias=alias,
+        associative_table_name=associative,
+    )
+
+
+def fake_db(*rows) -> mock.Mock:
+    db = mock.Mock()
+    db.execute.return_value.fetchall.return_value = list(rows)
+    return db
+
+
+def test_relationships_for_table() -> None:
+    """A table sees its own relationships and the many to many relationships it is part of."""
+
+    db = fake_db(
+        relationship_row("users", "groups", associative="users_groups"),
+        relationship_row("users", "notes"),
+        relationship_row("teams", "users"),
+    )
+
+    c = catalog.RelationshipCatalog()
+
+    assert [r["id"] for r in c.for_table("users", db)] == ["users-groups", "users-notes"]
+    assert [r["id"] for r in c.for_table("groups", db)] == ["users-groups"]
+    assert [r["id"] for r in c.for_table("teams", db)] == ["teams-users"]
+    assert c.for_table("notes", db) == []
+
+    # The catalog is only loaded once.
+    db.execute.assert_called_once()
+
+
+def test_relationships_between() -> None:
+    """A relationship is found from either direction."""
+
+    db = fake_db(relationship_row("users", "groups", associative="users_groups"))
+
+    c = catalog.RelationshipCatalog()
+
+    assert c.between("users", "groups", db)["id"] == "users-groups"
+    assert c.between("groups", "users", db)["id"] == "users-groups"
+    assert c.between("users", "notes", db) is None
+    assert c.for_associative_table("users_groups", db)["id"] == "users-groups"
+
+
+def test_relationships_invalidate() -> None:
+    """An invalidated catalog reloads on the next lookup."""
+
+    db = fake_db(relationship_row("users", "groups", associative="users_groups"))
+
+    c = catalog.RelationshipCatalog()
+    c.load(db)
+    assert c.loaded
+
+    c.invalidate()
+    assert not c.loaded
+
+    db.execute.return_value.fetchall.return_value = []
+    assert c.for_table("users", db) == []
+    assert db.execute.call_count == 2
+
+
+def test_catalog_peek() -> None:
+    """Peeking serves the current snapshot, even an expired one, without loading it."""
+
+    db = fake_db(FakeRow(table_name="users", read_op=True))
+
+    c = catalog.OperationsCatalog(ttl=0)
+    assert c.peek() is None
+
+    c.load(db)
+    assert not c.loaded
+    assert c.peek() == {"users": {"table_name": "users", "read_op": True}}
+
+    c.invalidate()
+    assert c.peek() is None
+    db.execute.assert_called_once()
+
+
+def test_operations_for_table() -> None:
+    """Operations are served by table name, with an empty dict for unknown tables."""
+
+    db = fake_db(FakeRow(table_name="users", read_op=True, create_op=False))
+
+    c = catalog.OperationsCatalog(ttl=60)
+
+    assert c.for_table("users", db)["read_op"]
+    assert c.for_table("groups", db) == {}
+    db.execute.assert_called_once()
+
+
+def test_operations_ttl() -> None:
+    """An expired operations catalog reloads on the next lookup."""
+
+    db = fake_db(FakeRow(table_name="users", read_op=True))
+
+    c = catalog.OperationsCatalog(ttl=0)
+
+    c.for_table("users", db)
+    c.for_table("users", db)
+    assert db.execute.call_count == 2
+
+
+def test_catalog_is_abstract() -> None:
+    """A catalog must define how the rows of its table are indexed."""
+
+    with pytest.raises(TypeError, match="build_index"):
+        catalog.Catalog()  # type: ignore
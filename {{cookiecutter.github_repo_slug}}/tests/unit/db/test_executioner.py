@@ -0,0 +1,452 @@
+import base64
+import json
+from datetime import datetime
+from typing import List
+from unittest import mock
+
+import pytest
+import testutils  # tests/unit/testutils.py
+from data_api.db.exc import executioner
+from data_api.db.exc.statements import keyset_columns
+from fastapi.exceptions import HTTPException
+from pydantic import BaseModel
+from sqlalchemy import Column, DateTime, MetaData, String, Table  # type: ignore
+from sqlalchemy.dialects.postgresql import UUID  # type: ignore
+
+
+@pytest.fixture()
+def keyset_table() -> Table:
+    """Get a table paginated on (created_at, id)."""
+
+    return Table(
+        "things",
+        MetaData(),
+        Column("id", String, primary_key=True),
+        Column("created_at", DateTime, nullable=False),
+    )
+
+
+def test_cursor_roundtrip(keyset_table: Table) -> None:
+    """A cursor decodes back to the keyset values it was encoded from."""
+
+    keyset = keyset_columns(keyset_table)
+    created_at = datetime(2022, 1, 2, 3, 4, 5, 678)
+
+    cursor = executioner.encode_cursor({"created_at": created_at, "id": "abc"}, keyset)
+
+    assert executioner.decode_cursor(cursor, keyset) == [created_at, "abc"]
+
+
+@pytest.mark.parametrize("cursor", ["zzz", "W10", "WyJhYmMiXQ"])
+def test_decode_cursor_malformed(keyset_table: Table, cursor: str) -> None:
+    """Malformed cursors are rejected as bad requests."""
+
+    with pytest.raises(HTTPException) as exc_info:
+        executioner.decode_cursor(cursor, keyset_columns(keyset_table))
+
+    assert exc_info.value.status_code == 400
+
+
+@pytest.mark.parametrize(
+    "values",
+    [
+        ["2022-01-02T03:04:05", "abc"],
+        ["2022-01-02T03:04:05", 1],
+        ["yesterday", "8c4e8a4e-2f5c-4d8e-9b0a-3f6e1c2d4b5a"],
+        [None, "8c4e8a4e-2f5c-4d8e-9b0a-3f6e1c2d4b5a"],
+    ],
+)
+def test_decode_cursor_wrong_types(values: List) -> None:
+    """Well-formed cursors whose values do not fit the types of the keyset columns are
+    rejected as bad requests, instead of failing in the database."""
+
+    table = Table(
+        "things",
+        MetaData(),
+        Column("id", UUID, primary_key=True),
+        Column("created_at", DateTime, nullable=False),
+    )
+    keyset = keyset_columns(table)
+    cursor = base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+    with pytest.raises(HTTPException) as exc_info:
+        executioner.decode_cursor(cursor, keyset)
+
+    assert exc_info.value.status_code == 400
+
+    uuid_id = "8c4e8a4e-2f5c-4d8e-9b0a-3f6e1c2d4b5a"
+    created_at = datetime(2022, 1, 2, 3, 4, 5)
+    cursor = executioner.encode_cursor({"created_at": created_at, "id": uuid_id}, keyset)
+
+    assert executioner.decode_cursor(cursor, keyset) == [created_at, uuid_id]
+
+
+class UserRow(tuple):
+    """A row of the users table, which can also be read by column name."""
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            key = ("id", "name", "created_at", "deleted_at").index(key)
+
+        return super().__getitem__(key)
+
+
+def user_rows(sql, params):
+    """Get the rows of the users of a page, or of all users."""
+
+    rows = [
+        UserRow(("u1", "one", datetime(2022, 1, 1), None)),
+        UserRow(("u2", "two", datetime(2022, 1, 2), None)),
+    ]
+
+    if "_after_0" in params:
+        rows = [row for row in rows if (row[2], row[0]) > (params["_after_0"], params["_after_1"])]
+
+    return rows[: params.get("_limit")]
+
+
+def test_load_catalogs() -> None:
+    """Only the catalogs which are not loaded are loaded."""
+
+    operations = mock.Mock(loaded=True)
+    relationships = mock.Mock(loaded=False)
+
+    with mock.patch.object(executioner, "operations_catalog", operations), mock.patch.object(
+        executioner, "relationship_catalog", relationships
+    ):
+        executioner.load_catalogs("db")
+
+    operations.load.assert_not_called()
+    relationships.load.assert_called_once_with("db")
+
+
+def test_get_resources_whole(schema) -> None:
+    """Without a limit or a cursor, collections are returned whole."""
+
+    db = testutils.FakeSession({"FROM users \n": user_rows})
+
+    resources, next_cursor = executioner.get_resources("users", db)
+
+    assert [resource["id"] for resource in resources] == ["u1", "u2"]
+    assert next_cursor is None
+    assert "LIMIT" not in db.statements[0][0]
+
+
+def test_get_resources_pages(schema) -> None:
+    """Pages are read after the cursor of the previous one, until the last one."""
+
+    db = testutils.FakeSession({"FROM users \n": user_rows})
+
+    users = schema["users"]
+    last = executioner.encode_cursor(
+        {"created_at": datetime(2022, 1, 2), "id": "u2"}, [users.c.created_at, users.c.id]
+    )
+
+    first, cursor = executioner.get_resources("users", db, limit=1)
+    second, end = executioner.get_resources("users", db, limit=1, cursor=cursor)
+    past, _ = executioner.get_resources("users", db, cursor=last)
+
+    assert [resource["id"] for resource in first + second] == ["u1", "u2"]
+    assert end is None
+    assert past == []
+
+    # Without a limit, a cursor pages by the maximum page size.
+    assert db.statements[-1][1]["_limit"] == executioner.settings.max_page_size + 1
+
+
+def test_get_resources_default_page_size(schema) -> None:
+    """A configured default page size paginates collections without a limit."""
+
+    db = testutils.FakeSession({"FROM users \n": user_rows})
+
+    with mock.patch.object(executioner.settings, "default_page_size", 1):
+        resources, next_cursor = executioner.get_resources("users", db)
+
+    assert [resource["id"] for resource in resources] == ["u1"]
+    assert next_cursor is not None
+
+
+def test_get_resources_empty(schema) -> None:
+    """An empty collection is not found."""
+
+    with pytest.raises(HTTPException) as exc_info:
+        executioner.get_resources("users", testutils.FakeSession())
+
+    assert exc_info.value.status_code == 404
+
+
+def test_stream_resources(schema) -> None:
+    """Collections are streamed in batches of the stream batch size, with the
+    associations of each batch read with it."""
+
+    rows = [UserRow((f"u{i}", None, datetime(2022, 1, i), None)) for i in range(1, 4)]
+    db = testutils.FakeSession({"FROM users \n": rows, "FROM users_groups": [("u3", "g1")]})
+
+    with mock.patch.object(executioner, "SessionLocal", return_value=db), mock.patch.object(
+        executioner.settings, "stream_batch_size", 2
+    ):
+        batches = list(executioner.stream_resources("users"))
+        owner_ids = [params["_owner_ids"] for sql, params in db.statements if "groups" in sql]
+
+        whole = list(executioner.stream_resources("users", batch_size=3))
+
+    assert [[resource["id"] for resource in batch] for batch in batches] == [["u1", "u2"], ["u3"]]
+    assert batches[1][0]["groups"] == ["g1"]
+    assert owner_ids == [["u1", "u2"], ["u3"]]
+    assert [len(batch) for batch in whole] == [3]
+
+
+def test_get_associations_for_ids(schema) -> None:
+    """The associations of many resources are read with one statement per relationship,
+    from either side of a many to many relationship."""
+
+    db = testutils.FakeSession(
+        {
+            "FROM users_groups": [("u1", "g1"), ("u1", "g2"), ("u2", "g1")],
+            "FROM posts": [("u2", "p1")],
+        }
+    )
+
+    assert executioner.get_associations_for_ids(["u1", "u2"], "users", db) == {
+        "u1": {"groups": ["g1", "g2"], "posts": [], "notes": []},
+        "u2": {"groups": ["g1"], "posts": ["p1"], "notes": []},
+    }
+
+    assert [params for _, params in db.statements] == [{"_owner_ids": ["u1", "u2"]}] * 3
+
+    groups = testutils.FakeSession({"FROM users_groups": [("g1", "u1")]})
+
+    assert executioner.get_associations_for_ids(["g1"], "groups", groups) == {
+        "g1": {"users": ["u1"]}
+    }
+    assert "SELECT users_groups.groups_id, users_groups.users_id" in groups.statements[0][0]
+
+
+def test_get_associations_for_ids_one_to_many(schema) -> None:
+    """One to many associations are read from the foreign key of the other table,
+    named by the alias of the relationship if it has one."""
+
+    db = testutils.FakeSession()
+    executioner.get_associations_for_ids(["u1"], "users", db)
+
+    posts, notes = [sql for sql, _ in db.statements if "FROM users_groups" not in sql]
+
+    assert "SELECT posts.author_id, posts.id" in posts
+    assert "posts.deleted_at IS NULL" in posts
+    assert "SELECT notes.users_id, notes.id" in notes
+
+
+def test_get_associations_for_ids_empty(schema) -> None:
+    """Nothing is read without resources, or for a table without relationships."""
+
+    db = testutils.FakeSession()
+
+    assert executioner.get_associations_for_ids([], "users", db) == {}
+    assert executioner.get_associations_for_ids(["p1"], "posts", db) == {}
+    assert db.statements == []
+
+
+def test_attach_associations(schema) -> None:
+    """The associations of each resource are set on it, by the name of the other table."""
+
+    resources = [{"id": "u1"}, {"id": "u2"}]
+    db = testutils.FakeSession({"FROM notes": [("u2", "n1")]})
+
+    executioner.attach_associations(resources, "users", db)
+
+    assert resources == [
+        {"id": "u1", "groups": [], "posts": [], "notes": []},
+        {"id": "u2", "groups": [], "posts": [], "notes": ["n1"]},
+    ]
+
+    posts = [{"id": "p1"}]
+    executioner.attach_associations(posts, "posts", db)
+
+    assert posts == [{"id": "p1"}]
+
+
+class UserPayload(BaseModel):
+    name: str
+    groups: List[str] = []
+
+
+def inserted_users(sql, params):
+    """Get the rows of the inserted users, in reverse order, as the database may
+    return them in any order."""
+
+    count = len([key for key in params if key.startswith("id_m")])
+
+    return [
+        UserRow((params[f"id_m{idx}"], params[f"name_m{idx}"], datetime(2022, 1, 1), None))
+        for idx in reversed(range(count))
+    ]
+
+
+def test_create_resources(schema) -> None:
+    """Resources are created with one statement, and their associations with one
+    statement per relationship, matched to their payloads by id."""
+
+    db = testutils.FakeSession({"INSERT INTO users ": inserted_users})
+    payloads = [UserPayload(name="a", groups=["g1"]), UserPayload(name="b", groups=["g2", "g3"])]
+
+    with mock.patch.object(executioner, "commit_write") as commit_write:
+        resources = executioner.create_resources(payloads, "users", db)
+
+    assert [(resource["name"], resource["groups"]) for resource in resources] == [
+        ("a", ["g1"]),
+        ("b", ["g2", "g3"]),
+    ]
+
+    (insert_users, _), (insert_groups, params) = db.statements
+
+    assert insert_users.startswith("INSERT INTO users (id, name) VALUES")
+    assert insert_groups.startswith("INSERT INTO users_groups (users_id, groups_id) VALUES")
+
+    a, b = (resource["id"] for resource in resources)
+    assert [params[f"users_id_m{idx}"] for idx in range(3)] == [a, b, b]
+    assert [params[f"groups_id_m{idx}"] for idx in range(3)] == ["g1", "g2", "g3"]
+
+    commit_write.assert_called_once_with("users", resources, db)
+
+
+def test_create_resources_not_returned(schema) -> None:
+    """Resources which the database does not return were not created."""
+
+    db = testutils.FakeSession({"INSERT INTO users ": lambda sql, params: []})
+
+    with pytest.raises(HTTPException) as exc_info:
+        executioner.create_resources([UserPayload(name="a")], "users", db)
+
+    assert exc_info.value.status_code == 500
+
+
+def test_create_associations_bulk(schema) -> None:
+    """The associations of many resources are created with a single statement, and
+    none without associative ids."""
+
+    db = testutils.FakeSession()
+
+    executioner.create_associations_bulk("groups", "users", {"g1": ["u1", "u2"], "g2": []}, db)
+    executioner.create_associations_bulk("groups", "users", {"g1": []}, db)
+
+    [(sql, params)] = db.statements
+
+    assert sql.startswith("INSERT INTO users_groups (users_id, groups_id) VALUES")
+    assert params == {
+        "groups_id_m0": "g1",
+        "users_id_m0": "u1",
+        "groups_id_m1": "g1",
+        "users_id_m1": "u2",
+    }
+
+
+def test_get_associative_table(schema) -> None:
+    """Only many to many relationships have an associative table, and tables without
+    a relationship can not be associated."""
+
+    assert executioner.get_associative_table("groups", "users", None) is schema["users_groups"]
+    assert executioner.get_associative_table("users", "posts", None) is None
+
+    with pytest.raises(HTTPException) as exc_info:
+        executioner.get_associative_table("posts", "groups", None)
+
+    assert exc_info.value.status_code == 404
+
+
+def test_create_associations(schema) -> None:
+    """The associations of a resource are created with a single statement, and only
+    for many to many relationships."""
+
+    db = testutils.FakeSession()
+
+    executioner.create_associations("u1", "users", "groups", ["g1", "g2"], db)
+
+    assert db.statements == [
+        (
+            "INSERT INTO users_groups (users_id, groups_id) VALUES "
+            "(%(users_id_m0)s, %(groups_id_m0)s), (%(users_id_m1)s, %(groups_id_m1)s)",
+            {"users_id_m0": "u1", "groups_id_m0": "g1", "users_id_m1": "u1", "groups_id_m1": "g2"},
+        )
+    ]
+
+    with pytest.raises(HTTPException) as exc_info:
+        executioner.create_associations("u1", "users", "posts", ["p1"], db)
+
+    assert exc_info.value.status_code == 500
+
+
+def test_create_associations_ignore_conflicts(schema) -> None:
+    """Associations which are repeated or already stored are skipped, instead of
+    failing the whole statement, when conflicts are ignored."""
+
+    db = testutils.FakeSession()
+
+    executioner.create_associations("u1", "users", "groups", ["g1", "g1"], db, True)
+
+    [(sql, params)] = db.statements
+
+    assert sql.endswith("ON CONFLICT DO NOTHING")
+    assert params == {"users_id_m0": "u1", "groups_id_m0": "g1"}
+
+
+def test_delete_associations(schema) -> None:
+    """The associations of a resource are deleted with a single statement. One to many
+    associations are the foreign keys of the other resources, which are left as
+    they are."""
+
+    db = testutils.FakeSession()
+
+    executioner.delete_associations("u1", "users", "groups", ["g1", "g2"], db)
+    executioner.delete_associations("u1", "users", "groups", [], db)
+    executioner.delete_associations("u1", "users", "posts", ["p1"], db)
+
+    assert db.statements == [
+        (
+            "DELETE FROM users_groups WHERE users_groups.users_id = %(_owner_id)s "
+            "AND users_groups.groups_id IN (__[POSTCOMPILE__values])",
+            {"_owner_id": "u1", "_values": ["g1", "g2"]},
+        )
+    ]
+
+
+def test_replace_associations(schema) -> None:
+    """The associations of a resource are diffed against the new ones in a single
+    statement, and what is stored afterwards is returned."""
+
+    db = testutils.FakeSession({"SELECT users_groups": [("u1", "g2"), ("u1", "g1")]})
+
+    assert executioner.replace_associations("u1", "users", "groups", ["g1", "g2", "g1"], db) == [
+        "g2",
+        "g1",
+    ]
+
+    (diff, params), (read, _) = db.statements
+
+    assert diff.startswith(
+        "WITH deleted_associations AS \n(DELETE FROM users_groups "
+        "WHERE users_groups.users_id = %(users_id_1)s "
+        "AND (users_groups.groups_id NOT IN (__[POSTCOMPILE_groups_id_1])) "
+        "RETURNING users_groups.groups_id)\n INSERT INTO users_groups (users_id, groups_id) "
+    )
+    assert "WHERE NOT (EXISTS (SELECT " in diff
+    assert params["groups_id_1"] == ["g1", "g2"]
+    assert read.startswith("SELECT users_groups.users_id, users_groups.groups_id")
+
+
+def test_replace_associations_empty(schema) -> None:
+    """Replacing the associations of a resource with none deletes them all."""
+
+    db = testutils.FakeSession()
+
+    assert executioner.replace_associations("u1", "users", "groups", [], db) == []
+    assert db.statements == [
+        (
+            "DELETE FROM users_groups WHERE users_groups.users_id = %(users_id_1)s",
+            {"users_id_1": "u1"},
+        )
+    ]
+
+    with pytest.raises(HTTPException) as exc_info:
+        executioner.replace_associations("u1", "users", "posts", [], db)
+
+    assert exc_info.value.status_code == 500
@@ -0,0 +1,35 @@
+from data_api.db.instrumentation import QueryStats, annotate, query_stats
+from data_api.db.session import engine
+from sqlalchemy import text  # type: ignore
+
+
+def test_records_statements() -> None:
+    """Statements run by the engine are recorded in the stats of the request."""
+
+    stats = QueryStats()
+    token = query_stats.set(stats)
+
+    try:
+        annotate("users", "read_op")
+
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1 UNION SELECT 2")).fetchall()
+            conn.execute(text("SELECT 1")).fetchall()
+    finally:
+        query_stats.reset(token)
+
+    assert (stats.resource, stats.operation) == ("users", "read_op")
+    assert stats.queries == 2
+    assert stats.rows == 3
+    assert stats.duration > 0
+
+
+def test_records_nothing_outside_request() -> None:
+    """Statements run outside of a request are not recorded."""
+
+    annotate("users", "read_op")
+
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1")).fetchall()
+
+    assert query_stats.get() is None
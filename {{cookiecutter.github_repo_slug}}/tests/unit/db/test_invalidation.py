@@ -0,0 +1,250 @@
+import os
+import threading
+from unittest import mock
+
+import pytest
+from data_api.db import invalidation as invalidation_module
+from data_api.db.exc import executioner
+from data_api.db.invalidation import Invalidation, InvalidationBus, PostgresBus, UnixSocketBus
+from sqlalchemy.sql.elements import quoted_name  # type: ignore
+
+RELATIONSHIPS = [
+    {
+        "primary_table_name": "users",
+        "secondary_table_name": "groups",
+        "associative_table_name": "users_groups",
+        "primary_table_alias": None,
+    },
+    {
+        "primary_table_name": "users",
+        "secondary_table_name": "posts",
+        "associative_table_name": None,
+        "primary_table_alias": "author_id",
+    },
+]
+
+
+@pytest.fixture(autouse=True)
+def relationships():
+    with mock.patch.object(invalidation_module, "relationship_catalog") as catalog:
+        catalog.all.return_value = RELATIONSHIPS
+
+        yield
+
+
+def targets(invalidation: Invalidation):
+    return invalidation.resources, invalidation.tables, invalidation.everything
+
+
+def test_from_write_many_to_many() -> None:
+    """Creating or deleting a resource makes the resources it is associated with stale."""
+
+    invalidation = Invalidation.from_write("users", [{"id": "u1", "groups": ["g1", "g2"]}])
+
+    assert targets(invalidation) == ({"users": ["u1"], "groups": ["g1", "g2"]}, [], False)
+
+
+def test_from_write_update() -> None:
+    """Updating associations makes every resource of the other table stale, since the
+    associations it removes are not known."""
+
+    rows = [{"id": "u1", "name": "x", "groups": ["g1"]}]
+
+    updated = Invalidation.from_write("users", rows, {"name"})
+    associated = Invalidation.from_write("users", rows, {"groups"})
+
+    assert targets(updated) == ({"users": ["u1"]}, [], False)
+    assert targets(associated) == ({"users": ["u1"]}, ["groups"], False)
+
+
+def test_from_write_one_to_many() -> None:
+    """Writing a resource makes the resource it references stale."""
+
+    invalidation = Invalidation.from_write("posts", [{"id": "p1", "author_id": "u1"}])
+
+    assert targets(invalidation) == ({"posts": ["p1"], "users": ["u1"]}, [], False)
+
+
+def test_from_write_associative() -> None:
+    """Writing an association makes both resources it associates stale."""
+
+    invalidation = Invalidation.from_write(
+        "users_groups", [{"id": "a", "users_id": "u1", "groups_id": "g1"}]
+    )
+
+    assert targets(invalidation) == (
+        {"users_groups": ["a"], "users": ["u1"], "groups": ["g1"]},
+        [],
+        False,
+    )
+
+
+def test_from_write_relationships() -> None:
+    """Writing the relationships themselves makes everything stale."""
+
+    assert Invalidation.from_write("relationships", [{"id": "r"}]).everything
+
+
+def test_encode_coarsen() -> None:
+    """Invalidations are sent between processes, whole or as whole tables."""
+
+    invalidation = Invalidation("users", {"users": ["u1"], "groups": ["g1"]}, ["posts"])
+    origin, decoded = Invalidation.decode(invalidation.encode("bus"))
+
+    assert origin == "bus"
+    assert decoded.table_name == "users"
+    assert targets(decoded) == targets(invalidation)
+    assert targets(invalidation.coarsen()) == ({}, ["groups", "posts", "users"], False)
+
+    # The names of reflected tables are str subclasses.
+    reflected = Invalidation.from_write(quoted_name("users", None), [{"id": "u1"}])
+    assert Invalidation.decode(reflected.encode("bus"))[1].resources == {"users": ["u1"]}
+
+
+def test_local_bus() -> None:
+    """Invalidations are delivered to each subscriber once, despite failing subscribers."""
+
+    bus = InvalidationBus()
+    failing = mock.Mock(side_effect=RuntimeError)
+    subscriber = mock.Mock()
+
+    bus.subscribe(failing)
+    bus.subscribe(subscriber)
+    bus.subscribe(subscriber)
+
+    invalidation = Invalidation("users", {"users": ["u1"]})
+    bus.publish(invalidation)
+
+    subscriber.assert_called_once_with(invalidation, False)
+
+
+def test_unix_socket_bus(tmp_path) -> None:
+    """Invalidations are sent to the other processes of the host, whose sockets are
+    removed when they are gone."""
+
+    directory = str(tmp_path / "bus")
+    one, other, gone = UnixSocketBus(directory), UnixSocketBus(directory), UnixSocketBus(directory)
+
+    received = []
+    delivered = threading.Event()
+
+    def subscriber(invalidation: Invalidation, remote: bool) -> None:
+        received.append((targets(invalidation), remote))
+        delivered.set()
+
+    other.subscribe(subscriber)
+
+    for bus in (one, other, gone):
+        bus.start()
+
+    gone.stop()
+    open(gone.path, "w").close()
+
+    try:
+        one.publish(Invalidation("users", {"users": ["u1"]}))
+
+        assert delivered.wait(1)
+        assert received == [(({"users": ["u1"]}, [], False), True)]
+        assert sorted(os.listdir(directory)) == sorted(
+            os.path.basename(bus.path) for bus in (one, other)
+        )
+    finally:
+        one.stop()
+        other.stop()
+
+
+def test_postgres_bus_stage() -> None:
+    """Invalidations are notified in the transaction of the write, coarsened if they
+    are too large."""
+
+    bus = PostgresBus(mock.Mock(), "invalidations")
+    db = mock.Mock()
+
+    bus.stage(Invalidation("users", {"users": ["u1"]}), db)
+    bus.stage(Invalidation("users", {"users": ["u" * 10000]}), db)
+
+    params = [c.args[1] for c in db.execute.call_args_list]
+    payloads = [Invalidation.decode(p["payload"].encode()) for p in params]
+
+    assert [p["channel"] for p in params] == ["invalidations"] * 2
+    assert [targets(invalidation) for _, invalidation in payloads] == [
+        ({"users": ["u1"]}, [], False),
+        ({}, ["users"], False),
+    ]
+
+
+def test_postgres_bus_receive() -> None:
+    """Notifications are delivered, except those of this process."""
+
+    bus = PostgresBus(mock.Mock(), "invalidations")
+    subscriber = mock.Mock()
+    bus.subscribe(subscriber)
+
+    stopped = threading.Event()
+    connection = mock.Mock(notifies=[])
+
+    def poll() -> None:
+        for origin in (bus.origin, "other"):
+            payload = Invalidation("users", {"users": ["u1"]}).encode(origin).decode()
+            connection.notifies.append(mock.Mock(payload=payload))
+
+        stopped.set()
+
+    connection.poll.side_effect = poll
+
+    with mock.patch("select.select", return_value=([connection], [], [])):
+        bus._receive(connection, stopped)
+
+    subscriber.assert_called_once()
+    assert subscriber.call_args.args[1] is True
+
+
+def test_commit_write() -> None:
+    """Writes are staged before they commit, and published once they have."""
+
+    db = mock.Mock(info={})
+    bus = mock.Mock()
+    bus.stage.side_effect = lambda invalidation, db: db.notify()
+    bus.publish.side_effect = lambda invalidation: db.published()
+
+    with mock.patch.object(executioner, "invalidation_bus", bus):
+        executioner.commit_write("users", [{"id": "u1", "name": "x"}], db, {"name"})
+
+    assert [c[0] for c in db.method_calls] == ["notify", "commit", "published"]
+
+    invalidation = bus.publish.call_args.args[0]
+    assert targets(invalidation) == ({"users": ["u1"]}, [], False)
+
+
+def test_commit_write_pending() -> None:
+    """Writes queue their invalidations instead of publishing them, if the session
+    queues them."""
+
+    db = mock.Mock(info={executioner.PENDING_INVALIDATIONS: []})
+    bus = mock.Mock()
+
+    with mock.patch.object(executioner, "invalidation_bus", bus):
+        executioner.commit_write("users", [{"id": "u1"}], db)
+
+    db.commit.assert_called_once()
+    bus.publish.assert_not_called()
+
+    (invalidation,) = db.info[executioner.PENDING_INVALIDATIONS]
+    assert targets(invalidation) == ({"users": ["u1"]}, [], False)
+
+
+def test_invalidate_catalogs() -> None:
+    """Catalogs are invalidated after writes to their tables, from any process."""
+
+    with mock.patch.object(executioner, "relationship_catalog") as relationships, mock.patch.object(
+        executioner, "operations_catalog"
+    ) as operations:
+        executioner.invalidate_catalogs(Invalidation("users"), True)
+        executioner.invalidate_catalogs(Invalidation("operations"), True)
+
+        relationships.invalidate.assert_not_called()
+        operations.invalidate.assert_called_once()
+
+        executioner.invalidate_catalogs(Invalidation("relationships", everything=True), False)
+
+        relationships.invalidate.assert_called_once()
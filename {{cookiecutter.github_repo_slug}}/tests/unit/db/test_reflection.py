@@ -0,0 +1,156 @@
+import threading
+from unittest import mock
+
+import pytest
+from data_api.db.reflection import SchemaReflector, schema_generation
+from sqlalchemy import MetaData, create_engine  # type: ignore
+
+
+@pytest.fixture()
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+
+    with engine.begin() as conn:
+        conn.exec_driver_sql("CREATE TABLE things (id VARCHAR PRIMARY KEY, name VARCHAR)")
+
+    return engine
+
+
+def reflector(engine, path=None, fingerprint="a") -> SchemaReflector:
+    schema = SchemaReflector(engine, path)
+    schema.fingerprint = mock.Mock(return_value=fingerprint)  # type: ignore
+
+    return schema
+
+
+def add_column(engine) -> None:
+    with engine.begin() as conn:
+        conn.exec_driver_sql("ALTER TABLE things ADD COLUMN email VARCHAR")
+
+
+def test_load(engine) -> None:
+    """The schema is reflected once, on first use."""
+
+    schema = reflector(engine)
+
+    assert not schema.loaded
+
+    with mock.patch.object(MetaData, "reflect", autospec=True) as reflect:
+        schema.tables
+        schema.tables
+
+    assert schema.loaded
+    reflect.assert_called_once()
+
+    schema = reflector(engine)
+
+    assert list(schema.tables) == ["things"]
+    assert list(schema.tables["things"].c.keys()) == ["id", "name"]
+
+
+def test_load_snapshot(engine, tmp_path) -> None:
+    """A snapshot of the schema is loaded without querying the database."""
+
+    path = str(tmp_path / "schema.pickle")
+
+    reflector(engine, path).load()
+    add_column(engine)
+
+    schema = reflector(engine, path)
+
+    with mock.patch.object(MetaData, "reflect") as reflect:
+        schema.load()
+
+    reflect.assert_not_called()
+    schema.fingerprint.assert_not_called()  # type: ignore
+    assert list(schema.tables["things"].c.keys()) == ["id", "name"]
+
+
+def test_load_corrupt_snapshot(engine, tmp_path) -> None:
+    """A snapshot which cannot be read is ignored, and the schema is reflected."""
+
+    path = tmp_path / "schema.pickle"
+    path.write_bytes(b"not a snapshot")
+
+    assert list(reflector(engine, str(path)).tables) == ["things"]
+
+
+def test_validate(engine, tmp_path) -> None:
+    """A changed schema is reloaded, and replaces the snapshot for the next start."""
+
+    path = str(tmp_path / "schema.pickle")
+
+    schema = reflector(engine, path)
+    schema.load()
+
+    assert schema.validate()
+    assert schema.generation.number == 1
+
+    add_column(engine)
+    schema.fingerprint.return_value = "b"  # type: ignore
+
+    assert not schema.validate()
+    assert schema.generation.number == 2
+    assert list(schema.tables["things"].c.keys()) == ["id", "name", "email"]
+
+    restarted = reflector(engine, path, fingerprint="b")
+
+    assert list(restarted.tables["things"].c.keys()) == ["id", "name", "email"]
+    assert restarted.validate()
+
+
+def test_reload_pinned(engine) -> None:
+    """Requests pinned to a generation keep it when the schema is reloaded."""
+
+    schema = reflector(engine)
+    callback = mock.Mock()
+    schema.on_reload(callback)
+    schema.on_reload(callback)
+
+    token = schema_generation.set(schema.current())
+
+    try:
+        add_column(engine)
+        generation = schema.reload()
+
+        assert list(schema.tables["things"].c.keys()) == ["id", "name"]
+    finally:
+        schema_generation.reset(token)
+
+    assert schema.current() is generation
+    assert list(schema.tables["things"].c.keys()) == ["id", "name", "email"]
+
+    # Callbacks prepare the new generation, with it pinned, before it is swapped in.
+    callback.assert_called_once_with(generation)
+
+
+def test_watch(engine) -> None:
+    """The statements of every table are built, and the schema validated, in the background."""
+
+    schema = reflector(engine)
+
+    with mock.patch("data_api.db.reflection.statement_cache") as statement_cache:
+        schema.watch(0).join()
+
+    statement_cache.warm.assert_called_once()
+    assert [table.name for table in statement_cache.warm.call_args[0][0]] == ["things"]
+    schema.fingerprint.assert_called()  # type: ignore
+
+
+def test_watch_stop(engine) -> None:
+    """The schema is checked every interval, until the watcher is stopped."""
+
+    schema = reflector(engine)
+    schema.load()
+
+    checked = threading.Event()
+    schema.validate = mock.Mock(side_effect=lambda: checked.set())  # type: ignore
+
+    thread = schema.watch(0.01)
+
+    assert checked.wait(1)
+
+    schema.stop()
+    thread.join(1)
+
+    assert not thread.is_alive()
@@ -0,0 +1,47 @@
+from datetime import datetime
+
+from data_api.db.exc.rows import RowConverter
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table  # type: ignore
+
+table = Table(
+    "things",
+    MetaData(),
+    Column("id", String, primary_key=True),
+    Column("count", Integer),
+    Column("created_at", DateTime, nullable=False),
+    Column("deleted_at", DateTime),
+)
+
+
+def test_converter_keys() -> None:
+    """The converter is generated from the column names and types of the table."""
+
+    converter = RowConverter(table)
+
+    assert converter.keys == ("id", "count", "created_at", "deleted_at")
+    assert converter.datetime_keys == ("created_at", "deleted_at")
+
+
+def test_convert() -> None:
+    """Rows are converted to dicts, with datetimes in ISO format."""
+
+    converter = RowConverter(table)
+    created_at = datetime(2022, 1, 2, 3, 4, 5, 6)
+
+    expected = {
+        "id": "a",
+        "count": 1,
+        "created_at": "2022-01-02T03:04:05.000006",
+        "deleted_at": None,
+    }
+
+    assert converter(("a", 1, created_at, None)) == expected
+    assert converter.all([("a", 1, created_at, None), ("b", None, created_at, created_at)]) == [
+        expected,
+        {
+            "id": "b",
+            "count": None,
+            "created_at": "2022-01-02T03:04:05.000006",
+            "deleted_at": "2022-01-02T03:04:05.000006",
+        },
+    ]
@@ -0,0 +1,99 @@
+import pytest
+from data_api.db.exc.statements import StatementCache, TableStatements, keyset_columns
+from sqlalchemy import Column, DateTime, MetaData, String, Table  # type: ignore
+from sqlalchemy.dialects import postgresql  # type: ignore
+
+
+@pytest.fixture()
+def resource_table() -> Table:
+    """Get a soft-deletable resource table."""
+
+    return Table(
+        "things",
+        MetaData(),
+        Column("id", String, primary_key=True),
+        Column("name", String),
+        Column("created_at", DateTime, nullable=False),
+        Column("deleted_at", DateTime),
+    )
+
+
+def compile_pg(stmt) -> str:
+    return str(stmt.compile(dialect=postgresql.dialect()))
+
+
+def test_statements_are_built_once(resource_table: Table) -> None:
+    """The same statement object is returned on every access."""
+
+    statements = TableStatements(resource_table)
+
+    assert statements.select_by_id is statements.select_by_id
+    assert statements.associations("name", "id") is statements.associations("name", "id")
+
+
+def test_statements_bind_parameters(resource_table: Table) -> None:
+    """Values which change between requests are bound parameters."""
+
+    statements = TableStatements(resource_table)
+
+    assert "things.id = %(_resource_id)s" in compile_pg(statements.select_by_id)
+    assert "things.deleted_at IS NULL" in compile_pg(statements.select_by_id)
+
+    stmt, params = statements.page(10, ["2022-01-01", "abc"])
+
+    assert stmt is statements.select_page_after
+    assert params == {"_after_0": "2022-01-01", "_after_1": "abc", "_limit": 10}
+    assert "(things.created_at, things.id) > (%(_after_0)s, %(_after_1)s)" in compile_pg(stmt)
+
+
+def test_delete_by_id(resource_table: Table) -> None:
+    """Soft-deletable tables are deleted by setting deleted_at."""
+
+    assert compile_pg(TableStatements(resource_table).delete_by_id).startswith("UPDATE things")
+
+    hard = Table("hard", MetaData(), Column("id", String, primary_key=True))
+
+    assert compile_pg(TableStatements(hard).delete_by_id).startswith("DELETE FROM hard")
+
+
+def test_statement_cache(resource_table: Table) -> None:
+    """The cache builds statements for tables with and without an id column."""
+
+    associative = Table(
+        "things_others",
+        MetaData(),
+        Column("things_id", String),
+        Column("others_id", String),
+    )
+
+    cache = StatementCache()
+    cache.build([resource_table, associative])
+
+    statements = cache.for_table(resource_table)
+
+    assert statements.table is resource_table
+    assert "select_by_id" in vars(statements)
+    assert cache.for_table(associative).dissociations("things_id", "others_id") is not None
+
+    # A replaced table gets new statements.
+    replaced = resource_table.to_metadata(MetaData())
+
+    assert cache.for_table(replaced).table is replaced
+
+
+def test_keyset_columns(resource_table: Table) -> None:
+    """Tables are paginated on (created_at, id) only if created_at is never null."""
+
+    assert keyset_columns(resource_table) == [
+        resource_table.c.created_at,
+        resource_table.c.id,
+    ]
+
+    nullable = Table(
+        "others",
+        MetaData(),
+        Column("id", String, primary_key=True),
+        Column("created_at", DateTime, nullable=True),
+    )
+
+    assert keyset_columns(nullable) == [nullable.c.id]
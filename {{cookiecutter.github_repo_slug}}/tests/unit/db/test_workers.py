@@ -0,0 +1,77 @@
+import asyncio
+import contextvars
+import threading
+
+import pytest
+from data_api.db.workers import WorkerPool
+from fastapi.exceptions import HTTPException
+
+request_id = contextvars.ContextVar("request_id", default=None)
+
+
+@pytest.mark.asyncio
+async def test_run() -> None:
+    """Calls run on a worker thread, in the context of the caller."""
+
+    pool = WorkerPool(size=2, queue_depth=10, queue_timeout=5)
+    request_id.set("abc")
+
+    def call(value):
+        return value, request_id.get(), threading.current_thread().name
+
+    value, context_value, thread_name = await pool.run(call, 1)
+
+    assert (value, context_value) == (1, "abc")
+    assert thread_name.startswith("db-worker")
+    assert pool.queued == 0
+
+    pool.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_run_queue_full() -> None:
+    """Calls are rejected with a 503 once the queue is full."""
+
+    pool = WorkerPool(size=1, queue_depth=1, queue_timeout=5)
+    release = threading.Event()
+
+    # The first call occupies the only thread, and the second one the queue.
+    running = asyncio.ensure_future(pool.run(release.wait))
+    queued = asyncio.ensure_future(pool.run(lambda: "queued"))
+    await asyncio.sleep(0.05)
+
+    with pytest.raises(HTTPException) as exc_info:
+        await pool.run(lambda: None)
+
+    assert exc_info.value.status_code == 503
+
+    release.set()
+
+    assert await running is True
+    assert await queued == "queued"
+
+    pool.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_run_queue_timeout() -> None:
+    """Calls which wait in the queue for too long are rejected with a 503."""
+
+    pool = WorkerPool(size=1, queue_depth=10, queue_timeout=0.05)
+    release = threading.Event()
+
+    running = asyncio.ensure_future(pool.run(release.wait))
+    await asyncio.sleep(0.01)
+
+    with pytest.raises(HTTPException) as exc_info:
+        await pool.run(lambda: None)
+
+    assert exc_info.value.status_code == 503
+    assert pool.queued == 0
+
+    # A call which is already running is waited for past the timeout.
+    release.set()
+
+    assert await running is True
+
+    pool.shutdown()
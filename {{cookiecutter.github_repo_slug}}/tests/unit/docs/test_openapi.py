@@ -0,0 +1,56 @@
+from unittest import mock
+
+from data_api.docs.openapi import OpenAPICache, schema_fingerprint
+from fastapi import FastAPI
+
+
+def test_cache_memoized() -> None:
+    """The document is only built again when the fingerprint changes."""
+
+    cache = OpenAPICache()
+    build = mock.Mock(side_effect=[{"v": 1}, {"v": 2}])
+
+    assert cache.get("a", build) == {"v": 1}
+    assert cache.get("a", build) == {"v": 1}
+    assert build.call_count == 1
+
+    assert cache.get("b", build) == {"v": 2}
+    assert build.call_count == 2
+
+
+def test_cache_file(tmp_path) -> None:
+    """A document persisted to the cache file is reused while the fingerprint matches."""
+
+    path = str(tmp_path / "openapi.json")
+
+    OpenAPICache(path).get("a", lambda: {"v": 1})
+
+    build = mock.Mock(return_value={"v": 2})
+
+    assert OpenAPICache(path).get("a", build) == {"v": 1}
+    build.assert_not_called()
+
+    assert OpenAPICache(path).get("b", build) == {"v": 2}
+    assert OpenAPICache(path).get("b", mock.Mock()) == {"v": 2}
+
+
+def test_cache_file_unwritable(tmp_path) -> None:
+    """A cache file which cannot be written does not fail the build."""
+
+    cache = OpenAPICache(str(tmp_path / "missing" / "openapi.json"))
+
+    assert cache.get("a", lambda: {"v": 1}) == {"v": 1}
+
+
+def test_schema_fingerprint() -> None:
+    """The fingerprint changes with the operations, relationships and tags."""
+
+    app = FastAPI()
+    operations = {"users": {"read_op": True}}
+
+    fingerprint = schema_fingerprint(app, operations, [], {})
+
+    assert schema_fingerprint(app, {"users": {"read_op": True}}, [], {}) == fingerprint
+    assert schema_fingerprint(app, {"users": {"read_op": False}}, [], {}) != fingerprint
+    assert schema_fingerprint(app, operations, [{"id": "x"}], {}) != fingerprint
+    assert schema_fingerprint(app, operations, [], {"users": "Users"}) != fingerprint
@@ -1,9 +1,15 @@
+import os
+import subprocess
+import sys
+import threading
 from unittest import mock
 
 import pytest
+from data_api.db.instrumentation import QueryStats
 from data_api.middleware import prometheus
 from fastapi import FastAPI, Request
 from fastapi.testclient import TestClient
+from prometheus_client import multiprocess
 from starlette.types import ASGIApp, Receive, Scope, Send
 
 
@@ -123,3 +129,166 @@ class TestPrometheusMiddleware:
                 mock.call(),  # errors total
             ]
         )
+
+
+def test_bound_metrics_cached() -> None:
+    """Metric children are bound once per (method, path template) pair."""
+
+    bound = prometheus.bound_metrics("GET", "/v1/bound")
+
+    assert prometheus.bound_metrics("GET", "/v1/bound") is bound
+    assert bound.responses_total(200) is bound.responses_total(200)
+
+
+def test_buffered_recorder() -> None:
+    """Buffered metrics are applied when flushed."""
+
+    recorder = prometheus.BufferedRecorder(flush_interval=60)
+    bound = prometheus.bound_metrics("GET", "/v1/buffered")
+
+    def value(metric, **labels) -> float:
+        return metric.labels(method="GET", path_template="/v1/buffered", **labels)._value.get()
+
+    for _ in range(3):
+        recorder.request_started(bound)
+        recorder.response_started(bound, 200, 0.01)
+        recorder.response_completed(bound, 10)
+        recorder.request_finished(bound)
+
+    recorder.request_started(bound)
+
+    assert value(prometheus.HTTP_REQUESTS_TOTAL) == 0
+
+    recorder.flush()
+
+    assert value(prometheus.HTTP_REQUESTS_TOTAL) == 4
+    assert value(prometheus.HTTP_REQUESTS_ACTIVE) == 1
+    assert value(prometheus.HTTP_RESPONSES_TOTAL, status_code=200) == 3
+    assert value(prometheus.HTTP_RESPONSES_BYTES) == 30
+
+    recorder.request_finished(bound)
+    recorder.flush()
+
+    assert value(prometheus.HTTP_REQUESTS_ACTIVE) == 0
+
+
+def test_buffered_recorder_timer() -> None:
+    """Buffered metrics are flushed every flush interval, without further requests."""
+
+    recorder = prometheus.BufferedRecorder(flush_interval=0.01)
+    flushed = threading.Event()
+
+    with mock.patch.object(recorder, "flush", side_effect=flushed.set):
+        recorder.start()
+
+        try:
+            assert flushed.wait(1)
+        finally:
+            recorder.stop()
+
+
+def test_metrics_multiprocess(http_request: Request, tmp_path, monkeypatch) -> None:
+    """In multiprocess mode, the metrics of all live worker processes are aggregated."""
+
+    script = (
+        "from data_api.middleware import prometheus;"
+        "bound = prometheus.bound_metrics('GET', '/v1/multiprocess');"
+        "prometheus.recorder.request_started(bound);"
+        "prometheus.recorder.request_started(bound);"
+        "prometheus.recorder.request_finished(bound);"
+        "import os; print(os.getpid())"
+    )
+    env = {**os.environ, "PROMETHEUS_MULTIPROC_DIR": str(tmp_path)}
+
+    pids = []
+    for _ in range(2):
+        output = subprocess.check_output([sys.executable, "-c", script], env=env)
+        pids.append(int(output.split()[-1]))
+
+    monkeypatch.setattr(prometheus, "MULTIPROC_DIR", str(tmp_path))
+    monkeypatch.setenv("prometheus_multiproc_dir", str(tmp_path))
+
+    labels = b'method="GET",path_template="/v1/multiprocess"'
+
+    body = prometheus.metrics(http_request).body
+    assert b"http_requests_total{" + labels + b"} 4.0" in body
+    assert b"http_requests_active{" + labels + b"} 2.0" in body
+
+    for pid in pids:
+        multiprocess.mark_process_dead(pid, str(tmp_path))
+
+    body = prometheus.metrics(http_request).body
+    assert b"http_requests_total{" + labels + b"} 4.0" in body
+    assert b"http_requests_active{" + labels + b"}" not in body
+
+
+def test_startup_shutdown_multiprocess(monkeypatch) -> None:
+    """In multiprocess mode, buffered metrics are flushed on exit, and by shutdown before
+    the metrics of the process are retired."""
+
+    recorder = mock.Mock()
+    calls = mock.Mock()
+    recorder.flush.side_effect = lambda: calls("flush")
+
+    monkeypatch.setattr(prometheus, "recorder", recorder)
+    monkeypatch.setattr(prometheus, "MULTIPROC_DIR", "/tmp/metrics")
+
+    with mock.patch.object(prometheus.atexit, "register") as register, mock.patch.object(
+        prometheus.multiprocess, "mark_process_dead", side_effect=lambda pid: calls("dead")
+    ):
+        prometheus.startup()
+        prometheus.shutdown()
+
+    recorder.start.assert_called_once()
+    register.assert_called_once_with(recorder.flush)
+    recorder.stop.assert_called_once()
+    assert [c.args[0] for c in calls.call_args_list] == ["flush", "dead"]
+
+
+def test_metrics_multiprocess_buffered(http_request: Request, tmp_path, monkeypatch) -> None:
+    """In multiprocess mode, the buffered metrics of other processes are aggregated once
+    they are flushed, including by a process which exits without shutting down."""
+
+    script = (
+        "from data_api.middleware import prometheus;"
+        "prometheus.startup();"
+        "bound = prometheus.bound_metrics('GET', '/v1/buffered-multiprocess');"
+        "prometheus.recorder.request_started(bound);"
+        "prometheus.recorder.request_finished(bound)"
+    )
+    env = {
+        **os.environ,
+        "PROMETHEUS_MULTIPROC_DIR": str(tmp_path),
+        "APP_METRICS_BUFFERED": "true",
+        "APP_METRICS_FLUSH_INTERVAL": "60",
+    }
+
+    subprocess.check_call([sys.executable, "-c", script], env=env)
+
+    monkeypatch.setattr(prometheus, "MULTIPROC_DIR", str(tmp_path))
+    monkeypatch.setenv("prometheus_multiproc_dir", str(tmp_path))
+
+    body = prometheus.metrics(http_request).body
+    labels = b'method="GET",path_template="/v1/buffered-multiprocess"'
+    assert b"http_requests_total{" + labels + b"} 1.0" in body
+
+
+@mock.patch("data_api.middleware.prometheus.logger")
+def test_record_query_stats_budget(mock_logger, monkeypatch) -> None:
+    """A warning is logged when a request runs more statements than the query budget."""
+
+    monkeypatch.setattr(prometheus.settings, "db_query_budget", 3)
+
+    stats = QueryStats()
+    stats.resource, stats.operation = "users", "read_op"
+    stats.queries = 3
+
+    prometheus.record_query_stats(stats, "/v1/users")
+    mock_logger.warning.assert_not_called()
+
+    stats.queries = 4
+
+    prometheus.record_query_stats(stats, "/v1/users")
+    mock_logger.warning.assert_called_once()
+    assert mock_logger.warning.call_args.kwargs["queries"] == 4
+    assert mock_logger.warning.call_args.kwargs["resource"] == "users"
@@ -0,0 +1,81 @@
+from unittest import mock
+
+from data_api.schema.v1 import registry
+from sqlalchemy import Column, MetaData, String, Table  # type: ignore
+
+metadata = MetaData()
+
+tables = {
+    name: Table(name, metadata, Column("id", String, primary_key=True))
+    for name in ("users", "groups", "notes")
+}
+
+relationships = {
+    "users": [
+        {
+            "primary_table_name": "users",
+            "secondary_table_name": "groups",
+            "associative_table_name": "users_groups",
+        }
+    ],
+    "groups": [
+        {
+            "primary_table_name": "users",
+            "secondary_table_name": "groups",
+            "associative_table_name": "users_groups",
+        }
+    ],
+}
+
+
+@mock.patch.object(registry, "table_from_name", tables.get)
+@mock.patch.object(registry, "operations_catalog")
+@mock.patch.object(registry, "relationship_catalog")
+@mock.patch.object(registry, "build_schema_models")
+def test_registry(mock_build, mock_relationships, mock_operations) -> None:
+    """Models are generated once, and again only for tables whose inputs change."""
+
+    mock_build.side_effect = lambda table_name: {"ModelReturn": table_name}
+    mock_operations.peek.return_value = {name: {"read_op": True} for name in tables}
+    mock_relationships.peek.return_value.by_table = relationships
+
+    r = registry.SchemaModelRegistry()
+    r.build(tables.keys())
+
+    assert mock_build.call_count == 3
+    assert r.get("users") == {"ModelReturn": "users"}
+    assert mock_build.call_count == 3
+
+    # A new relationship only affects the tables which are part of it.
+    relationships["notes"] = [
+        {
+            "primary_table_name": "notes",
+            "secondary_table_name": "groups",
+            "associative_table_name": None,
+        }
+    ]
+
+    r.build(tables.keys())
+
+    assert mock_build.call_count == 4
+    mock_build.assert_called_with("notes")
+
+
+@mock.patch.object(registry, "table_from_name", tables.get)
+@mock.patch.object(registry, "operations_catalog")
+@mock.patch.object(registry, "relationship_catalog")
+@mock.patch.object(registry, "build_schema_models")
+def test_registry_unloaded_catalogs(mock_build, mock_relationships, mock_operations) -> None:
+    """While a catalog has no snapshot, existing models are served without loading it."""
+
+    mock_build.side_effect = lambda table_name: {"ModelReturn": table_name}
+    mock_operations.peek.return_value = {}
+    mock_relationships.peek.return_value = None
+
+    r = registry.SchemaModelRegistry()
+
+    assert r.get("groups") == {"ModelReturn": "groups"}
+    assert r.get("groups") == {"ModelReturn": "groups"}
+    assert mock_build.call_count == 1
+    mock_relationships.for_table.assert_not_called()
+    mock_operations.for_table.assert_not_called()
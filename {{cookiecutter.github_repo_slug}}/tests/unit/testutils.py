@@ -1,6 +1,10 @@
-from typing import Any, Dict, List, Optional
+import socketserver
+import threading
+import time
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple, Union
 
 from fastapi.responses import Response
+from sqlalchemy.dialects import postgresql  # type: ignore
 
 
 def check_ok_response_headers(
@@ -183,3 +187,221 @@ def err404(msg: str) -> Dict[str, Any]:
         "title": "Not Found",
         "type": "about:blank",
     }
+
+
+class FakeRespServer:
+    """An in-process server which speaks enough of the Redis protocol (RESP) to
+    back the read cache: AUTH, SELECT, PING, GET, MGET, SET (with PX and NX), DEL
+    and FLUSHDB.
+
+    It listens on a free local port from `start` until `stop`, and can be used as a
+    context manager. Every command received is recorded in `commands`.
+    """
+
+    def __init__(self, password: Optional[str] = None) -> None:
+        self.password = password
+        self.data: Dict[bytes, Tuple[bytes, float]] = {}
+        self.commands: List[List[bytes]] = []
+        self.lock = threading.Lock()
+        self.server: Optional[socketserver.ThreadingTCPServer] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address  # type: ignore
+        auth = f":{self.password}@" if self.password else ""
+
+        return f"redis://{auth}{host}:{port}/1"
+
+    def start(self) -> "FakeRespServer":
+        fake = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self) -> None:
+                authenticated = fake.password is None
+
+                while True:
+                    command = fake.read_command(self.rfile)
+
+                    if command is None:
+                        return
+
+                    if command[0].upper() == b"AUTH":
+                        authenticated = command[1].decode() == fake.password
+                        reply = b"+OK\r\n" if authenticated else b"-WRONGPASS invalid password\r\n"
+                    elif not authenticated:
+                        reply = b"-NOAUTH Authentication required.\r\n"
+                    else:
+                        reply = fake.execute(command)
+
+                    self.wfile.write(reply)
+
+        socketserver.ThreadingTCPServer.allow_reuse_address = True
+        self.server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+
+        threading.Thread(target=self.server.serve_forever, args=(0.01,), daemon=True).start()
+
+        return self
+
+    def stop(self) -> None:
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+    def __enter__(self) -> "FakeRespServer":
+        return self.start()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
+
+    @staticmethod
+    def read_command(rfile: Any) -> Optional[List[bytes]]:
+        line = rfile.readline()
+
+        if not line:
+            return None
+
+        args = []
+
+        for _ in range(int(line[1:])):
+            length = int(rfile.readline()[1:])
+            args.append(rfile.read(length + 2)[:-2])
+
+        return args
+
+    def get(self, key: bytes) -> Optional[bytes]:
+        entry = self.data.get(key)
+
+        if entry is None or entry[1] <= time.monotonic():
+            return None
+
+        return entry[0]
+
+    def execute(self, command: List[bytes]) -> bytes:
+        name, args = command[0].upper(), command[1:]
+
+        with self.lock:
+            self.commands.append(command)
+
+            if name in (b"PING", b"SELECT"):
+                return b"+OK\r\n"
+
+            if name == b"FLUSHDB":
+                self.data.clear()
+                return b"+OK\r\n"
+
+            if name in (b"GET", b"MGET"):
+                values = [self.get(key) for key in args]
+                encoded = [
+                    b"$-1\r\n" if value is None else b"$%d\r\n%s\r\n" % (len(value), value)
+                    for value in values
+                ]
+
+                if name == b"GET":
+                    return encoded[0]
+
+                return b"*%d\r\n" % len(values) + b"".join(encoded)
+
+            if name == b"SET":
+                key, value, options = args[0], args[1], [arg.upper() for arg in args[2:]]
+                expires = float("inf")
+
+                if b"PX" in options:
+                    expires = time.monotonic() + int(args[2 + options.index(b"PX") + 1]) / 1000
+
+                if b"NX" in options and self.get(key) is not None:
+                    return b"$-1\r\n"
+
+                self.data[key] = (value, expires)
+                return b"+OK\r\n"
+
+            if name == b"DEL":
+                deleted = sum(self.data.pop(key, None) is not None for key in args)
+                return b":%d\r\n" % deleted
+
+        return b"-ERR unknown command\r\n"
+
+
+class FakeResult(list):
+    """The rows returned for a statement by a `FakeSession`."""
+
+    def fetchall(self) -> List[Any]:
+        return list(self)
+
+    def first(self) -> Any:
+        return self[0] if self else None
+
+    def partitions(self, size: int) -> Iterator[List[Any]]:
+        for start in range(0, len(self), size):
+            end = start + size
+            yield self[start:end]
+
+
+class FakeSession:
+    """A database session which records the statements executed on it, compiled for
+    PostgreSQL, and answers them with canned rows.
+
+    Rows are given by a fragment of SQL, such as `"FROM users_groups"`: a statement
+    gets the rows of the first fragment it contains, or no rows. The rows may also be
+    given by a function of the SQL and the parameters of the statement.
+    """
+
+    def __init__(
+        self, rows: Optional[Dict[str, Union[List[Any], Callable[[str, Dict], List]]]] = None
+    ) -> None:
+        self.rows = rows or {}
+        self.statements: List[Tuple[str, Dict]] = []
+        self.commits = 0
+        self.info: Dict[str, Any] = {}
+
+    def execute(self, stmt: Any, params: Optional[Dict] = None, **kwargs: Any) -> FakeResult:
+        compiled = stmt.compile(dialect=postgresql.dialect())
+        sql, params = str(compiled), params if params is not None else compiled.params
+
+        self.statements.append((sql, params))
+
+        for fragment, rows in self.rows.items():
+            if fragment in sql:
+                return FakeResult(rows(sql, params) if callable(rows) else rows)
+
+        return FakeResult()
+
+    def commit(self) -> None:
+        self.commits += 1
+
+    def __enter__(self) -> "FakeSession":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        pass
+
+
+class FakeAsyncSession:
+    """An asyncio session which runs its statements on a `FakeSession`."""
+
+    def __init__(self, session: FakeSession) -> None:
+        self.session = session
+        self.info = session.info
+
+    async def stream(self, stmt: Any, params: Optional[Dict] = None) -> "FakeAsyncResult":
+        return FakeAsyncResult(self.session.execute(stmt, params))
+
+    async def run_sync(self, fn: Callable[..., Any], *args: Any) -> Any:
+        return fn(self.session, *args)
+
+    async def __aenter__(self) -> "FakeAsyncSession":
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        pass
+
+
+class FakeAsyncResult:
+    """The rows streamed for a statement by a `FakeAsyncSession`."""
+
+    def __init__(self, result: FakeResult) -> None:
+        self.result = result
+
+    async def partitions(self, size: int) -> AsyncIterator[List[Any]]:
+        for partition in self.result.partitions(size):
+            yield partition
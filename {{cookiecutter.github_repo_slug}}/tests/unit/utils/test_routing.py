@@ -0,0 +1,94 @@
+from unittest import mock
+
+import pytest
+from data_api.api.generic.dispatch import ResourceDispatcher
+from data_api.db.reflection import SchemaGeneration, schema_generation
+from data_api.utils import routing
+from fastapi import APIRouter, FastAPI
+from sqlalchemy import Column, MetaData, String, Table  # type: ignore
+from starlette.routing import Match
+from starlette.types import Scope
+
+
+@pytest.fixture(scope="module")
+def app() -> FastAPI:
+    """Get an application with a mix of static, parameterized and generic routes."""
+
+    app = FastAPI()
+    router = APIRouter()
+
+    for path in ("/health", "/items/{item_id}", "/items/{item_id}/tags", "/{anything}"):
+        router.add_api_route(path, lambda: None, methods=["GET"])
+
+    router.add_api_route("/v1/{full_path:path}", lambda: None, methods=["GET"])
+    router.add_api_route("/v1/{full_path:path}/{resource_id:str}", lambda: None, methods=["PATCH"])
+
+    app.include_router(router)
+
+    return app
+
+
+@pytest.fixture(autouse=True)
+def dispatcher() -> ResourceDispatcher:
+    """Patch the dispatcher used to label generic routes."""
+
+    metadata = MetaData()
+    Table("users_groups", metadata, Column("id", String, primary_key=True))
+
+    d = ResourceDispatcher()
+    token = schema_generation.set(SchemaGeneration(1, "test", metadata))
+
+    with mock.patch.object(routing, "dispatcher", d):
+        yield d
+
+    schema_generation.reset(token)
+
+
+def scope(app: FastAPI, path: str, method: str = "GET") -> Scope:
+    return {"type": "http", "method": method, "app": app, "root_path": "", "path": path}
+
+
+def linear_resolve(app: FastAPI, s: Scope):
+    for route in app.routes:
+        match, _ = route.matches(s)
+        if match == Match.FULL:
+            return route.path
+    return None
+
+
+@pytest.mark.parametrize("path", ["/health", "/items/1", "/items/1/tags", "/other", "/a/b/c"])
+def test_resolve_matches_router(app: FastAPI, path: str) -> None:
+    """Non-generic requests resolve to the same route as a scan of every route."""
+
+    s = scope(app, path)
+
+    assert routing.resolve_route(app, s) == linear_resolve(app, s)
+
+
+@pytest.mark.parametrize(
+    "path,method,expected",
+    [
+        ("/v1/users-groups", "GET", "/v1/users-groups"),
+        ("/v1/users-groups/", "GET", "/v1/users-groups"),
+        ("/v1/users-groups/abc", "GET", "/v1/users-groups/{id}"),
+        ("/v1/users-groups/abc", "PATCH", "/v1/users-groups/{id}"),
+        ("/v1/nope/abc", "GET", "/v1/{full_path:path}"),
+        ("/v1/users-groups/abc", "DELETE", None),
+    ],
+)
+def test_resolve_generic(app: FastAPI, path: str, method: str, expected) -> None:
+    """Generic requests are labeled by the resource they resolve to."""
+
+    assert routing.resolve_route(app, scope(app, path, method)) == expected
+
+
+def test_resolver_candidates(app: FastAPI) -> None:
+    """Only routes sharing a prefix with the path are candidates."""
+
+    resolver = routing.RouteResolver(app.routes)
+
+    paths = [route.path for route in resolver.candidates("/items/1/tags")]
+
+    assert "/health" not in paths
+    assert "/v1/{full_path:path}" not in paths
+    assert paths == sorted(paths, key=[route.path for route in app.routes].index)
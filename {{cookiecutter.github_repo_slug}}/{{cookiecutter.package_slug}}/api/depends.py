@@ -1,6 +1,6 @@
-from typing import Generator
+from typing import AsyncGenerator, Generator
 
-from ..db.session import SessionLocal
+from ..db.session import AsyncSessionLocal, SessionLocal
 
 
 def get_db() -> Generator:
@@ -14,3 +14,20 @@ def get_db() -> Generator:
         yield db
     finally:
         db.close()
+
+
+async def get_async_db() -> AsyncGenerator:
+    """Get a new asyncio database session.
+
+    This is intended to be used as a FastAPI Dependency for a single request in
+    the async execution mode. Once the request completes, the database session
+    is closed.
+
+    Raises:
+        RuntimeError: The async execution mode is not configured.
+    """
+    if AsyncSessionLocal is None:
+        raise RuntimeError("The async execution mode is not configured")
+
+    async with AsyncSessionLocal() as db:
+        yield db
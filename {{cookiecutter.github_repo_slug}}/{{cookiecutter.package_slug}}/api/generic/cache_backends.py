@@ -0,0 +1,556 @@
+"""Storage backends of the read cache."""
+import fcntl
+import hashlib
+import mmap
+import os
+import socket
+import struct
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import unquote, urlparse
+
+__all__ = [
+    "CacheBackend",
+    "MemoryBackend",
+    "SharedMemoryBackend",
+    "RespBackend",
+    "RespError",
+]
+
+
+class CacheBackend(ABC):
+    """Base class for a key-value store the read cache keeps its entries in.
+
+    Keys are strings and values are bytes. Every operation works on several keys
+    at once, so that a backend on the other side of a network answers it in a
+    single round trip.
+    """
+
+    # The name of the backend, as reported in metrics.
+    name: str
+
+    # Whether operations block on I/O, and so must not be run on the event loop.
+    blocking = False
+
+    # Whether the entries are only seen by this process, so that writes made by other
+    # processes must be invalidated in it too.
+    local = False
+
+    @abstractmethod
+    def get_many(self, keys: List[str]) -> List[Optional[bytes]]:
+        """Get the values of keys.
+
+        Args:
+            keys: The keys.
+
+        Returns:
+            The value of each key, or None if it is not set or has expired.
+        """
+
+    @abstractmethod
+    def set_many(
+        self, items: Dict[str, bytes], ttl: Optional[float], only_new: bool = False
+    ) -> None:
+        """Set the values of keys.
+
+        Args:
+            items: The values, by key.
+            ttl: The number of seconds the values are kept for, or None to keep
+                them until they are evicted.
+            only_new: Only set the keys which are not set yet.
+        """
+
+    @abstractmethod
+    def delete(self, keys: Iterable[str]) -> None:
+        """Delete keys.
+
+        Args:
+            keys: The keys.
+        """
+
+    def close(self) -> None:
+        """Release the connections or files the backend holds, if any."""
+
+
+class MemoryBackend(CacheBackend):
+    """Bounded LRU store in the memory of the process.
+
+    Each worker process has its own store, so entries are duplicated in every
+    worker, and writes are only seen by the worker which serves them.
+    """
+
+    name = "memory"
+    local = True
+
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Tuple[bytes, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, keys: List[str]) -> List[Optional[bytes]]:
+        values: List[Optional[bytes]] = []
+        now = time.monotonic()
+
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+
+                if entry is None:
+                    values.append(None)
+                elif entry[1] <= now:
+                    del self._entries[key]
+                    values.append(None)
+                else:
+                    self._entries.move_to_end(key)
+                    values.append(entry[0])
+
+        return values
+
+    def set_many(
+        self, items: Dict[str, bytes], ttl: Optional[float], only_new: bool = False
+    ) -> None:
+        now = time.monotonic()
+        expires = now + ttl if ttl is not None else float("inf")
+
+        with self._lock:
+            for key, value in items.items():
+                if only_new:
+                    entry = self._entries.get(key)
+
+                    if entry is not None and entry[1] > now:
+                        continue
+
+                self._entries[key] = (value, expires)
+                self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, keys: Iterable[str]) -> None:
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+
+class SharedMemoryBackend(CacheBackend):
+    """Bounded store in a memory mapped file, shared by the worker processes of a host.
+
+    The file holds a fixed number of slots of a fixed size, grouped in sets of a
+    few slots. A key can only be stored in the set its hash maps to, and evicts
+    the entry of that set which expires first. Values which do not fit in a slot
+    are not stored.
+
+    Sets are locked with a record lock on their range of the file, which excludes
+    other processes, along with a lock which excludes the threads of this one. The
+    file is opened on first use, and created if it does not exist. It should be on
+    a memory backed file system, such as `/dev/shm`.
+
+    The name of the file is the path suffixed with its layout, e.g.
+    `read-cache-1024x16384` for 1024 slots of 16384 bytes, so that workers laid out
+    differently, such as those of a previous deployment which are still serving,
+    never share a file.
+    """
+
+    name = "shared"
+
+    # The number of slots in a set.
+    WAYS = 8
+
+    # The layout of the file header: a magic number, the number of sets and the
+    # size of a slot.
+    MAGIC = b"RDCACHE1"
+    FILE_HEADER = struct.Struct("<8sII")
+
+    # The layout of the header of a slot: the wall clock time the entry expires at
+    # (0 if the slot is empty), the hash of its key, and the lengths of its key and
+    # value, which follow the header.
+    SLOT_HEADER = struct.Struct("<dQHI")
+
+    def __init__(self, path: str, max_size: int, slot_size: int) -> None:
+        self.slot_size = slot_size
+        self.sets = max(1, -(-max_size // self.WAYS))
+        self.path = f"{path}-{self.sets * self.WAYS}x{slot_size}"
+        self.size = self.FILE_HEADER.size + self.sets * self.WAYS * slot_size
+        self._fd: Optional[int] = None
+        self._map: Optional[mmap.mmap] = None
+        self._lock = threading.Lock()
+
+    def get_many(self, keys: List[str]) -> List[Optional[bytes]]:
+        values = []
+        now = time.time()
+
+        for key in keys:
+            encoded = key.encode()
+            key_hash, start = self._locate(encoded)
+
+            with self._locked(start):
+                slot = self._find(start, key_hash, encoded, now)
+                values.append(self._value(slot) if slot is not None else None)
+
+        return values
+
+    def set_many(
+        self, items: Dict[str, bytes], ttl: Optional[float], only_new: bool = False
+    ) -> None:
+        now = time.time()
+        expires = now + ttl if ttl is not None else float("inf")
+
+        for key, value in items.items():
+            encoded = key.encode()
+            key_hash, start = self._locate(encoded)
+
+            with self._locked(start):
+                slot = self._find(start, key_hash, encoded, now)
+
+                if slot is not None and only_new:
+                    continue
+
+                if self.SLOT_HEADER.size + len(encoded) + len(value) > self.slot_size:
+                    # Too large to store: drop the value it replaces, if any.
+                    if slot is not None:
+                        self._clear(slot)
+
+                    continue
+
+                if slot is None:
+                    slot = self._victim(start, now)
+
+                self._write(slot, expires, key_hash, encoded, value)
+
+    def delete(self, keys: Iterable[str]) -> None:
+        now = time.time()
+
+        for key in keys:
+            encoded = key.encode()
+            key_hash, start = self._locate(encoded)
+
+            with self._locked(start):
+                slot = self._find(start, key_hash, encoded, now)
+
+                if slot is not None:
+                    self._clear(slot)
+
+    def close(self) -> None:
+        """Unmap and close the file."""
+        with self._lock:
+            if self._map is not None:
+                self._map.close()
+                os.close(self._fd)  # type: ignore
+
+            self._map = self._fd = None
+
+    def _open(self) -> mmap.mmap:
+        if self._map is not None:
+            return self._map
+
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+
+        try:
+            # Laid out by the first process to open it, while the others wait.
+            fcntl.lockf(fd, fcntl.LOCK_EX)
+
+            try:
+                header = self.FILE_HEADER.pack(self.MAGIC, self.sets, self.slot_size)
+                size = os.fstat(fd).st_size
+
+                if size == 0:
+                    os.ftruncate(fd, self.size)
+                    os.pwrite(fd, header, 0)
+                elif size != self.size or os.pread(fd, len(header), 0) != header:
+                    # Other processes may have it mapped, so it is never laid out again.
+                    raise ValueError(f"{self.path} is not a read cache file of this layout")
+            finally:
+                fcntl.lockf(fd, fcntl.LOCK_UN)
+
+            self._map = mmap.mmap(fd, self.size)
+            self._fd = fd
+        except Exception:
+            os.close(fd)
+            raise
+
+        return self._map
+
+    def _locate(self, key: bytes) -> Tuple[int, int]:
+        # A hash which is the same in every process, unlike the builtin one.
+        key_hash = int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little")
+        start = self.FILE_HEADER.size + (key_hash % self.sets) * self.WAYS * self.slot_size
+
+        return key_hash, start
+
+    @contextmanager
+    def _locked(self, start: int) -> Iterator[None]:
+        length = self.WAYS * self.slot_size
+
+        with self._lock:
+            self._open()
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, length, start)  # type: ignore
+
+            try:
+                yield
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, length, start)  # type: ignore
+
+    def _slots(self, start: int) -> range:
+        return range(start, start + self.WAYS * self.slot_size, self.slot_size)
+
+    def _find(self, start: int, key_hash: int, key: bytes, now: float) -> Optional[int]:
+        data: Any = self._map
+
+        for slot in self._slots(start):
+            expires, slot_hash, key_length, _ = self.SLOT_HEADER.unpack_from(data, slot)
+            key_start = slot + self.SLOT_HEADER.size
+            key_end = key_start + key_length
+
+            if expires > now and slot_hash == key_hash and data[key_start:key_end] == key:
+                return slot
+
+        return None
+
+    def _victim(self, start: int, now: float) -> int:
+        victim, soonest = start, float("inf")
+
+        for slot in self._slots(start):
+            (expires,) = struct.unpack_from("<d", self._map, slot)  # type: ignore
+
+            if expires <= now:
+                return slot
+
+            if expires < soonest:
+                victim, soonest = slot, expires
+
+        return victim
+
+    def _value(self, slot: int) -> bytes:
+        data: Any = self._map
+        _, _, key_length, value_length = self.SLOT_HEADER.unpack_from(data, slot)
+        start = slot + self.SLOT_HEADER.size + key_length
+        end = start + value_length
+
+        return data[start:end]
+
+    def _write(self, slot: int, expires: float, key_hash: int, key: bytes, value: bytes) -> None:
+        data: Any = self._map
+        key_start = slot + self.SLOT_HEADER.size
+        value_start = key_start + len(key)
+        value_end = value_start + len(value)
+
+        data[key_start:value_start] = key
+        data[value_start:value_end] = value
+        self.SLOT_HEADER.pack_into(data, slot, expires, key_hash, len(key), len(value))
+
+    def _clear(self, slot: int) -> None:
+        struct.pack_into("<d", self._map, slot, 0.0)  # type: ignore
+
+
+class RespError(Exception):
+    """An error reply from a server which speaks the Redis protocol."""
+
+
+class RespBackend(CacheBackend):
+    """Store on a server which speaks the Redis protocol (RESP), such as Redis, Valkey
+    or KeyDB, shared by every worker of every host.
+
+    Each thread has its own connection to the server, opened on first use. A
+    connection which fails is closed, and opened again by the next operation.
+
+    Eviction is up to the server, which should be configured with a maximum memory
+    and an LRU eviction policy.
+    """
+
+    name = "resp"
+    blocking = True
+
+    def __init__(self, url: str, timeout: float = 1.0) -> None:
+        parsed = urlparse(url)
+
+        self.url = url
+        self.timeout = timeout
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self._local = threading.local()
+
+    def get_many(self, keys: List[str]) -> List[Optional[bytes]]:
+        return self.execute([("MGET", *keys)])[0]
+
+    def set_many(
+        self, items: Dict[str, bytes], ttl: Optional[float], only_new: bool = False
+    ) -> None:
+        options: Tuple[str, ...] = ()
+
+        if ttl is not None:
+            options += ("PX", str(max(1, int(ttl * 1000))))
+
+        if only_new:
+            options += ("NX",)
+
+        self.execute([("SET", key, value, *options) for key, value in items.items()])
+
+    def delete(self, keys: Iterable[str]) -> None:
+        keys = list(keys)
+
+        if keys:
+            self.execute([("DEL", *keys)])
+
+    def execute(self, commands: List[Tuple[Any, ...]]) -> List[Any]:
+        """Send commands to the server in a single round trip, and read their replies.
+
+        Args:
+            commands: The commands, each a tuple of its name and arguments.
+
+        Returns:
+            The reply to each command.
+
+        Raises:
+            RespError: The server replied to a command with an error.
+            OSError: The connection to the server failed.
+        """
+        connection = self._connection()
+
+        try:
+            connection.sendall(b"".join(encode_command(command) for command in commands))
+
+            replies = [read_reply(connection.reader) for _ in commands]
+        except (OSError, ValueError):
+            self.close()
+            raise
+
+        for reply in replies:
+            if isinstance(reply, RespError):
+                raise reply
+
+        return replies
+
+    def close(self) -> None:
+        """Close the connection of this thread, if it has one."""
+        connection = getattr(self._local, "connection", None)
+        self._local.connection = None
+
+        if connection is not None:
+            connection.close()
+
+    def _connection(self) -> "_RespConnection":
+        connection = getattr(self._local, "connection", None)
+
+        if connection is None:
+            connection = _RespConnection(self.host, self.port, self.timeout)
+
+            setup: List[Tuple[Any, ...]] = []
+
+            if self.password is not None:
+                setup.append(("AUTH", self.password))
+
+            if self.db:
+                setup.append(("SELECT", str(self.db)))
+
+            if setup:
+                try:
+                    connection.sendall(b"".join(encode_command(command) for command in setup))
+
+                    for _ in setup:
+                        reply = read_reply(connection.reader)
+
+                        if isinstance(reply, RespError):
+                            raise reply
+                except Exception:
+                    connection.close()
+                    raise
+
+            self._local.connection = connection
+
+        return connection
+
+
+class _RespConnection:
+    """A socket connected to a RESP server, and a buffered reader of its replies."""
+
+    def __init__(self, host: str, port: int, timeout: float) -> None:
+        self.socket = socket.create_connection((host, port), timeout=timeout)
+        self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.reader = self.socket.makefile("rb")
+
+    def sendall(self, data: bytes) -> None:
+        self.socket.sendall(data)
+
+    def close(self) -> None:
+        self.reader.close()
+        self.socket.close()
+
+
+def encode_command(command: Tuple[Any, ...]) -> bytes:
+    """Encode a command as a RESP array of bulk strings.
+
+    Args:
+        command: The name of the command and its arguments, as strings or bytes.
+
+    Returns:
+        The encoded command.
+    """
+    parts = [b"*%d\r\n" % len(command)]
+
+    for arg in command:
+        if isinstance(arg, str):
+            arg = arg.encode()
+
+        parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+
+    return b"".join(parts)
+
+
+def read_reply(reader: Any) -> Any:
+    """Read a RESP reply.
+
+    Args:
+        reader: A buffered binary reader of the connection.
+
+    Returns:
+        The reply: bytes for strings, an int for integers, a list for arrays, None
+        for null replies, or a RespError for errors.
+
+    Raises:
+        ConnectionError: The connection was closed.
+        ValueError: The reply is malformed.
+    """
+    line = reader.readline()
+
+    if not line.endswith(b"\r\n"):
+        raise ConnectionError("connection closed by the server")
+
+    kind, payload = line[:1], line[1:-2]
+
+    if kind == b"+":
+        return payload
+
+    if kind == b"-":
+        return RespError(payload.decode(errors="replace"))
+
+    if kind == b":":
+        return int(payload)
+
+    if kind == b"$":
+        length = int(payload)
+
+        if length < 0:
+            return None
+
+        data = reader.read(length + 2)
+
+        if len(data) != length + 2:
+            raise ConnectionError("connection closed by the server")
+
+        return data[:-2]
+
+    if kind == b"*":
+        length = int(payload)
+
+        if length < 0:
+            return None
+
+        return [read_reply(reader) for _ in range(length)]
+
+    raise ValueError(f"malformed reply: {line!r}")
@@ -0,0 +1,137 @@
+"""Dispatch table from generic resource paths to their tables."""
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+from containerlog import get_logger
+from fastapi import HTTPException
+from sqlalchemy import MetaData, Table  # type: ignore
+
+from ...db.exc.catalog import operations_catalog
+from ...db.exc.statements import TableStatements, statement_cache
+from ...db.reflection import schema_reflector
+from ...utils.utils import get_schema_models
+
+logger = get_logger()
+
+__all__ = [
+    "Resource",
+    "ResourceDispatcher",
+    "dispatcher",
+]
+
+
+class Resource:
+    """A generic resource, and everything needed to serve requests for it.
+
+    Attributes which can change at runtime, such as the permitted operations and
+    the schema models, are read through from their in-process catalogs.
+    """
+
+    def __init__(self, table: Table) -> None:
+        self.table = table
+        self.table_name: str = table.name
+        self.name: str = table.name.replace("_", "-")
+        self.soft_delete = "deleted_at" in table.c.keys()
+        self.statements: TableStatements = statement_cache.for_table(table)
+
+        # The operations table is always available, so that operations can be granted.
+        self.unrestricted = table.name == "operations"
+
+    @property
+    def operations(self) -> Dict:
+        """The operations permitted on the resource."""
+        return operations_catalog.for_table(self.table_name)
+
+    @property
+    def schema_models(self) -> Dict[str, Any]:
+        """The schema models of the resource."""
+        return get_schema_models(self.table_name)
+
+    def permits(self, operation: str) -> bool:
+        """Check whether an operation is permitted on the resource.
+
+        Args:
+            operation: The operation, e.g. `read_op`.
+
+        Returns:
+            True if the operation is permitted.
+        """
+        return self.unrestricted or bool(self.operations.get(operation))
+
+
+class ResourceDispatcher:
+    """Map of the hyphenated resource names in generic paths to their resources.
+
+    The map is built once for each schema generation, and kept in the `info` of its
+    metadata, so resolving a request path costs a single dict lookup, and requests
+    for unknown resources are rejected before any database work is done. Requests
+    are resolved against the generation they are pinned to.
+    """
+
+    def __init__(self) -> None:
+        # The key of the map in the info of the metadata, unique to the dispatcher.
+        self._key = object()
+        self._lock = threading.Lock()
+
+    def build(self, metadata: MetaData) -> Dict[str, Resource]:
+        """Build the map for the tables of a schema, replacing the existing one.
+
+        Args:
+            metadata: The tables to serve as resources.
+
+        Returns:
+            The map.
+        """
+        resources = {
+            resource.name: resource for resource in map(Resource, metadata.tables.values())
+        }
+
+        with self._lock:
+            metadata.info[self._key] = resources
+
+        logger.debug("built resource dispatch table", count=len(resources))
+
+        return resources
+
+    def get(self, name: str) -> Optional[Resource]:
+        """Get a resource by its hyphenated name.
+
+        Args:
+            name: The hyphenated name of the resource.
+
+        Returns:
+            The resource, if it exists.
+        """
+        metadata = schema_reflector.metadata
+
+        resources = metadata.info.get(self._key)
+
+        if resources is None:
+            resources = self.build(metadata)
+
+        return resources.get(name)
+
+    def resolve(self, full_path: str) -> Tuple[Resource, Optional[str]]:
+        """Resolve a generic request path.
+
+        Args:
+            full_path: The path, relative to the API version prefix.
+
+        Returns:
+            The resource, and the rest of the path if there is any.
+
+        Raises:
+            HTTPException: The resource does not exist.
+        """
+        name, _, rest = full_path.partition("/")
+
+        resource = self.get(name)
+
+        if resource is None:
+            raise HTTPException(status_code=404)
+
+        return resource, rest.rstrip("/") or None
+
+
+# Global dispatch table for the generic routes.
+dispatcher = ResourceDispatcher()
@@ -0,0 +1,107 @@
+"""Validation and JSON encoding of generic resource responses."""
+import itertools
+from typing import Any, Dict, Iterable, List, Type
+
+import orjson
+from pydantic import BaseModel
+from pydantic.json import pydantic_encoder
+from starlette.responses import JSONResponse
+
+from ...core.config import settings
+
+__all__ = [
+    "ORJSONResponse",
+    "encode",
+    "encode_ndjson",
+    "validate_row",
+    "validate_rows",
+]
+
+
+def encode(content: Any) -> bytes:
+    """Encode content as JSON.
+
+    Types which orjson does not encode natively, such as models and decimals, are
+    encoded as FastAPI would encode them.
+
+    Args:
+        content: The content to encode.
+
+    Returns:
+        The JSON encoded content.
+    """
+    return orjson.dumps(content, default=pydantic_encoder)
+
+
+def encode_ndjson(rows: Iterable[Any]) -> bytes:
+    """Encode rows as newline delimited JSON.
+
+    Args:
+        rows: The rows to encode.
+
+    Returns:
+        The newline delimited JSON encoded rows.
+    """
+    return b"".join(encode(row) + b"\n" for row in rows)
+
+
+class ORJSONResponse(JSONResponse):
+    """JSON response which is encoded with orjson.
+
+    Content returned in this response is encoded directly, rather than first being
+    converted to JSON compatible types by `jsonable_encoder`.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return encode(content)
+
+
+# Counts validated rows in the sampled response validation mode.
+_sampled = itertools.count()
+
+
+def validate_row(model: Type[BaseModel], row: Dict[str, Any]) -> Any:
+    """Validate a row read from the database as configured, before it is returned.
+
+    With `strict` response validation, every row is validated and its model is
+    returned. With `sampled` validation, one in every sample rate rows is validated,
+    and with `off` none are, and the rows are returned as they were read.
+
+    Args:
+        model: The model to validate the row with.
+        row: The row to validate.
+
+    Returns:
+        The validated row.
+
+    Raises:
+        ValidationError: The row failed validation.
+    """
+    mode = settings.response_validation
+
+    if mode == "strict":
+        return model(**row)
+
+    if mode == "sampled" and next(_sampled) % settings.response_validation_sample_rate == 0:
+        model(**row)
+
+    return row
+
+
+def validate_rows(model: Type[BaseModel], rows: Iterable[Dict[str, Any]]) -> List[Any]:
+    """Validate rows read from the database as configured, before they are returned.
+
+    Args:
+        model: The model to validate each row with.
+        rows: The rows to validate.
+
+    Returns:
+        The validated rows.
+
+    Raises:
+        ValidationError: A row failed validation.
+    """
+    if settings.response_validation == "off":
+        return list(rows)
+
+    return [validate_row(model, row) for row in rows]
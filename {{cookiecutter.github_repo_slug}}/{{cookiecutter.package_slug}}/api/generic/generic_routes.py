@@ -1,21 +1,184 @@
 """API routes for Organization resources."""
-import re
-from typing import Any, Dict, Optional
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Type, Union
 from uuid import UUID
 
 from containerlog import get_logger
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel, ValidationError
+from pydantic.error_wrappers import ErrorWrapper
 from sqlalchemy.orm import Session  # type: ignore
+from starlette.concurrency import run_in_threadpool
 
-from ...db.exc import executioner
-from ...db.session import metadata
+from ...core.config import settings
+from ...db.exc import async_executioner, executioner
+from ...db.exc.catalog import operations_catalog, relationship_catalog
+from ...db.instrumentation import annotate
+from ...db.workers import db_workers
 from ...metadata import responses
 from ...schema.v1.generic_models import FilterPayload
-from ...utils.utils import get_schema_models, split_rtrim
-from ..depends import get_db
+from ..depends import get_async_db, get_db
+from .dispatch import Resource, dispatcher
+from .encoding import ORJSONResponse, encode, encode_ndjson, validate_row, validate_rows
+from .read_cache import CachedResponse, etag_matches, read_cache
 
 logger = get_logger()
-router = APIRouter()
+router = APIRouter(default_response_class=ORJSONResponse)
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+# The database session dependency of the configured execution mode.
+get_session = get_async_db if settings.db_execution_mode == "async" else get_db
+
+
+async def execute(command: Callable[..., Any], *args: Any) -> Any:
+    """Run an executioner command in the configured execution mode.
+
+    In the sync execution mode, the command is run on the database worker pool so
+    that it does not block the event loop. In the async execution mode, the async
+    twin of the command is awaited instead.
+
+    Args:
+        command: The executioner command to run.
+        *args: The arguments of the command, ending with the database session.
+
+    Returns:
+        The result of the command.
+    """
+    if settings.db_execution_mode == "async":
+        return await getattr(async_executioner, command.__name__)(*args)
+
+    return await db_workers.run(command, *args)
+
+
+async def in_read_cache(operation: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """Run a read cache operation, on a worker thread if its backend blocks on I/O.
+
+    Args:
+        operation: The read cache operation to run.
+        *args: The arguments of the operation.
+        **kwargs: The keyword arguments of the operation.
+
+    Returns:
+        The result of the operation.
+    """
+    if read_cache.blocking:
+        return await run_in_threadpool(operation, *args, **kwargs)
+
+    return operation(*args, **kwargs)
+
+
+async def stream_ndjson(resource_table_name: str, model: Type[BaseModel]) -> AsyncIterator[bytes]:
+    """Stream the resources of a table as newline delimited JSON.
+
+    Each batch of resources read from the database is validated and written as
+    a single chunk, so memory use does not depend on the size of the table.
+
+    Each batch is read on the database worker pool, so streams are subject to its
+    backpressure like any other read. The session of the stream is closed when the
+    stream ends, fails, or is closed because the client went away.
+
+    Args:
+        resource_table_name: The table name of the resource.
+        model: The model to validate each resource with.
+
+    Returns:
+        An async iterator of newline delimited JSON chunks.
+    """
+    batches = executioner.stream_resources(resource_table_name)
+
+    try:
+        while True:
+            # A generator can not raise StopIteration into a future: it ends with None.
+            batch = await db_workers.run(next, batches, None)
+
+            if batch is None:
+                return
+
+            yield encode_ndjson(validate_rows(model, batch))
+    finally:
+        # Closing the generator closes its session, which may wait on the database.
+        await run_in_threadpool(batches.close)
+
+
+async def stream_ndjson_async(
+    resource_table_name: str, model: Type[BaseModel]
+) -> AsyncIterator[bytes]:
+    """Stream the resources of a table as newline delimited JSON, in the async
+    execution mode.
+
+    Args:
+        resource_table_name: The table name of the resource.
+        model: The model to validate each resource with.
+
+    Returns:
+        An async iterator of newline delimited JSON chunks.
+    """
+    async for batch in async_executioner.stream_resources(resource_table_name):
+        yield encode_ndjson(validate_rows(model, batch))
+
+
+def cached_response(cached: CachedResponse, request: Request) -> Response:
+    """Respond with a single resource, or with 304 Not Modified if the client sent
+    its entity tag in the `If-None-Match` header.
+
+    Args:
+        cached: The encoded resource and its entity tag.
+        request: The incoming request.
+
+    Returns:
+        The response.
+    """
+    headers = {"ETag": cached.etag}
+
+    if etag_matches(cached.etag, request.headers.get("if-none-match")):
+        return Response(status_code=304, headers=headers)
+
+    return Response(cached.body, media_type="application/json", headers=headers)
+
+
+def resolve_collection(full_path: str) -> Resource:
+    """Resolve a generic path which may only name a resource collection.
+
+    Args:
+        full_path: The path, relative to the API version prefix.
+
+    Returns:
+        The resource.
+
+    Raises:
+        HTTPException: The resource does not exist, or the path goes beyond it.
+    """
+    resource, rest = dispatcher.resolve(full_path)
+
+    if rest is not None:
+        raise HTTPException(status_code=404)
+
+    return resource
+
+
+async def check_operation(resource: Resource, operation: str, db: Any) -> None:
+    """Check that an operation is permitted on a resource.
+
+    The catalogs the operations and the schema models of the resource are read from
+    are reloaded first if needed, without blocking the event loop.
+
+    Args:
+        resource: The resource.
+        operation: The operation, e.g. `read_op`.
+        db: The database session to use if the catalogs need reloading.
+
+    Raises:
+        NotImplementedError: The operation is not permitted.
+    """
+    annotate(resource.table_name, operation)
+
+    if not (operations_catalog.loaded and relationship_catalog.loaded):
+        await execute(executioner.load_catalogs, db)
+
+    if not resource.permits(operation):
+        raise NotImplementedError("route is not supported")
 
 
 @router.get(
@@ -26,55 +189,74 @@ router = APIRouter()
     },
 )
 async def get_resources(
+    request: Request,
     full_path: str,
     filter_payload: Optional[FilterPayload] = None,
-    db: Session = Depends(get_db),
+    limit: Optional[int] = Query(None, ge=1),
+    cursor: Optional[str] = None,
+    stream: bool = False,
+    db: Session = Depends(get_session),
 ) -> Any:
     """Get all or a single resources.
 
+    Collections are paginated when a `limit` or a `cursor` is given, or when a
+    default page size is configured. When there are more resources, the cursor for
+    the next page is returned in the `X-Next-Cursor` header and as a `next` link in
+    the `Link` header.
+
+    Alternatively, a whole collection can be streamed as newline delimited JSON
+    by requesting `application/x-ndjson` in the `Accept` header, or by setting
+    the `stream` query parameter. Streams are not paginated, so `limit` and
+    `cursor` are rejected.
+
+    A single resource is returned with its `ETag`, and a request with a matching
+    `If-None-Match` header is answered with 304 Not Modified. If the read cache is
+    enabled, cached resources are served without querying the database.
+
     Args:
+        request: The incoming request.
         full_path: The full path to validate and process.
         filter_payload: The optional filter payload to use.
+        limit: The maximum number of resources to return in a page.
+        cursor: The cursor of the page to return, from a previous page.
+        stream: Stream the whole collection as newline delimited JSON.
         db: The database session to use for queries.
 
     Returns:
         Either the list of resources or a single resource.
     """
-    # Validate full path
-    if re.search(r"^[a-z-]+[\/]?[0-9a-z\-]*$", full_path) is None:
-        raise HTTPException(status_code=500, detail="invalid path")
-
-    split_path = split_rtrim(full_path, "/")
-
-    resource_table_name = split_path[0].replace("-", "_")
-
     # Validate endpoint
-    if resource_table_name not in metadata.tables.keys():
-        raise HTTPException(status_code=404)
+    resource, resource_id = dispatcher.resolve(full_path)
 
-    operations = executioner.get_operations(resource_table_name, db)
+    resource_table_name = resource.table_name
 
     # Validate operation
-    if not resource_table_name == "operations" and not operations.get("read_op"):
-        raise NotImplementedError("route is not supported")
+    await check_operation(resource, "read_op", db)
 
-    schema_models = get_schema_models(resource_table_name)
+    schema_models = resource.schema_models
 
-    if len(split_path) > 1:
-        resource_id = split_path[-1]
-
-        # Validate UUID
+    if resource_id is not None:
+        # Validate UUID, and normalize it so it is cached under a single key.
         try:
-            UUID(resource_id)
+            resource_id = str(UUID(resource_id))
         except ValueError:
             raise HTTPException(status_code=500, detail="Malformed UUID")
 
-        response = executioner.get_resource(resource_id, resource_table_name, db)
+        cached, versions = await in_read_cache(read_cache.get, resource_table_name, resource_id)
 
-        # Validate response
-        validated_response = schema_models["ModelReturn"](**response)
+        if cached is None:
+            response = await execute(executioner.get_resource, resource_id, resource_table_name, db)
 
-        return validated_response
+            # Validate response
+            validated_response = validate_row(schema_models["ModelReturn"], response)
+
+            body = encode(validated_response)
+
+            cached = await in_read_cache(
+                read_cache.put, resource_table_name, resource_id, body, versions
+            )
+
+        return cached_response(cached, request)
 
     if filter_payload is not None:
         if filter_payload.ids is not None:
@@ -85,19 +267,42 @@ async def get_resources(
                 except ValueError:
                     raise HTTPException(status_code=500, detail="Malformed UUID")
 
-            response = executioner.get_some_resources(filter_payload.ids, resource_table_name, db)
+            response = await execute(
+                executioner.get_some_resources, filter_payload.ids, resource_table_name, db
+            )
 
             # Validate response
-            validated_response = [schema_models["ModelReturn"](**data) for data in response]
+            validated_response = validate_rows(schema_models["ModelReturn"], response)
 
-            return validated_response
+            return ORJSONResponse(validated_response)
 
-    response = executioner.get_resources(resource_table_name, db)
+    if stream or NDJSON_MEDIA_TYPE in request.headers.get("accept", ""):
+        if limit is not None or cursor is not None:
+            raise HTTPException(status_code=400, detail="Streamed collections can not be paginated")
+
+        if settings.db_execution_mode == "async":
+            chunks = stream_ndjson_async(resource_table_name, schema_models["ModelReturn"])
+        else:
+            chunks = stream_ndjson(resource_table_name, schema_models["ModelReturn"])
+
+        return StreamingResponse(chunks, media_type=NDJSON_MEDIA_TYPE)
+
+    resources, next_cursor = await execute(
+        executioner.get_resources, resource_table_name, db, limit, cursor
+    )
+
+    headers = {}
+
+    if next_cursor is not None:
+        next_url = request.url.include_query_params(cursor=next_cursor)
+
+        headers["X-Next-Cursor"] = next_cursor
+        headers["Link"] = f'<{next_url}>; rel="next"'
 
     # Validate response
-    validated_response = [schema_models["ModelReturn"](**data) for data in response]
+    validated_response = validate_rows(schema_models["ModelReturn"], resources)
 
-    return validated_response
+    return ORJSONResponse(validated_response, headers=headers)
 
 
 @router.post(
@@ -108,51 +313,98 @@ async def get_resources(
     },
 )
 async def create_resource(
-    payload: Dict[str, Any],
+    payload: Union[List[Dict[str, Any]], Dict[str, Any]],
     full_path: str,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_session),
 ) -> Any:
-    """Create a new resource.
+    """Create a new resource, or many new resources at once.
 
     Args:
         full_path: The full path.
-        payload: The payload to create a new resource.
+        payload: The payload to create a new resource, or a list of payloads to
+            create many new resources.
         db: The database session to use for queries.
 
     Returns:
-        The newly created resource.
+        The newly created resource, or the list of newly created resources.
     """
-    # Validate full path
-    if len(full_path.split("/")) > 1:
-        raise HTTPException(status_code=404)
-
-    resource_table_name = full_path.split("/")[0].replace("-", "_")
-
     # Validate endpoint
-    if resource_table_name not in metadata.tables.keys():
-        raise HTTPException(status_code=404)
+    resource = resolve_collection(full_path)
 
-    operations = executioner.get_operations(resource_table_name, db)
+    resource_table_name = resource.table_name
 
     # Validate operation
-    if not resource_table_name == "operations" and not operations.get("create_op"):
-        raise NotImplementedError("route is not supported")
+    await check_operation(resource, "create_op", db)
 
     # Validate payload
-    schema_models = get_schema_models(resource_table_name)
+    schema_models = resource.schema_models
+
+    if isinstance(payload, list):
+        validated_payloads = validate_bulk_payload(payload, schema_models["ModelPayload"])
+
+        response = await execute(
+            executioner.create_resources,
+            validated_payloads,
+            resource_table_name,
+            db,
+        )
+
+        # Validate response
+        validated_response = validate_rows(schema_models["ModelReturn"], response)
+
+        return ORJSONResponse(validated_response)
 
     validated_payload = schema_models["ModelPayload"](**payload)
 
-    response = executioner.create_resource(
+    response = await execute(
+        executioner.create_resource,
         validated_payload,
         resource_table_name,
         db,
     )
 
     # Validate response
-    validated_response = schema_models["ModelReturn"](**response)
+    validated_response = validate_row(schema_models["ModelReturn"], response)
+
+    return ORJSONResponse(validated_response)
+
+
+def validate_bulk_payload(payload: List[Dict[str, Any]], model: Type[BaseModel]) -> List[Any]:
+    """Validate every item of a bulk payload.
+
+    Args:
+        payload: The list of payloads to validate.
+        model: The model to validate each payload with.
+
+    Returns:
+        The validated payloads.
+
+    Raises:
+        RequestValidationError: One or more items failed validation. The location of
+            each error is prefixed with the index of the failing item.
+    """
+    if not payload:
+        raise HTTPException(status_code=400, detail="Empty body")
 
-    return validated_response
+    if len(payload) > settings.max_bulk_size:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many items, at most {settings.max_bulk_size} are allowed",
+        )
+
+    validated_payloads = []
+    errors = []
+
+    for idx, item in enumerate(payload):
+        try:
+            validated_payloads.append(model(**item))
+        except ValidationError as exc:
+            errors.append(ErrorWrapper(exc, loc=("body", idx)))
+
+    if errors:
+        raise RequestValidationError(errors)
+
+    return validated_payloads
 
 
 @router.patch(
@@ -166,7 +418,7 @@ async def update_resource(
     payload: Dict[str, Any],
     full_path: str,
     resource_id: str,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_session),
 ) -> Any:
     """Update a resource.
 
@@ -179,21 +431,13 @@ async def update_resource(
     Returns:
         The updated resource.
     """
-    # Validate full path
-    if len(full_path.split("/")) > 1:
-        raise HTTPException(status_code=404)
-
-    resource_table_name = full_path.split("/")[0].replace("-", "_")
-
     # Validate endpoint
-    if resource_table_name not in metadata.tables.keys():
-        raise HTTPException(status_code=404)
+    resource = resolve_collection(full_path)
 
-    operations = executioner.get_operations(resource_table_name, db)
+    resource_table_name = resource.table_name
 
     # Validate operation
-    if not resource_table_name == "operations" and not operations.get("update_op"):
-        raise NotImplementedError("route is not supported")
+    await check_operation(resource, "update_op", db)
 
     try:
         UUID(resource_id)
@@ -201,14 +445,15 @@ async def update_resource(
         raise HTTPException(status_code=500, detail="Malformed UUID")
 
     # Validate payload
-    schema_models = get_schema_models(resource_table_name)
+    schema_models = resource.schema_models
 
     validated_payload = schema_models["ModelOptPayload"](**payload)
 
     if validated_payload.dict() == {}:
         raise HTTPException(status_code=500, detail="Empty body")
 
-    response = executioner.update_resource(
+    response = await execute(
+        executioner.update_resource,
         resource_id,
         resource_table_name,
         validated_payload,
@@ -216,9 +461,9 @@ async def update_resource(
     )
 
     # Validate response
-    validated_response = schema_models["ModelReturn"](**response)
+    validated_response = validate_row(schema_models["ModelReturn"], response)
 
-    return validated_response
+    return ORJSONResponse(validated_response)
 
 
 @router.delete(
@@ -231,7 +476,7 @@ async def update_resource(
 async def delete_resource(
     full_path: str,
     resource_id: str,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_session),
 ) -> Any:
     """Delete a resource.
 
@@ -243,32 +488,24 @@ async def delete_resource(
     Returns:
         The deleted resource.
     """
-    # Validate full path
-    if len(full_path.split("/")) > 1:
-        raise HTTPException(status_code=404)
-
-    resource_table_name = full_path.split("/")[0].replace("-", "_")
-
     # Validate endpoint
-    if resource_table_name not in metadata.tables.keys():
-        raise HTTPException(status_code=404)
+    resource = resolve_collection(full_path)
 
-    operations = executioner.get_operations(resource_table_name, db)
+    resource_table_name = resource.table_name
 
     # Validate operation
-    if not resource_table_name == "operations" and not operations.get("delete_op"):
-        raise NotImplementedError("route is not supported")
+    await check_operation(resource, "delete_op", db)
 
     try:
         UUID(resource_id)
     except ValueError:
         raise HTTPException(status_code=500, detail="Malformed UUID")
 
-    response = executioner.delete_resource(resource_id, resource_table_name, db)
+    response = await execute(executioner.delete_resource, resource_id, resource_table_name, db)
 
-    schema_models = get_schema_models(resource_table_name)
+    schema_models = resource.schema_models
 
     # Validate response
-    validated_response = schema_models["ModelReturn"](**response)
+    validated_response = validate_row(schema_models["ModelReturn"], response)
 
-    return validated_response
+    return ORJSONResponse(validated_response)
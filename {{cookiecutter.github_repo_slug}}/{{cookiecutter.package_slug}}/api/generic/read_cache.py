@@ -0,0 +1,347 @@
+"""Cache of single resource responses, with their entity tags."""
+import hashlib
+import os
+from typing import Any, Iterable, Optional, Tuple
+
+from containerlog import get_logger
+from prometheus_client import Counter  # type: ignore
+
+from ...core.config import settings
+from ...db.invalidation import Invalidation
+from .cache_backends import CacheBackend, MemoryBackend, RespBackend, SharedMemoryBackend
+
+logger = get_logger()
+
+__all__ = [
+    "CachedResponse",
+    "ReadCache",
+    "read_cache",
+    "make_etag",
+    "etag_matches",
+    "create_backend",
+]
+
+READ_CACHE_LOOKUPS_TOTAL = Counter(
+    name="read_cache_lookups_total",
+    documentation="Total count of single resource read cache lookups, by backend and result",
+    labelnames=("backend", "result"),
+)
+
+READ_CACHE_ERRORS_TOTAL = Counter(
+    name="read_cache_errors_total",
+    documentation="Total count of failed read cache operations, by backend and operation",
+    labelnames=("backend", "operation"),
+)
+
+
+def make_etag(body: bytes) -> str:
+    """Make a strong entity tag for a response body.
+
+    The tag is a digest of the encoded resource, so it changes with the row and
+    with its associations.
+
+    Args:
+        body: The response body.
+
+    Returns:
+        The quoted entity tag.
+    """
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def etag_matches(etag: str, if_none_match: Optional[str]) -> bool:
+    """Check whether an `If-None-Match` request header matches an entity tag.
+
+    Args:
+        etag: The entity tag of the current representation of the resource.
+        if_none_match: The value of the `If-None-Match` header, if it was sent.
+
+    Returns:
+        True if the client already has the current representation.
+    """
+    if not if_none_match:
+        return False
+
+    if if_none_match.strip() == "*":
+        return True
+
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+
+        # If-None-Match uses the weak comparison: a weak tag matches the same strong tag.
+        if tag.startswith("W/"):
+            tag = tag[2:]
+
+        if tag == etag:
+            return True
+
+    return False
+
+
+class CachedResponse:
+    """The encoded body of a resource, and its entity tag.
+
+    Attributes:
+        body: The JSON encoded resource.
+        etag: The entity tag of the body.
+    """
+
+    __slots__ = ("body", "etag")
+
+    def __init__(self, body: bytes, etag: str) -> None:
+        self.body = body
+        self.etag = etag
+
+
+def new_version() -> bytes:
+    """Make a version token, unique across processes and hosts."""
+    return os.urandom(8).hex().encode()
+
+
+class ReadCache:
+    """Cache of the responses of single resource reads, keyed by table name and
+    resource id, kept in a backend which may be shared by several processes.
+
+    Entries are versioned rather than deleted on invalidation. Every resource, every
+    table and the whole cache have a version token, which is replaced by a new one
+    to invalidate them, and an entry is only served if it was stored under the
+    current tokens of its resource, its table and the cache. The tokens and the entry
+    are read together, in a single round trip to the backend.
+
+    This makes invalidation safe across processes, and against reads which raced
+    with it: a response read from the database is stored under the tokens taken
+    before the read, so if it was invalidated since, it is never served. A token
+    which is evicted or expires invalidates the entries stored under it, and is
+    replaced with a new one by the next read.
+
+    Writes through the executioner publish the resources they make stale, those
+    they write and those whose associations they change, on the invalidation bus,
+    which the cache applies. Entries also expire after a TTL, which bounds how long
+    other writes may go unseen.
+
+    Failures of the backend are logged and counted, and reads fall back to the
+    database.
+    """
+
+    EPOCH_KEY = "rc:v"
+
+    def __init__(self, backend: Optional[CacheBackend], ttl: float) -> None:
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        """Whether responses are cached."""
+        return self.backend is not None
+
+    @property
+    def blocking(self) -> bool:
+        """Whether operations block on I/O, and so must not be run on the event loop."""
+        return self.backend is not None and self.backend.blocking
+
+    @property
+    def hit_ratio(self) -> float:
+        """The share of the lookups of this process which were served from the cache."""
+        lookups = self.hits + self.misses
+
+        return self.hits / lookups if lookups else 0.0
+
+    def get(
+        self, table_name: str, resource_id: str
+    ) -> Tuple[Optional[CachedResponse], Optional[bytes]]:
+        """Get the cached response of a resource.
+
+        Args:
+            table_name: The table name of the resource.
+            resource_id: The id of the resource.
+
+        Returns:
+            The cached response, if there is a current one, and the versions to
+            store the response under if there is not.
+        """
+        if self.backend is None:
+            return None, None
+
+        entry_key = f"rc:e:{table_name}:{resource_id}"
+        version_keys = [self.EPOCH_KEY, f"rc:v:{table_name}", f"rc:v:{table_name}:{resource_id}"]
+
+        try:
+            entry, *tokens = self.backend.get_many([entry_key, *version_keys])
+
+            missing = [i for i, token in enumerate(tokens) if token is None]
+
+            if missing:
+                # The resource token expires with the entries stored under it, while
+                # the few others are kept until they are replaced or evicted.
+                created = {version_keys[i]: new_version() for i in missing}
+
+                for i in missing:
+                    tokens[i] = created[version_keys[i]]
+
+                resource_token = created.pop(version_keys[2], None)
+
+                if created:
+                    self.backend.set_many(created, None, only_new=True)
+
+                if resource_token is not None:
+                    self.backend.set_many(
+                        {version_keys[2]: resource_token}, 2 * self.ttl, only_new=True
+                    )
+        except Exception as e:
+            self._failed("get", e)
+            return None, None
+
+        versions = b"\n".join(tokens) + b"\n"  # type: ignore
+
+        if entry is not None and not missing and entry.startswith(versions):
+            versions_end = len(versions)
+            etag, body = entry[versions_end:].split(b"\n", 1)
+
+            self.hits += 1
+            READ_CACHE_LOOKUPS_TOTAL.labels(self.backend.name, "hit").inc()
+
+            return CachedResponse(body, etag.decode()), None
+
+        self.misses += 1
+        READ_CACHE_LOOKUPS_TOTAL.labels(self.backend.name, "miss").inc()
+
+        return None, versions
+
+    def put(
+        self, table_name: str, resource_id: str, body: bytes, versions: Optional[bytes]
+    ) -> CachedResponse:
+        """Cache the response of a resource.
+
+        Args:
+            table_name: The table name of the resource.
+            resource_id: The id of the resource.
+            body: The JSON encoded resource.
+            versions: The versions returned by `get` before the resource was read.
+
+        Returns:
+            The response, whether or not it was cached.
+        """
+        cached = CachedResponse(body, make_etag(body))
+
+        if self.backend is None or versions is None:
+            return cached
+
+        entry = versions + cached.etag.encode() + b"\n" + body
+
+        try:
+            self.backend.set_many({f"rc:e:{table_name}:{resource_id}": entry}, self.ttl)
+        except Exception as e:
+            self._failed("put", e)
+
+        return cached
+
+    def invalidate(self, table_name: str, resource_ids: Iterable[Any]) -> None:
+        """Invalidate the cached responses of resources.
+
+        Args:
+            table_name: The table name of the resources.
+            resource_ids: The ids of the resources.
+        """
+        if self.backend is None:
+            return
+
+        tokens = {f"rc:v:{table_name}:{resource_id}": new_version() for resource_id in resource_ids}
+
+        if not tokens:
+            return
+
+        try:
+            self.backend.set_many(tokens, 2 * self.ttl)
+        except Exception as e:
+            self._failed("invalidate", e)
+
+    def invalidate_table(self, table_name: str) -> None:
+        """Invalidate the cached responses of every resource of a table.
+
+        Args:
+            table_name: The table name of the resources.
+        """
+        if self.backend is None:
+            return
+
+        try:
+            self.backend.set_many({f"rc:v:{table_name}": new_version()}, None)
+        except Exception as e:
+            self._failed("invalidate", e)
+
+    def clear(self) -> None:
+        """Invalidate every cached response."""
+        if self.backend is None:
+            return
+
+        try:
+            self.backend.set_many({self.EPOCH_KEY: new_version()}, None)
+        except Exception as e:
+            self._failed("invalidate", e)
+
+    def apply(self, invalidation: Invalidation, remote: bool) -> None:
+        """Invalidate the cached responses an invalidation published on the bus names.
+
+        Invalidations published by other processes are only applied to a backend
+        local to this process, since the process which published them has already
+        applied them to a shared one.
+
+        Args:
+            invalidation: The invalidation.
+            remote: Whether it was published by another process.
+        """
+        if self.backend is None or (remote and not self.backend.local):
+            return
+
+        if invalidation.everything:
+            self.clear()
+            return
+
+        for table_name, resource_ids in invalidation.resources.items():
+            self.invalidate(table_name, resource_ids)
+
+        for table_name in invalidation.tables:
+            self.invalidate_table(table_name)
+
+    def close(self) -> None:
+        """Release the connections or files the backend holds, if any."""
+        if self.backend is not None:
+            self.backend.close()
+
+    def _failed(self, operation: str, error: Exception) -> None:
+        READ_CACHE_ERRORS_TOTAL.labels(self.backend.name, operation).inc()  # type: ignore
+        logger.warning(
+            "read cache operation failed",
+            backend=self.backend.name,  # type: ignore
+            operation=operation,
+            error=str(error),
+        )
+
+
+def create_backend() -> Optional[CacheBackend]:
+    """Create the backend of the read cache, as configured.
+
+    Returns:
+        The backend, or None if the read cache is disabled.
+    """
+    if settings.read_cache_size <= 0:
+        return None
+
+    # Each cached response takes two entries: the response and its version token.
+    max_size = 2 * settings.read_cache_size
+
+    if settings.read_cache_backend == "shared":
+        return SharedMemoryBackend(
+            settings.read_cache_path, max_size, settings.read_cache_entry_size
+        )
+
+    if settings.read_cache_backend == "resp":
+        return RespBackend(settings.read_cache_url, settings.read_cache_timeout)
+
+    return MemoryBackend(max_size)
+
+
+# Global cache of single resource responses, as configured.
+read_cache = ReadCache(create_backend(), settings.read_cache_ttl)
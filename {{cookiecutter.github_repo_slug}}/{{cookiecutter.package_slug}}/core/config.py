@@ -2,9 +2,9 @@
 
 For details, see: https://pydantic-docs.helpmanual.io/usage/settings/
 """
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Literal, Optional
 
-from pydantic import BaseSettings, PostgresDsn, validator
+from pydantic import BaseSettings, PositiveInt, PostgresDsn, validator
 
 
 class Settings(BaseSettings):
@@ -24,6 +24,95 @@ class Settings(BaseSettings):
     postgres_db: str
     sqlalchemy_database_uri: Optional[PostgresDsn] = None
 
+    # Run queries on a blocking session ("sync"), or on an asyncio session using
+    # the asyncpg driver ("async") so that queries do not block the event loop.
+    db_execution_mode: Literal["sync", "async"] = "sync"
+
+    # Connections the engine keeps open, and the extra connections it may open
+    # under load. The sync execution mode runs queries on as many worker threads.
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+
+    # Database calls which may wait for a worker thread in the sync execution mode,
+    # and the seconds they may wait, before requests are rejected with a 503.
+    db_workers_queue_depth: int = 100
+    db_workers_queue_timeout: float = 5
+
+    # Seconds the in-process operations permission map is served before it is
+    # re-read from the database. Set to 0 to read it on every request.
+    operations_cache_ttl: float = 60
+
+    # Page size for collection reads when no limit is requested, and the largest
+    # page size a client may request. If the default is unset, collections are only
+    # paginated when a limit or a cursor is requested.
+    default_page_size: Optional[int] = None
+    max_page_size: int = 1000
+
+    # Number of rows read from the database per chunk of a streamed collection.
+    stream_batch_size: int = 1000
+
+    # The largest number of resources which may be created in a single request.
+    max_bulk_size: int = 1000
+
+    # Validation of the resources returned by the generic routes: "strict" validates
+    # every resource, "sampled" validates one in every sample rate resources, and
+    # "off" returns resources as they were read from the database.
+    response_validation: Literal["strict", "sampled", "off"] = "strict"
+    response_validation_sample_rate: PositiveInt = 100
+
+    # The number of single resource responses cached, and the time (in seconds) they
+    # are cached for. Writes through the generic routes invalidate the responses they
+    # affect in every process which shares the cache backend or the invalidation bus,
+    # and the TTL bounds how long other writes go unseen. Disabled if the size is 0.
+    read_cache_size: int = 0
+    read_cache_ttl: float = 60
+
+    # Where cached responses are kept: in the memory of each process ("memory"), in
+    # a memory mapped file shared by the processes of a host ("shared"), or on a
+    # server which speaks the Redis protocol, shared by every host ("resp").
+    read_cache_backend: Literal["memory", "shared", "resp"] = "memory"
+
+    # The path of the file of the shared backend, which is suffixed with its layout,
+    # and the largest entry (in bytes) it can hold.
+    read_cache_path: str = "/dev/shm/read-cache"
+    read_cache_entry_size: int = 16384
+
+    # The server of the resp backend, as a redis:// URL, and the timeout (in seconds)
+    # of its operations.
+    read_cache_url: str = "redis://localhost:6379/0"
+    read_cache_timeout: float = 0.5
+
+    # The bus writes are published on, to invalidate the cached reads they make stale
+    # in every worker: "local" only reaches this process, "unix" reaches the workers
+    # of a host through sockets in the bus directory, and "postgres" reaches every
+    # worker connected to the database, through LISTEN/NOTIFY on the bus channel.
+    invalidation_bus: Literal["local", "unix", "postgres"] = "local"
+    invalidation_bus_path: str = "/tmp/invalidation-bus"
+    invalidation_bus_channel: str = "cache_invalidation"
+
+    # File the OpenAPI document is persisted to, so that it is only built again when
+    # the schema, operations, relationships or tags change. Disabled if unset.
+    openapi_cache_path: Optional[str] = None
+
+    # File the reflected database schema is persisted to, so that it is loaded at
+    # startup instead of being reflected, and validated in the background. Disabled
+    # if unset.
+    schema_snapshot_path: Optional[str] = None
+
+    # Interval (in seconds) at which the database schema is checked for changes, e.g.
+    # by a migration, which are then served without restarting the application. If
+    # 0, the schema is only checked once, at startup.
+    schema_watch_interval: float = 30
+
+    # Buffer request metrics and apply them in bulk, when scraped and every flush
+    # interval (in seconds), instead of updating them on every request.
+    metrics_buffered: bool = False
+    metrics_flush_interval: float = 5
+
+    # The number of SQL statements a request may run before a warning is logged,
+    # e.g. when associations are fetched per resource. Set to 0 to disable.
+    db_query_budget: int = 50
+
     @validator("sqlalchemy_database_uri", pre=True)
     def assemble_postgres_dsn(cls, v: Optional[str], values: Dict[str, Any]) -> Any:
         if isinstance(v, str):
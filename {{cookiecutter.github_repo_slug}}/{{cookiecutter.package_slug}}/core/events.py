@@ -3,9 +3,37 @@
 from containerlog import get_logger
 from fastapi import FastAPI
 
+from ..api.generic.dispatch import dispatcher
+from ..api.generic.read_cache import read_cache
+from ..db.exc.catalog import operations_catalog, relationship_catalog
+from ..db.exc.executioner import invalidate_catalogs
+from ..db.invalidation import invalidation_bus
+from ..db.reflection import SchemaGeneration, schema_reflector
+from ..db.session import SessionLocal
+from ..db.workers import db_workers
+from ..middleware import prometheus
+from ..schema.v1.registry import schema_model_registry
+from .config import settings
+
 logger = get_logger()
 
 
+def prepare_schema(generation: SchemaGeneration) -> None:
+    """Prepare a generation of the database schema to serve requests with.
+
+    Args:
+        generation: The schema generation.
+    """
+    # Generate the schema models of every table up front, from the warm catalogs.
+    schema_model_registry.build(generation.metadata.tables.keys())
+
+    # Resolve generic resource paths with a single lookup.
+    dispatcher.build(generation.metadata)
+
+    # Cached responses may have been built from the previous schema.
+    read_cache.clear()
+
+
 def register_startup(app: FastAPI) -> None:
     """Register a startup event handler for the application.
 
@@ -17,6 +45,31 @@ def register_startup(app: FastAPI) -> None:
         """Event handler for application startup."""
         logger.info("application startup")
 
+        # Load the schema, from its snapshot if there is one.
+        schema_reflector.load()
+
+        # Warm the in-process catalogs so the first requests do not pay for them.
+        with SessionLocal() as db:
+            relationship_catalog.load(db)
+            operations_catalog.load(db)
+
+        prepare_schema(schema_reflector.current())
+
+        # Build the statements of every table, then check that the schema is up to
+        # date and watch it for changes, without holding up startup. New generations
+        # of the schema are prepared before they are swapped in.
+        schema_reflector.on_reload(prepare_schema)
+        schema_reflector.watch(settings.schema_watch_interval)
+
+        # Invalidate the catalogs and cached responses of this worker after writes,
+        # whichever worker on the invalidation bus makes them.
+        invalidation_bus.subscribe(invalidate_catalogs)
+        invalidation_bus.subscribe(read_cache.apply)
+        invalidation_bus.start()
+
+        # Apply buffered request metrics on a timer, even while no requests are served.
+        prometheus.startup()
+
         # TODO: Add any application startup code here.
         #   The application state may be used to cache things for application-wide access, e.g.
         #
@@ -36,6 +89,12 @@ def register_shutdown(app: FastAPI) -> None:
         """Event handler for application shutdown."""
         logger.info("application shutdown")
 
+        schema_reflector.stop()
+        invalidation_bus.stop()
+        db_workers.shutdown()
+        read_cache.close()
+        prometheus.shutdown()
+
         # TODO: Add any application shutdown code here.
 
     app.add_event_handler("shutdown", on_shutdown)
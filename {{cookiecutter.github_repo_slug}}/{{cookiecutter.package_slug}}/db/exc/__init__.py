@@ -1,3 +0,0 @@
-from ..session import engine, metadata
-
-metadata.reflect(bind=engine)
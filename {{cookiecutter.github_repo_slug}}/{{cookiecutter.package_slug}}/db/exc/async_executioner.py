@@ -0,0 +1,256 @@
+"""Database commands for the async execution mode.
+
+Each command is the asyncio twin of the command of the same name in the
+executioner. The statements and their results are handled by the executioner
+itself, run through `AsyncSession.run_sync`: the blocking `Session` API it uses
+is adapted onto the async driver, so waiting on the database yields to the event
+loop instead of blocking it. The invalidations of writes are published on a worker
+thread, since their subscribers and buses may block on I/O.
+"""
+from typing import Any, AsyncIterator, Callable, List, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession  # type: ignore
+from starlette.concurrency import run_in_threadpool
+
+from ...builders.v1.generic_builders import build_resource
+from ...core.config import settings
+from ...utils.utils import table_from_name
+from ..invalidation import invalidation_bus
+from ..session import AsyncSessionLocal
+from . import executioner
+from .catalog import operations_catalog
+from .statements import statement_cache
+
+__all__ = [
+    "get_operations",
+    "load_catalogs",
+    "get_resources",
+    "stream_resources",
+    "get_resource",
+    "create_resource",
+    "create_resources",
+    "update_resource",
+    "delete_resource",
+]
+
+
+async def get_resources(
+    resource_table_name: str,
+    db: AsyncSession,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+) -> Tuple[List[Any], Optional[str]]:
+    """Gets a page of resources.
+
+    Args:
+        resource_table_name: The table name of the resource.
+        db: The database session to use for queries.
+        limit: The maximum number of resources to return.
+        cursor: The opaque cursor returned with the previous page, if any.
+
+    Returns:
+        The list of resources, and the cursor for the next page if there is one.
+    """
+    return await db.run_sync(
+        lambda session: executioner.get_resources(resource_table_name, session, limit, cursor)
+    )
+
+
+async def stream_resources(
+    resource_table_name: str,
+    batch_size: Optional[int] = None,
+) -> AsyncIterator[List[Any]]:
+    """Stream all resources in batches.
+
+    Args:
+        resource_table_name: The table name of the resource.
+        batch_size: The number of resources per batch. Defaults to the configured
+            stream batch size.
+
+    Returns:
+        An async iterator of batches of resources.
+
+    Raises:
+        RuntimeError: The async execution mode is not configured.
+    """
+    if AsyncSessionLocal is None:
+        raise RuntimeError("The async execution mode is not configured")
+
+    resource_table = table_from_name(resource_table_name)
+
+    if batch_size is None:
+        batch_size = settings.stream_batch_size
+
+    statements = statement_cache.for_table(resource_table)
+
+    async with AsyncSessionLocal() as db:
+        results = await db.stream(statements.select_all)
+
+        async for partition in results.partitions(batch_size):
+            built_resources = [build_resource(row) for row in statements.rows.all(partition)]
+
+            await db.run_sync(
+                lambda session: executioner.attach_associations(
+                    built_resources, resource_table_name, session
+                )
+            )
+
+            yield built_resources
+
+
+async def get_some_resources(
+    resource_ids: List[str], resource_table_name: str, db: AsyncSession
+) -> Any:
+    """Gets some resources.
+
+    Args:
+        resource_ids: The uuids of the resources.
+        resource_table_name: The table name of the resource.
+        db: The database session to use for queries.
+
+    Returns:
+        The resources with the resource_ids.
+    """
+    return await db.run_sync(
+        lambda session: executioner.get_some_resources(resource_ids, resource_table_name, session)
+    )
+
+
+async def get_resource(resource_id: str, resource_table_name: str, db: AsyncSession) -> Any:
+    """Gets a single resource.
+
+    Args:
+        resource_id: The uuid of the resource.
+        resource_table_name: The table name of the resource.
+        db: The database session to use for queries.
+
+    Returns:
+        The resource with the resource_id.
+    """
+    return await db.run_sync(
+        lambda session: executioner.get_resource(resource_id, resource_table_name, session)
+    )
+
+
+async def create_resource(payload: Any, resource_table_name: str, db: AsyncSession) -> Any:
+    """Create a new resource.
+
+    Args:
+        payload: The payload to create a new resource.
+        resource_table_name: The table name of the resource.
+        db: The database session to use for queries.
+
+    Returns:
+        The newly created resource.
+    """
+    return await run_write(
+        db, lambda session: executioner.create_resource(payload, resource_table_name, session)
+    )
+
+
+async def create_resources(
+    payloads: List[Any], resource_table_name: str, db: AsyncSession
+) -> List[Any]:
+    """Create many new resources at once.
+
+    Args:
+        payloads: The payloads to create new resources from.
+        resource_table_name: The table name of the resource.
+        db: The database session to use for queries.
+
+    Returns:
+        The newly created resources, in the order of the payloads.
+    """
+    return await run_write(
+        db, lambda session: executioner.create_resources(payloads, resource_table_name, session)
+    )
+
+
+async def update_resource(
+    resource_id: str,
+    resource_table_name: str,
+    payload: Any,
+    db: AsyncSession,
+) -> Any:
+    """Update a resource.
+
+    Args:
+        resource_id: The uuid of the resource.
+        resource_table_name: The table name of the resource.
+        payload: The payload to update the resource with.
+        db: The database session to use for queries.
+
+    Returns:
+        The updated resource.
+    """
+    return await run_write(
+        db,
+        lambda session: executioner.update_resource(
+            resource_id, resource_table_name, payload, session
+        ),
+    )
+
+
+async def delete_resource(resource_id: str, resource_table_name: str, db: AsyncSession) -> Any:
+    """Delete a resource.
+
+    Args:
+        resource_id: The uuid of the resource.
+        resource_table_name: The table name of the resource.
+        db: The database session to use for queries.
+
+    Returns:
+        The deleted resource.
+    """
+    return await run_write(
+        db, lambda session: executioner.delete_resource(resource_id, resource_table_name, session)
+    )
+
+
+async def get_operations(table_name: str, db: AsyncSession) -> Any:
+    """Get operations for a table.
+
+    Args:
+        table_name: The table name to get operations for.
+        db: The database session to use for queries.
+
+    Returns:
+        The fetched table operations.
+    """
+    # A loaded catalog is served from memory, without a detour through the session.
+    if operations_catalog.loaded:
+        return operations_catalog.for_table(table_name)
+
+    return await db.run_sync(lambda session: executioner.get_operations(table_name, session))
+
+
+async def load_catalogs(db: AsyncSession) -> None:
+    """Load the in-process catalogs which are not loaded, or have expired.
+
+    Args:
+        db: The database session to use for queries.
+    """
+    await db.run_sync(executioner.load_catalogs)
+
+
+async def run_write(db: AsyncSession, command: Callable[[Any], Any]) -> Any:
+    """Run a write command of the executioner, then publish the invalidations of the
+    writes it committed on a worker thread.
+
+    Args:
+        db: The database session to use for queries.
+        command: The command, a function of the sync session.
+
+    Returns:
+        The result of the command.
+    """
+    pending: List[Any] = []
+    db.info[executioner.PENDING_INVALIDATIONS] = pending
+
+    try:
+        return await db.run_sync(command)
+    finally:
+        del db.info[executioner.PENDING_INVALIDATIONS]
+
+        for invalidation in pending:
+            await run_in_threadpool(invalidation_bus.publish, invalidation)
@@ -0,0 +1,268 @@
+"""In-process indexes over the relationships and operations tables."""
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Tuple
+
+from containerlog import get_logger
+from sqlalchemy import select  # type: ignore
+from sqlalchemy.orm import Session  # type: ignore
+
+from ...core.config import settings
+from ...middleware.prometheus import CATALOG_LOOKUPS_TOTAL
+from ..session import SessionLocal
+
+logger = get_logger()
+
+__all__ = [
+    "Catalog",
+    "RelationshipCatalog",
+    "OperationsCatalog",
+    "relationship_catalog",
+    "operations_catalog",
+]
+
+
+class Catalog(ABC):
+    """Base class for a lazily loaded, in-memory snapshot of a small table.
+
+    The snapshot is read once and served from memory until it is invalidated or,
+    if the catalog has a TTL, until it expires. Subclasses define which table is
+    read and how its rows are indexed.
+    """
+
+    # The name of the table backing the catalog.
+    table_name: str
+
+    def __init__(self, ttl: Optional[float] = None) -> None:
+        self.ttl = ttl
+        self._index: Any = None
+        self._loaded_at = 0.0
+        self._version = 0
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        """Whether the catalog currently holds a fresh snapshot of its table."""
+        return self._index is not None and not self._expired()
+
+    def load(self, db: Session) -> None:
+        """Load (or reload) the catalog from its table.
+
+        Args:
+            db: The database session to use for queries.
+        """
+        self._load(db)
+
+    def peek(self) -> Any:
+        """Get the current snapshot without loading the catalog, even if it has expired.
+
+        Returns:
+            The index of the snapshot, or None if the catalog is not loaded.
+        """
+        return self._index
+
+    def invalidate(self) -> None:
+        """Drop the current snapshot so the next lookup reloads the catalog."""
+        self._version += 1
+        self._index = None
+
+    @abstractmethod
+    def build_index(self, rows: List[Dict]) -> Any:
+        """Build the lookup structure for a snapshot of the table rows.
+
+        Args:
+            rows: The rows of the table.
+
+        Returns:
+            The index to serve lookups from.
+        """
+
+    def _expired(self) -> bool:
+        if self.ttl is None:
+            return False
+
+        return time.monotonic() - self._loaded_at >= self.ttl
+
+    def _load(self, db: Session) -> Any:
+        version = self._version
+
+        table = table_from_name(self.table_name)
+
+        rows = []
+
+        if table is not None:
+            rows = [dict_from_row(result) for result in db.execute(select(table)).fetchall()]
+
+        index = self.build_index(rows)
+
+        # An invalidation that raced with this load may have been missed by the
+        # query above, so only publish the snapshot if none happened.
+        if version == self._version:
+            self._index = index
+            self._loaded_at = time.monotonic()
+
+        logger.debug("loaded catalog", table=self.table_name, count=len(rows))
+
+        return index
+
+    def _get_index(self, db: Optional[Session]) -> Any:
+        index = self._index
+
+        if index is None or self._expired():
+            with self._lock:
+                index = self._index
+
+                if index is None or self._expired():
+                    CATALOG_LOOKUPS_TOTAL.labels(catalog=self.table_name, result="miss").inc()
+
+                    if db is not None:
+                        return self._load(db)
+
+                    with SessionLocal() as session:
+                        return self._load(session)
+
+        CATALOG_LOOKUPS_TOTAL.labels(catalog=self.table_name, result="hit").inc()
+
+        return index
+
+
+class _RelationshipIndex:
+    """An immutable snapshot of the relationships table and its lookups."""
+
+    def __init__(self, relationships: List[Dict]) -> None:
+        self.relationships = relationships
+        self.by_table: Dict[str, List[Dict]] = {}
+        self.by_pair: Dict[Tuple[str, str], Dict] = {}
+        self.by_associative: Dict[str, Dict] = {}
+
+        for relationship in relationships:
+            primary = relationship["primary_table_name"]
+            secondary = relationship["secondary_table_name"]
+            associative = relationship["associative_table_name"]
+
+            # Mirrors the catalog query the executioner used to issue: a table
+            # sees every relationship it is the primary of, and the many to many
+            # relationships it is the secondary of.
+            self.by_table.setdefault(primary, []).append(relationship)
+
+            if associative is not None:
+                if secondary != primary:
+                    self.by_table.setdefault(secondary, []).append(relationship)
+
+                self.by_associative[associative] = relationship
+
+            self.by_pair.setdefault((primary, secondary), relationship)
+            self.by_pair.setdefault((secondary, primary), relationship)
+
+
+class RelationshipCatalog(Catalog):
+    """In-memory index over the relationships table.
+
+    Writes to the relationships table through the executioner invalidate the
+    catalog, and the next lookup reloads it. The relationship dicts returned from
+    lookups are shared and must be treated as read-only.
+    """
+
+    table_name = "relationships"
+
+    def build_index(self, rows: List[Dict]) -> _RelationshipIndex:
+        return _RelationshipIndex(rows)
+
+    def for_table(self, table_name: str, db: Optional[Session] = None) -> List[Dict]:
+        """Get the relationships a table participates in.
+
+        Args:
+            table_name: The table name to get relationships for.
+            db: The database session to use if the catalog needs to be loaded.
+
+        Returns:
+            The relationships where the table is the primary table, or the secondary
+            table of a many to many relationship.
+        """
+        return self._get_index(db).by_table.get(table_name, [])
+
+    def all(self, db: Optional[Session] = None) -> List[Dict]:
+        """Get every relationship, from a single snapshot of the table.
+
+        Args:
+            db: The database session to use if the catalog needs to be loaded.
+
+        Returns:
+            The relationships.
+        """
+        return self._get_index(db).relationships
+
+    def between(
+        self, table_name: str, other_table_name: str, db: Optional[Session] = None
+    ) -> Optional[Dict]:
+        """Get the relationship between two tables, in either direction.
+
+        Args:
+            table_name: The first table name.
+            other_table_name: The second table name.
+            db: The database session to use if the catalog needs to be loaded.
+
+        Returns:
+            The relationship between the tables, if one exists.
+        """
+        return self._get_index(db).by_pair.get((table_name, other_table_name))
+
+    def for_associative_table(
+        self, associative_table_name: str, db: Optional[Session] = None
+    ) -> Optional[Dict]:
+        """Get the many to many relationship backed by an associative table.
+
+        Args:
+            associative_table_name: The associative table name.
+            db: The database session to use if the catalog needs to be loaded.
+
+        Returns:
+            The relationship using the associative table, if one exists.
+        """
+        return self._get_index(db).by_associative.get(associative_table_name)
+
+
+class OperationsCatalog(Catalog):
+    """In-memory map of the permitted operations for each table.
+
+    Writes to the operations table through the executioner invalidate the map
+    immediately, and it expires after its TTL so that changes made outside of the
+    API are eventually picked up as well.
+    """
+
+    table_name = "operations"
+
+    def build_index(self, rows: List[Dict]) -> Dict[str, Dict]:
+        return {row["table_name"]: row for row in rows}
+
+    def all(self, db: Optional[Session] = None) -> Dict[str, Dict]:
+        """Get the operations of every table, from a single snapshot of the table.
+
+        Args:
+            db: The database session to use if the catalog needs to be loaded.
+
+        Returns:
+            The operations, by table name.
+        """
+        return self._get_index(db)
+
+    def for_table(self, table_name: str, db: Optional[Session] = None) -> Dict:
+        """Get the operations for a table.
+
+        Args:
+            table_name: The table name to get operations for.
+            db: The database session to use if the catalog needs to be loaded.
+
+        Returns:
+            The operations for the table, or an empty dict if it has none.
+        """
+        return self._get_index(db).get(table_name, {})
+
+
+# Global catalog instances shared by the executioner, routes and docs generation.
+relationship_catalog = RelationshipCatalog()
+operations_catalog = OperationsCatalog(ttl=settings.operations_cache_ttl)
+
+
+from ...utils.utils import dict_from_row, table_from_name  # noqa: E402
@@ -1,57 +1,242 @@
 """Database commands."""
-from typing import Any, List
+import base64
+import json
+import uuid
+from datetime import datetime
+from typing import Any, Dict, Generator, List, Optional, Set, Tuple
 
 from fastapi.exceptions import HTTPException
-from sqlalchemy import and_, delete, insert, or_, select, update  # type: ignore
+from sqlalchemy import (  # type: ignore
+    Column,
+    String,
+    Table,
+    cast,
+    column,
+    delete,
+    exists,
+    insert,
+    literal,
+    select,
+    values,
+)
+from sqlalchemy.dialects.postgresql import UUID  # type: ignore
+from sqlalchemy.dialects.postgresql import insert as pg_insert  # type: ignore
+from sqlalchemy.engine import Row  # type: ignore
 from sqlalchemy.orm import Session  # type: ignore
-from sqlalchemy.sql import func  # type: ignore
 
 from ...builders.v1.generic_builders import build_resource
-from ...utils.utils import dict_from_row, snake_to_camel, table_from_name
+from ...core.config import settings
+from ...utils.utils import snake_to_camel, table_from_name
+from ..invalidation import Invalidation, invalidation_bus
+from ..session import SessionLocal
+from .catalog import operations_catalog, relationship_catalog
+from .statements import statement_cache
+
+# The key of the session info under which writes queue their invalidations instead of
+# publishing them, for the caller to publish once the command returns.
+PENDING_INVALIDATIONS = "pending_invalidations"
 
 __all__ = [
     "get_operations",
+    "load_catalogs",
     "get_resources",
+    "stream_resources",
     "get_resource",
     "create_resource",
+    "create_resources",
     "update_resource",
     "delete_resource",
 ]
 
 
-def get_resources(resource_table_name: str, db: Session) -> List[Any]:
-    """Gets all resources.
+def get_resources(
+    resource_table_name: str,
+    db: Session,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+) -> Tuple[List[Any], Optional[str]]:
+    """Gets all resources, or a page of resources.
+
+    Resources are paginated with a keyset on `(created_at, id)`, or on `id` alone
+    if the table has no non-nullable `created_at` column, so each page costs the
+    same regardless of how deep into the table it is. Without a limit or a cursor,
+    all resources are returned, unless a default page size is configured.
 
     Args:
         resource_table_name: The table name of the resource.
         db: The database session to use for queries.
+        limit: The maximum number of resources to return. Defaults to the configured
+            default page size, or to the configured maximum page size if a cursor is
+            given, and is capped at the configured maximum page size.
+        cursor: The opaque cursor returned with the previous page, if any.
 
     Returns:
-        The list of resources.
+        The list of resources, and the cursor for the next page if there is one.
     """
     table_name_camel = snake_to_camel(resource_table_name)
 
     resource_table = table_from_name(resource_table_name)
 
-    stmt = select(resource_table).where(resource_table.c.get("deleted_at") == None)
+    if limit is None:
+        limit = settings.default_page_size
 
-    results = db.execute(stmt).fetchall()
+    statements = statement_cache.for_table(resource_table)
+
+    keyset = statements.keyset
+
+    after = decode_cursor(cursor, keyset) if cursor is not None else None
+    params: Dict[str, Any]
+
+    if limit is None and after is None:
+        stmt, params = statements.select_all, {}
+    else:
+        limit = max(1, min(limit or settings.max_page_size, settings.max_page_size))
+
+        # Fetch one extra row to find out whether there is a next page.
+        stmt, params = statements.page(limit + 1, after)
+
+    results = db.execute(stmt, params).fetchall()
 
     if not results:
+        # A cursor past the last resource is the end of the collection, not an error.
+        if after is not None:
+            return [], None
+
         raise HTTPException(
             status_code=404,
             detail=f"{table_name_camel} not found",
         )
 
-    built_resources = [build_resource(dict_from_row(result)) for result in results]
+    next_cursor = None
 
-    for built_resource in built_resources:
-        associations = get_associations(built_resource["id"], resource_table_name, db)
+    if limit is not None and len(results) > limit:
+        results = results[:limit]
+        next_cursor = encode_cursor(results[-1], keyset)
 
-        for name, values in associations.items():
-            built_resource[name] = values
+    built_resources = [build_resource(row) for row in statements.rows.all(results)]
 
-    return built_resources
+    attach_associations(built_resources, resource_table_name, db)
+
+    return built_resources, next_cursor
+
+
+def encode_cursor(row: Row, keyset: List[Column]) -> str:
+    """Encode the keyset values of a row as an opaque pagination cursor.
+
+    Args:
+        row: The last row of a page.
+        keyset: The columns the table is paginated on.
+
+    Returns:
+        The opaque cursor.
+    """
+    values = []
+
+    for col in keyset:
+        value = row[col.name]
+
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        elif value is not None:
+            value = str(value)
+
+        values.append(value)
+
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, keyset: List[Column]) -> List[Any]:
+    """Decode an opaque pagination cursor into keyset values.
+
+    Each value is checked against the type of its column, so that a cursor which
+    was tampered with is rejected here rather than by the database.
+
+    Args:
+        cursor: The opaque cursor.
+        keyset: The columns the table is paginated on.
+
+    Returns:
+        The keyset values to resume pagination after.
+
+    Raises:
+        HTTPException: The cursor is malformed.
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+
+        if not isinstance(values, list) or len(values) != len(keyset):
+            raise ValueError("cursor does not match the table keyset")
+
+        return [decode_cursor_value(value, col) for col, value in zip(keyset, values)]
+    except (ValueError, TypeError, NotImplementedError):
+        raise HTTPException(status_code=400, detail="Malformed cursor")
+
+
+def decode_cursor_value(value: Any, col: Column) -> Any:
+    """Decode a keyset value of a pagination cursor, as encoded by `encode_cursor`.
+
+    Args:
+        value: The encoded value.
+        col: The column of the value.
+
+    Returns:
+        The value.
+
+    Raises:
+        TypeError: The value is not a string.
+        ValueError: The value is not a value of the type of the column.
+    """
+    if not isinstance(value, str):
+        raise TypeError("cursor values are strings")
+
+    if isinstance(col.type, UUID):
+        return str(uuid.UUID(value))
+
+    python_type = col.type.python_type
+
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+
+    if python_type in (int, uuid.UUID):
+        return python_type(value)
+
+    return value
+
+
+def stream_resources(
+    resource_table_name: str,
+    batch_size: Optional[int] = None,
+) -> Generator[List[Any], None, None]:
+    """Stream all resources in batches.
+
+    Rows are read through a server-side cursor, and associations are loaded
+    for one batch at a time, so only a single batch is held in memory. A new
+    database session is used, since the stream outlives the request handler.
+
+    Args:
+        resource_table_name: The table name of the resource.
+        batch_size: The number of resources per batch. Defaults to the configured
+            stream batch size.
+
+    Returns:
+        A generator of batches of resources. Closing it closes the session.
+    """
+    resource_table = table_from_name(resource_table_name)
+
+    if batch_size is None:
+        batch_size = settings.stream_batch_size
+
+    statements = statement_cache.for_table(resource_table)
+
+    with SessionLocal() as db:
+        results = db.execute(statements.select_all, execution_options={"stream_results": True})
+
+        for partition in results.partitions(batch_size):
+            built_resources = [build_resource(row) for row in statements.rows.all(partition)]
+
+            attach_associations(built_resources, resource_table_name, db)
+
+            yield built_resources
 
 
 def get_some_resources(resource_ids: List[str], resource_table_name: str, db: Session) -> Any:
@@ -69,12 +254,9 @@ def get_some_resources(resource_ids: List[str], resource_table_name: str, db: Se
 
     resource_table = table_from_name(resource_table_name)
 
-    stmt = select(resource_table).where(
-        resource_table.c.id.in_(resource_ids),
-        resource_table.c.get("deleted_at") == None,
-    )
+    statements = statement_cache.for_table(resource_table)
 
-    results = db.execute(stmt).fetchall()
+    results = db.execute(statements.select_by_ids, {"_resource_ids": resource_ids}).fetchall()
 
     if not results:
         raise HTTPException(
@@ -82,13 +264,9 @@ def get_some_resources(resource_ids: List[str], resource_table_name: str, db: Se
             detail=f"{table_name_camel} resources not found",
         )
 
-    built_resources = [build_resource(dict_from_row(result)) for result in results]
-
-    for idx, built_resource in enumerate(built_resources):
-        associations = get_associations(built_resource["id"], resource_table_name, db)
+    built_resources = [build_resource(row) for row in statements.rows.all(results)]
 
-        for name, values in associations.items():
-            built_resources[idx][name] = values
+    attach_associations(built_resources, resource_table_name, db)
 
     return built_resources
 
@@ -108,12 +286,9 @@ def get_resource(resource_id: str, resource_table_name: str, db: Session) -> Any
 
     resource_table = table_from_name(resource_table_name)
 
-    stmt = select(resource_table).where(
-        resource_table.c.id == resource_id,
-        resource_table.c.get("deleted_at") == None,
-    )
+    statements = statement_cache.for_table(resource_table)
 
-    result = db.execute(stmt).first()
+    result = db.execute(statements.select_by_id, {"_resource_id": resource_id}).first()
 
     if not result:
         raise HTTPException(
@@ -121,12 +296,9 @@ def get_resource(resource_id: str, resource_table_name: str, db: Session) -> Any
             detail=f"{table_name_camel} resource not found",
         )
 
-    built_resource = build_resource(dict_from_row(result))
-
-    associations = get_associations(resource_id, resource_table_name, db)
+    built_resource = build_resource(statements.rows(result))
 
-    for name, values in associations.items():
-        built_resource[name] = values
+    attach_associations([built_resource], resource_table_name, db)
 
     return built_resource
 
@@ -162,14 +334,14 @@ def create_resource(
         for key in associative_fields.keys():
             del mutable_payload[key]
 
-    stmt = insert(resource_table).values(mutable_payload).returning(resource_table)
+    statements = statement_cache.for_table(resource_table)
 
-    result = db.execute(stmt).first()
+    result = db.execute(statements.insert, mutable_payload).first()
 
     if not result:
         raise HTTPException(status_code=500, detail=f"Unable to create {table_name_camel} resource")
 
-    built_resource = build_resource(dict_from_row(result))
+    built_resource = build_resource(statements.rows(result))
 
     if associative_fields:
         for key, associative_ids in associative_fields.items():
@@ -177,11 +349,85 @@ def create_resource(
 
             create_associations(built_resource["id"], resource_table_name, key, associative_ids, db)
 
-    db.commit()
+    commit_write(resource_table_name, [built_resource], db)
 
     return built_resource
 
 
+def create_resources(
+    payloads: List[Any],
+    resource_table_name: str,
+    db: Session,
+) -> List[Any]:
+    """Create many new resources at once.
+
+    All resources are written with a single multi-row INSERT ... RETURNING, and
+    their associations with a single multi-row INSERT per relationship, in one
+    transaction. The ids of the resources are generated before they are written,
+    since the rows returned by the INSERT are not guaranteed to be in the order of
+    the payloads, and are matched back to the payloads by id.
+
+    Args:
+        payloads: The payloads to create new resources from.
+        resource_table_name: The table name of the resource.
+        db: The database session to use for queries.
+
+    Returns:
+        The newly created resources, in the order of the payloads.
+    """
+    table_name_camel = snake_to_camel(resource_table_name)
+
+    resource_table = table_from_name(resource_table_name)
+
+    mutable_payloads = [payload.dict() for payload in payloads]
+
+    associative_fields: List[Dict[str, List[Any]]] = []
+
+    resource_ids = [str(uuid.uuid4()) for _ in mutable_payloads]
+
+    for resource_id, mutable_payload in zip(resource_ids, mutable_payloads):
+        fields = {key: value for key, value in mutable_payload.items() if isinstance(value, list)}
+
+        for key in fields.keys():
+            del mutable_payload[key]
+
+        mutable_payload["id"] = resource_id
+
+        associative_fields.append(fields)
+
+    stmt = insert(resource_table).values(mutable_payloads).returning(resource_table)
+
+    results = db.execute(stmt).fetchall()
+
+    rows = statement_cache.for_table(resource_table).rows.all(results)
+
+    rows_by_id = {str(row["id"]): row for row in rows}
+
+    if rows_by_id.keys() != set(resource_ids):
+        raise HTTPException(
+            status_code=500, detail=f"Unable to create {table_name_camel} resources"
+        )
+
+    built_resources = [build_resource(rows_by_id[resource_id]) for resource_id in resource_ids]
+
+    # Group the associative ids of every new resource by relationship, so each
+    # relationship is written with a single statement.
+    associations: Dict[str, Dict[Any, List[Any]]] = {}
+
+    for built_resource, fields in zip(built_resources, associative_fields):
+        for key, associative_ids in fields.items():
+            built_resource[key] = associative_ids
+
+            associations.setdefault(key, {})[built_resource["id"]] = associative_ids
+
+    for key, associative_ids_by_id in associations.items():
+        create_associations_bulk(resource_table_name, key, associative_ids_by_id, db)
+
+    commit_write(resource_table_name, built_resources, db)
+
+    return built_resources
+
+
 def update_resource(
     resource_id: str,
     resource_table_name: str,
@@ -204,6 +450,8 @@ def update_resource(
 
     mutable_payload = payload.dict(exclude_unset=True)
 
+    updated = set(mutable_payload)
+
     associative_fields = {}
 
     for key, value in mutable_payload.items():
@@ -214,21 +462,14 @@ def update_resource(
         for key in associative_fields.keys():
             del mutable_payload[key]
 
-    stmt = None
+    statements = statement_cache.for_table(resource_table)
 
     if mutable_payload:
-        stmt = (
-            update(resource_table)
-            .where(resource_table.c.id == resource_id, resource_table.c.get("deleted_at") == None)
-            .values(mutable_payload)
-            .returning(resource_table)
-        )
+        stmt = statements.update_by_id
     else:
-        stmt = select(resource_table).where(
-            resource_table.c.id == resource_id, resource_table.c.get("deleted_at") == None
-        )
+        stmt = statements.select_by_id
 
-    result = db.execute(stmt).first()
+    result = db.execute(stmt, {**mutable_payload, "_resource_id": resource_id}).first()
 
     if not result:
         raise HTTPException(
@@ -236,13 +477,11 @@ def update_resource(
             detail=f"{table_name_camel} resource not found",
         )
 
-    built_resource = build_resource(dict_from_row(result))
+    built_resource = build_resource(statements.rows(result))
 
     if associative_fields:
         for key, associative_ids in associative_fields.items():
-            built_resource[key] = associative_ids
-
-            update_associations(
+            built_resource[key] = replace_associations(
                 built_resource["id"],
                 resource_table_name,
                 key,
@@ -250,7 +489,7 @@ def update_resource(
                 db,
             )
 
-    db.commit()
+    commit_write(resource_table_name, [built_resource], db, updated)
 
     return built_resource
 
@@ -270,23 +509,9 @@ def delete_resource(resource_id: str, resource_table_name: str, db: Session) ->
 
     resource_table = table_from_name(resource_table_name)
 
-    stmt = None
-
-    if "deleted_at" in resource_table.c.keys():
-        stmt = (
-            update(resource_table)
-            .where(resource_table.c.id == resource_id, resource_table.c.deleted_at == None)
-            .values(deleted_at=func.current_timestamp())
-            .returning(resource_table)
-        )
-    else:
-        stmt = (
-            delete(resource_table)
-            .where(resource_table.c.id == resource_id)
-            .returning(resource_table)
-        )
+    statements = statement_cache.for_table(resource_table)
 
-    result = db.execute(stmt).first()
+    result = db.execute(statements.delete_by_id, {"_resource_id": resource_id}).first()
 
     if not result:
         raise HTTPException(
@@ -294,9 +519,9 @@ def delete_resource(resource_id: str, resource_table_name: str, db: Session) ->
             detail=f"{table_name_camel} resource not found",
         )
 
-    built_resource = build_resource(dict_from_row(result))
+    built_resource = build_resource(statements.rows(result))
 
-    associations = get_associations(resource_id, resource_table_name, db)
+    associations = get_associations(built_resource["id"], resource_table_name, db)
 
     if associations:
         for key, associative_ids in associations.items():
@@ -304,11 +529,57 @@ def delete_resource(resource_id: str, resource_table_name: str, db: Session) ->
 
             delete_associations(built_resource["id"], resource_table_name, key, associative_ids, db)
 
-    db.commit()
+    commit_write(resource_table_name, [built_resource], db)
 
     return built_resource
 
 
+def commit_write(
+    resource_table_name: str,
+    built_resources: List[Dict],
+    db: Session,
+    updated: Optional[Set[str]] = None,
+) -> None:
+    """Commit a write, and publish the invalidation of the cached reads it made stale.
+
+    If the session queues invalidations under `PENDING_INVALIDATIONS`, as the async
+    executioner does, the invalidation is queued there instead, to be published by
+    the caller.
+
+    Args:
+        resource_table_name: The table name of the written resources.
+        built_resources: The written resources, with their associations.
+        db: The database session of the write.
+        updated: For an update, the fields of the payload.
+    """
+    invalidation = Invalidation.from_write(resource_table_name, built_resources, updated, db)
+
+    invalidation_bus.stage(invalidation, db)
+
+    db.commit()
+
+    pending = db.info.get(PENDING_INVALIDATIONS)
+
+    if pending is not None:
+        pending.append(invalidation)
+    else:
+        invalidation_bus.publish(invalidation)
+
+
+def invalidate_catalogs(invalidation: Invalidation, remote: bool) -> None:
+    """Invalidate in-process catalogs after a write to one of their tables.
+
+    Args:
+        invalidation: The invalidation published for the write.
+        remote: Whether the write was made by another process.
+    """
+    if invalidation.everything or invalidation.table_name == "relationships":
+        relationship_catalog.invalidate()
+
+    if invalidation.everything or invalidation.table_name == "operations":
+        operations_catalog.invalidate()
+
+
 def get_associations(resource_id: str, table_name: str, db: Session) -> Any:
     """Get associations for a table.
 
@@ -320,26 +591,36 @@ def get_associations(resource_id: str, table_name: str, db: Session) -> Any:
     Returns:
         The fetched table associations.
     """
-    relationships_table = table_from_name("relationships")
-
-    stmt = select(relationships_table).where(
-        or_(
-            relationships_table.c.primary_table_name == table_name,
-            and_(
-                relationships_table.c.secondary_table_name == table_name,
-                relationships_table.c.associative_table_name != None,
-            ),
-        ),
-    )
+    return get_associations_for_ids([resource_id], table_name, db).get(resource_id, {})
 
-    relationships = db.execute(stmt).fetchall()
 
-    if not relationships:
-        return {}
+def get_associations_for_ids(
+    resource_ids: List[Any],
+    table_name: str,
+    db: Session,
+) -> Dict[Any, Dict[str, List[Any]]]:
+    """Get associations for many resources of a table at once.
+
+    The relationship catalog is read once and a single query is issued per
+    relationship for all of the resource ids, so the number of round trips does
+    not grow with the number of resources.
+
+    Args:
+        resource_ids: The uuids of the resources.
+        table_name: The table name to get associations for.
+        db: The database session to use for queries.
 
-    relationships = [dict_from_row(relationship) for relationship in relationships]
+    Returns:
+        The fetched table associations, keyed by resource id.
+    """
+    relationships = relationship_catalog.for_table(table_name, db)
 
-    associations = {}
+    if not relationships or not resource_ids:
+        return {}
+
+    associations: Dict[Any, Dict[str, List[Any]]] = {
+        resource_id: {} for resource_id in resource_ids
+    }
 
     for relationship in relationships:
         other_table_name = relationship["secondary_table_name"]
@@ -351,15 +632,9 @@ def get_associations(resource_id: str, table_name: str, db: Session) -> Any:
             # Many to Many
             associative_table = table_from_name(relationship["associative_table_name"])
 
-            stmt = select(associative_table.c[f"{other_table_name}_id"]).where(
-                associative_table.c[f"{table_name}_id"] == resource_id
+            stmt = statement_cache.for_table(associative_table).associations(
+                f"{table_name}_id", f"{other_table_name}_id"
             )
-
-            results = db.execute(stmt).fetchall()
-
-            associations[other_table_name] = [
-                dict_from_row(result)[f"{other_table_name}_id"] for result in results
-            ]
         else:
             # One to Many
             secondary_table = table_from_name(other_table_name)
@@ -370,31 +645,74 @@ def get_associations(resource_id: str, table_name: str, db: Session) -> Any:
                 else f"{table_name}_id"
             )
 
-            stmt = None
+            stmt = statement_cache.for_table(secondary_table).associations(foreign_key_ref, "id")
 
-            if "deleted_at" in secondary_table.c.keys():
-                stmt = select(secondary_table.c.id).where(
-                    secondary_table.c[foreign_key_ref] == resource_id,
-                    secondary_table.c["deleted_at"] == None,
-                )
-            else:
-                stmt = select(secondary_table.c.id).where(
-                    secondary_table.c[foreign_key_ref] == resource_id,
-                )
+        grouped: Dict[Any, List[Any]] = {resource_id: [] for resource_id in resource_ids}
 
-            results = db.execute(stmt).fetchall()
+        for owner_id, value in db.execute(stmt, {"_owner_ids": resource_ids}):
+            grouped.setdefault(owner_id, []).append(value)
 
-            associations[other_table_name] = [dict_from_row(result)["id"] for result in results]
+        for resource_id in resource_ids:
+            associations[resource_id][other_table_name] = grouped[resource_id]
 
     return associations
 
 
+def attach_associations(built_resources: List[Dict], table_name: str, db: Session) -> None:
+    """Attach associations to already built resources of a table.
+
+    Args:
+        built_resources: The built resources to attach associations to.
+        table_name: The table name of the resources.
+        db: The database session to use for queries.
+    """
+    associations = get_associations_for_ids(
+        [built_resource["id"] for built_resource in built_resources],
+        table_name,
+        db,
+    )
+
+    for built_resource in built_resources:
+        for name, associative_ids in associations.get(built_resource["id"], {}).items():
+            built_resource[name] = associative_ids
+
+
+def get_associative_table(
+    primary_table_name: str,
+    secondary_table_name: str,
+    db: Session,
+) -> Optional[Table]:
+    """Get the associative table of the relationship between two tables.
+
+    Args:
+        primary_table_name: The primary table name.
+        secondary_table_name: The secondary table name.
+        db: The database session to use for queries.
+
+    Returns:
+        The associative table, or None if the tables have a one to many relationship.
+    """
+    relationship = relationship_catalog.between(primary_table_name, secondary_table_name, db)
+
+    if not relationship:
+        raise HTTPException(
+            status_code=404,
+            detail=f"relationship for {primary_table_name} resource not found",
+        )
+
+    if not relationship["associative_table_name"]:
+        return None
+
+    return table_from_name(relationship["associative_table_name"])
+
+
 def create_associations(
     primary_table_id: str,
     primary_table_name: str,
     secondary_table_name: str,
     associative_ids: List[str],
     db: Session,
+    ignore_conflicts: bool = False,
 ):
     """Create associations for a table.
 
@@ -404,43 +722,67 @@ def create_associations(
         secondary_table_name: The secondary table name.
         associative_ids: The associative ids to associate with the primary table.
         db: The database session to use for queries.
+        ignore_conflicts: Skip associations which are repeated, or which violate a
+            unique constraint of the associative table (ON CONFLICT DO NOTHING),
+            instead of failing.
     """
-    relationships_table = table_from_name("relationships")
-
-    stmt = select(relationships_table).where(
-        or_(
-            and_(
-                relationships_table.c["primary_table_name"] == primary_table_name,
-                relationships_table.c["secondary_table_name"] == secondary_table_name,
-            ),
-            and_(
-                relationships_table.c["primary_table_name"] == secondary_table_name,
-                relationships_table.c["secondary_table_name"] == primary_table_name,
-            ),
-        )
+    create_associations_bulk(
+        primary_table_name,
+        secondary_table_name,
+        {primary_table_id: associative_ids},
+        db,
+        ignore_conflicts,
     )
 
-    result = db.execute(stmt).first()
 
-    if not result:
-        raise HTTPException(
-            status_code=404,
-            detail=f"relationship for {primary_table_name} resource not found",
-        )
+def create_associations_bulk(
+    primary_table_name: str,
+    secondary_table_name: str,
+    associative_ids_by_id: Dict[Any, List[Any]],
+    db: Session,
+    ignore_conflicts: bool = False,
+):
+    """Create associations for many rows of a table with a single statement.
 
-    relationship = build_resource(dict_from_row(result))
+    Args:
+        primary_table_name: The primary table name.
+        secondary_table_name: The secondary table name.
+        associative_ids_by_id: The associative ids to associate with each primary
+            table id.
+        db: The database session to use for queries.
+        ignore_conflicts: Skip associations which are repeated, or which violate a
+            unique constraint of the associative table (ON CONFLICT DO NOTHING),
+            instead of failing.
+    """
+    associative_table = get_associative_table(primary_table_name, secondary_table_name, db)
 
-    associative_table = table_from_name(relationship["associative_table_name"])
+    if associative_table is None:
+        raise HTTPException(
+            status_code=500,
+            detail=f"{secondary_table_name} can not be associated with a {primary_table_name} "
+            "resource from this side of the relationship",
+        )
 
-    for associative_id in associative_ids:
-        new_associative_row = {
+    new_associative_rows = [
+        {
             f"{primary_table_name}_id": str(primary_table_id),
             f"{secondary_table_name}_id": str(associative_id),
         }
+        for primary_table_id, associative_ids in associative_ids_by_id.items()
+        for associative_id in (
+            dict.fromkeys(associative_ids) if ignore_conflicts else associative_ids
+        )
+    ]
 
-        stmt = insert(associative_table).values(new_associative_row)
+    if not new_associative_rows:
+        return
 
-        db.execute(stmt)
+    if ignore_conflicts:
+        stmt = pg_insert(associative_table).values(new_associative_rows).on_conflict_do_nothing()
+    else:
+        stmt = insert(associative_table).values(new_associative_rows)
+
+    db.execute(stmt)
 
 
 def delete_associations(
@@ -450,7 +792,11 @@ def delete_associations(
     associative_ids: List[str],
     db: Session,
 ):
-    """Delete associations for a table.
+    """Delete associations for a table with a single statement.
+
+    One to many associations are a foreign key on the secondary table rather
+    than a row of an associative table, so there is nothing to delete for them:
+    the secondary resources are left as they are.
 
     Args:
         primary_table_id: The primary table id.
@@ -459,40 +805,22 @@ def delete_associations(
         associative_ids: The associative ids to dissociate with the primary table.
         db: The database session to use for queries.
     """
-    relationships_table = table_from_name("relationships")
-
-    stmt = select(relationships_table).where(
-        or_(
-            and_(
-                relationships_table.c["primary_table_name"] == primary_table_name,
-                relationships_table.c["secondary_table_name"] == secondary_table_name,
-            ),
-            and_(
-                relationships_table.c["primary_table_name"] == secondary_table_name,
-                relationships_table.c["secondary_table_name"] == primary_table_name,
-            ),
-        )
-    )
+    associative_table = get_associative_table(primary_table_name, secondary_table_name, db)
 
-    result = db.execute(stmt).first()
+    if associative_table is None or not associative_ids:
+        return
 
-    if not result:
-        raise HTTPException(
-            status_code=404,
-            detail=f"relationship for {primary_table_name} resource not found",
-        )
-
-    relationship = build_resource(dict_from_row(result))
-
-    associative_table = table_from_name(relationship["associative_table_name"])
-
-    for associative_id in associative_ids:
-        stmt = delete(associative_table).where(
-            associative_table.c[f"{primary_table_name}_id"] == str(primary_table_id),
-            associative_table.c[f"{secondary_table_name}_id"] == str(associative_id),
-        )
+    stmt = statement_cache.for_table(associative_table).dissociations(
+        f"{primary_table_name}_id", f"{secondary_table_name}_id"
+    )
 
-        db.execute(stmt)
+    db.execute(
+        stmt,
+        {
+            "_owner_id": str(primary_table_id),
+            "_values": [str(associative_id) for associative_id in associative_ids],
+        },
+    )
 
 
 def update_associations(
@@ -511,39 +839,104 @@ def update_associations(
         new_associative_ids: The new associative ids to associate with the primary table.
         db: The database session to use for queries.
     """
-    associations = get_associations(primary_table_id, primary_table_name, db)
+    replace_associations(
+        primary_table_id,
+        primary_table_name,
+        secondary_table_name,
+        new_associative_ids,
+        db,
+    )
 
-    current_associative_ids = associations[secondary_table_name]
 
-    ids_to_delete = list(
-        (set(current_associative_ids) & set(new_associative_ids)) ^ set(current_associative_ids)
+def replace_associations(
+    primary_table_id: str,
+    primary_table_name: str,
+    secondary_table_name: str,
+    new_associative_ids: List[str],
+    db: Session,
+) -> List[str]:
+    """Replace the associations of a resource for a single relationship.
+
+    The difference between the current and the new associations is computed by
+    the database in a single statement: a data-modifying CTE deletes the
+    associations which are not in the new set, and the outer INSERT adds the
+    ones which are missing. The cost scales with the size of the change rather
+    than with the number of existing associations. The associations are then read
+    back, since the statement can not see its own changes.
+
+    Args:
+        primary_table_id: The primary table id.
+        primary_table_name: The primary table name.
+        secondary_table_name: The secondary table name.
+        new_associative_ids: The complete set of associative ids the primary table
+            should be associated with.
+        db: The database session to use for queries.
+
+    Returns:
+        The associative ids the primary table is associated with afterwards.
+    """
+    associative_table = get_associative_table(primary_table_name, secondary_table_name, db)
+
+    if associative_table is None:
+        raise HTTPException(
+            status_code=500,
+            detail=f"{secondary_table_name} can not be associated with a {primary_table_name} "
+            "resource from this side of the relationship",
+        )
+
+    owner_col = associative_table.c[f"{primary_table_name}_id"]
+    value_col = associative_table.c[f"{secondary_table_name}_id"]
+
+    primary_table_id = str(primary_table_id)
+    new_associative_ids = list(dict.fromkeys(str(value) for value in new_associative_ids))
+
+    if not new_associative_ids:
+        db.execute(delete(associative_table).where(owner_col == primary_table_id))
+
+        return []
+
+    deleted = (
+        delete(associative_table)
+        .where(owner_col == primary_table_id, value_col.not_in(new_associative_ids))
+        .returning(value_col)
+        .cte("deleted_associations")
     )
-    ids_to_create = list(
-        (set(current_associative_ids) & set(new_associative_ids)) ^ set(new_associative_ids)
+
+    new_associations = values(
+        column("associative_id", String),
+        name="new_associations",
+    ).data([(value,) for value in new_associative_ids])
+
+    new_associative_id = cast(new_associations.c.associative_id, value_col.type)
+
+    existing = select(literal(1)).where(
+        owner_col == primary_table_id, value_col == new_associative_id
     )
 
-    if len(ids_to_delete) > 0:
-        delete_associations(
-            primary_table_id,
-            primary_table_name,
-            secondary_table_name,
-            ids_to_delete,
-            db,
+    stmt = (
+        insert(associative_table)
+        .from_select(
+            [owner_col.name, value_col.name],
+            select(cast(literal(primary_table_id), owner_col.type), new_associative_id).where(
+                ~exists(existing)
+            ),
         )
+        .add_cte(deleted)
+    )
 
-    if len(ids_to_create) > 0:
-        create_associations(
-            primary_table_id,
-            primary_table_name,
-            secondary_table_name,
-            ids_to_create,
-            db,
-        )
+    db.execute(stmt)
+
+    stmt = statement_cache.for_table(associative_table).associations(owner_col.name, value_col.name)
+
+    return [value for _, value in db.execute(stmt, {"_owner_ids": [primary_table_id]})]
 
 
 def get_operations(table_name: str, db: Session) -> Any:
     """Get operations for a table.
 
+    Operations are served from the in-process operations catalog, which only
+    queries the operations table when it is cold, expired or invalidated.
+
     Args:
         table_name: The table name to get operations for.
         db: The database session to use for queries.
@@ -551,13 +944,15 @@ def get_operations(table_name: str, db: Session) -> Any:
     Returns:
         The fetched table operations.
     """
-    operations_table = table_from_name("operations")
+    return operations_catalog.for_table(table_name, db)
 
-    stmt = select(operations_table).where(operations_table.c.table_name == table_name)
 
-    result = db.execute(stmt).first()
-
-    if not result:
-        return {}
+def load_catalogs(db: Session) -> None:
+    """Load the in-process catalogs which are not loaded, or have expired.
 
-    return build_resource(dict_from_row(result))
+    Args:
+        db: The database session to use for queries.
+    """
+    for catalog in (operations_catalog, relationship_catalog):
+        if not catalog.loaded:
+            catalog.load(db)
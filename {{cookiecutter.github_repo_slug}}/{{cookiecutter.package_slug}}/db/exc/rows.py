@@ -0,0 +1,70 @@
+"""Conversion of the rows of a table to resource dicts."""
+from typing import Any, Dict, Iterable, List, Tuple
+
+from sqlalchemy import DateTime, Table  # type: ignore
+
+__all__ = [
+    "RowConverter",
+]
+
+
+class RowConverter:
+    """Converts rows selecting all of the columns of a table to dicts.
+
+    The converter is generated from the reflected column types of the table:
+    rows are zipped with the precomputed column names, and only the values of
+    the datetime columns are converted, to ISO format strings. This gives the
+    same dicts as `dict_from_row`, without looking up each value by name and
+    checking its type.
+
+    Rows must have the columns of the table, in table order, as the rows of
+    every prebuilt statement of the table do.
+    """
+
+    def __init__(self, table: Table) -> None:
+        self.table = table
+        self.keys: Tuple[str, ...] = tuple(str(column.name) for column in table.columns)
+        self.datetime_keys: Tuple[str, ...] = tuple(
+            str(column.name) for column in table.columns if isinstance(column.type, DateTime)
+        )
+
+    def __call__(self, row: Iterable[Any]) -> Dict[str, Any]:
+        """Convert a row to a dict.
+
+        Args:
+            row: The row to convert.
+
+        Returns:
+            The dict of the row.
+        """
+        built_obj = dict(zip(self.keys, row))
+
+        for key in self.datetime_keys:
+            value = built_obj[key]
+
+            if value is not None:
+                built_obj[key] = value.isoformat(sep="T")
+
+        return built_obj
+
+    def all(self, rows: Iterable[Iterable[Any]]) -> List[Dict[str, Any]]:
+        """Convert many rows to dicts.
+
+        Args:
+            rows: The rows to convert.
+
+        Returns:
+            The dicts of the rows, in order.
+        """
+        keys = self.keys
+
+        built_objs = [dict(zip(keys, row)) for row in rows]
+
+        for key in self.datetime_keys:
+            for built_obj in built_objs:
+                value = built_obj[key]
+
+                if value is not None:
+                    built_obj[key] = value.isoformat(sep="T")
+
+        return built_objs
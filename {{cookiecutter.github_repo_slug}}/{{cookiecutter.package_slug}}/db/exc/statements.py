@@ -0,0 +1,335 @@
+"""Prebuilt, parameterized statements for the generic executioner."""
+import threading
+from functools import cached_property
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from containerlog import get_logger
+from sqlalchemy import (  # type: ignore
+    Column,
+    Integer,
+    Table,
+    bindparam,
+    delete,
+    insert,
+    select,
+    tuple_,
+    update,
+)
+from sqlalchemy.sql import func  # type: ignore
+
+from .rows import RowConverter
+
+logger = get_logger()
+
+__all__ = [
+    "TableStatements",
+    "StatementCache",
+    "statement_cache",
+    "keyset_columns",
+]
+
+
+def keyset_columns(resource_table: Table) -> List[Column]:
+    """Get the columns a table is paginated on.
+
+    Args:
+        resource_table: The table to paginate.
+
+    Returns:
+        The ordered columns which uniquely order the rows of the table.
+    """
+    created_at = resource_table.c.get("created_at")
+
+    if created_at is not None and not created_at.nullable:
+        return [created_at, resource_table.c.id]
+
+    return [resource_table.c.id]
+
+
+class TableStatements:
+    """The statements the executioner issues against a single table.
+
+    Every statement is built once, with bound parameters in place of the values
+    which change between requests. Building a statement and generating its cache
+    key makes up a large share of the per-request CPU cost of a small query, so
+    reusing the same statement object only leaves the lookup of its compiled form
+    in the engine's compiled cache.
+
+    Bound parameter names are prefixed with an underscore so they never collide
+    with the names of the columns of the table.
+    """
+
+    # The statements of a resource table, built by `build`.
+    _resource_statements = (
+        "select_all",
+        "select_page",
+        "select_page_after",
+        "select_by_id",
+        "select_by_ids",
+        "insert",
+        "update_by_id",
+        "delete_by_id",
+    )
+
+    def __init__(self, table: Table) -> None:
+        self.table = table
+        self._associations: Dict[Tuple[str, str], Any] = {}
+        self._dissociations: Dict[Tuple[str, str], Any] = {}
+
+    def build(self) -> None:
+        """Build the statements and the row converter of a resource table ahead of
+        their first use.
+
+        Tables without an `id` column, such as associative tables, are only used
+        through `associations` and `dissociations`, and are skipped.
+        """
+        if "id" not in self.table.c.keys():
+            return
+
+        for name in (*self._resource_statements, "rows"):
+            getattr(self, name)
+
+    @cached_property
+    def rows(self) -> RowConverter:
+        """The converter of the rows the statements return to resource dicts."""
+        return RowConverter(self.table)
+
+    @cached_property
+    def keyset(self) -> List[Column]:
+        """The columns the table is paginated on."""
+        return keyset_columns(self.table)
+
+    @cached_property
+    def _not_deleted(self) -> List[Any]:
+        if "deleted_at" in self.table.c.keys():
+            return [self.table.c.deleted_at == None]
+
+        return []
+
+    @cached_property
+    def select_all(self) -> Any:
+        """Select all rows, in keyset order."""
+        return select(self.table).where(*self._not_deleted).order_by(*self.keyset)
+
+    @cached_property
+    def select_page(self) -> Any:
+        """Select the first `_limit` rows, in keyset order."""
+        return self.select_all.limit(bindparam("_limit", type_=Integer))
+
+    @cached_property
+    def select_page_after(self) -> Any:
+        """Select `_limit` rows after the `_after_<n>` keyset values, in keyset order."""
+        after = tuple_(
+            *(bindparam(f"_after_{idx}", type_=col.type) for idx, col in enumerate(self.keyset))
+        )
+
+        return (
+            select(self.table)
+            .where(tuple_(*self.keyset) > after, *self._not_deleted)
+            .order_by(*self.keyset)
+            .limit(bindparam("_limit", type_=Integer))
+        )
+
+    @cached_property
+    def select_by_id(self) -> Any:
+        """Select the row with the `_resource_id` id."""
+        return select(self.table).where(
+            self.table.c.id == bindparam("_resource_id"), *self._not_deleted
+        )
+
+    @cached_property
+    def select_by_ids(self) -> Any:
+        """Select the rows with the `_resource_ids` ids."""
+        return select(self.table).where(
+            self.table.c.id.in_(bindparam("_resource_ids", expanding=True)), *self._not_deleted
+        )
+
+    @cached_property
+    def insert(self) -> Any:
+        """Insert a row.
+
+        The values are the execution parameters, so the same statement is used
+        whichever columns a payload sets.
+        """
+        return insert(self.table).returning(self.table)
+
+    @cached_property
+    def update_by_id(self) -> Any:
+        """Update the row with the `_resource_id` id.
+
+        The values are the execution parameters, so the same statement is used
+        whichever columns a payload sets.
+        """
+        return (
+            update(self.table)
+            .where(self.table.c.id == bindparam("_resource_id"), *self._not_deleted)
+            .returning(self.table)
+        )
+
+    @cached_property
+    def delete_by_id(self) -> Any:
+        """Delete the row with the `_resource_id` id, softly if the table supports it."""
+        if self._not_deleted:
+            return (
+                update(self.table)
+                .where(self.table.c.id == bindparam("_resource_id"), *self._not_deleted)
+                .values(deleted_at=func.current_timestamp())
+                .returning(self.table)
+            )
+
+        return delete(self.table).where(self.table.c.id == bindparam("_resource_id")).returning(
+            self.table
+        )
+
+    def page(self, limit: int, after: Optional[Iterable[Any]] = None) -> Tuple[Any, Dict]:
+        """Get the statement and parameters for a page of the table.
+
+        Args:
+            limit: The number of rows to select.
+            after: The keyset values to resume after, if not the first page.
+
+        Returns:
+            The statement and the parameters to execute it with.
+        """
+        if after is None:
+            return self.select_page, {"_limit": limit}
+
+        params: Dict[str, Any] = {f"_after_{idx}": value for idx, value in enumerate(after)}
+        params["_limit"] = limit
+
+        return self.select_page_after, params
+
+    def associations(self, owner_column_name: str, value_column_name: str) -> Any:
+        """Get the statement selecting the associations of many owners.
+
+        The statement is executed with the owner ids as the `_owner_ids` parameter,
+        and selects `(owner id, associated value)` rows.
+
+        Args:
+            owner_column_name: The column referencing the owners.
+            value_column_name: The column holding the associated values.
+
+        Returns:
+            The statement.
+        """
+        key = (owner_column_name, value_column_name)
+
+        stmt = self._associations.get(key)
+
+        if stmt is None:
+            owner_col = self.table.c[owner_column_name]
+
+            stmt = select(owner_col, self.table.c[value_column_name]).where(
+                owner_col.in_(bindparam("_owner_ids", expanding=True))
+            )
+
+            if "deleted_at" in self.table.c.keys():
+                stmt = stmt.where(self.table.c.deleted_at == None)
+
+            self._associations[key] = stmt
+
+        return stmt
+
+    def dissociations(self, owner_column_name: str, value_column_name: str) -> Any:
+        """Get the statement deleting some associations of an owner.
+
+        The statement is executed with the owner id as the `_owner_id` parameter,
+        and the associated values to delete as the `_values` parameter.
+
+        Args:
+            owner_column_name: The column referencing the owner.
+            value_column_name: The column holding the associated values.
+
+        Returns:
+            The statement.
+        """
+        key = (owner_column_name, value_column_name)
+
+        stmt = self._dissociations.get(key)
+
+        if stmt is None:
+            stmt = delete(self.table).where(
+                self.table.c[owner_column_name] == bindparam("_owner_id"),
+                self.table.c[value_column_name].in_(bindparam("_values", expanding=True)),
+            )
+
+            self._dissociations[key] = stmt
+
+        return stmt
+
+
+class StatementCache:
+    """Registry of the prebuilt statements of every reflected table.
+
+    The statements of a table are kept in the `info` of the table, so they live as
+    long as it does. When the schema is reloaded, the tables of the previous schema
+    generation keep their statements for the requests still using them, and the
+    statements of both generations are never rebuilt in turn. The cache is warmed
+    in the background once the schema has been loaded, and any table which is not
+    built yet is built on first use.
+    """
+
+    def __init__(self) -> None:
+        # The key of the statements in the info of a table, unique to the cache.
+        self._key = object()
+        self._lock = threading.Lock()
+
+    def build(self, tables: Iterable[Table]) -> None:
+        """Build the statements for a set of tables, replacing any existing ones.
+
+        Args:
+            tables: The tables to build statements for.
+        """
+        count = 0
+
+        for table in tables:
+            statements = TableStatements(table)
+            statements.build()
+
+            table.info[self._key] = statements
+            count += 1
+
+        logger.debug("built statement cache", count=count)
+
+    def warm(self, tables: Iterable[Table]) -> None:
+        """Build the statements of a set of tables, keeping any which are already built.
+
+        Args:
+            tables: The tables to build statements for.
+        """
+        for table in tables:
+            self.for_table(table).build()
+
+        logger.debug("warmed statement cache")
+
+    def clear(self) -> None:
+        """Drop all of the prebuilt statements."""
+        with self._lock:
+            self._key = object()
+
+    def for_table(self, table: Table) -> TableStatements:
+        """Get the prebuilt statements of a table.
+
+        Args:
+            table: The table to get the statements of.
+
+        Returns:
+            The statements of the table.
+        """
+        key = self._key
+        statements = table.info.get(key)
+
+        # The info of a table is carried over to its copies, which need statements of
+        # their own.
+        if statements is None or statements.table is not table:
+            with self._lock:
+                statements = table.info.get(key)
+
+                if statements is None or statements.table is not table:
+                    statements = table.info[key] = TableStatements(table)
+
+        return statements
+
+
+# Global statement cache shared by the executioner.
+statement_cache = StatementCache()
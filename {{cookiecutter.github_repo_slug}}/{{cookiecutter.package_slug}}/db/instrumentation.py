@@ -0,0 +1,86 @@
+"""Per-request instrumentation of the SQL statements run by the engine."""
+import time
+from contextvars import ContextVar
+from typing import Any, Optional
+
+from sqlalchemy import event  # type: ignore
+from sqlalchemy.engine import Engine  # type: ignore
+
+__all__ = [
+    "QueryStats",
+    "query_stats",
+    "annotate",
+    "instrument",
+]
+
+
+class QueryStats:
+    """The SQL statements run while handling a request.
+
+    Attributes:
+        resource: The table name of the resource the request is for, if any.
+        operation: The operation the request performs on the resource, e.g. `read_op`.
+        queries: The number of statements run.
+        duration: The total time spent running statements (in seconds).
+        rows: The total number of rows fetched or affected by the statements.
+    """
+
+    __slots__ = ("resource", "operation", "queries", "duration", "rows")
+
+    def __init__(self) -> None:
+        self.resource: Optional[str] = None
+        self.operation: Optional[str] = None
+        self.queries = 0
+        self.duration = 0.0
+        self.rows = 0
+
+
+# The stats of the request being handled. The context, and with it the stats, is
+# carried over to the worker threads and greenlets which run the statements.
+query_stats: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+
+def annotate(resource: str, operation: str) -> None:
+    """Label the stats of the request being handled with its resource and operation.
+
+    Args:
+        resource: The table name of the resource.
+        operation: The operation, e.g. `read_op`.
+    """
+    stats = query_stats.get()
+
+    if stats is not None:
+        stats.resource = resource
+        stats.operation = operation
+
+
+def _before_cursor_execute(
+    conn: Any, cursor: Any, statement: str, parameters: Any, context: Any, executemany: bool
+) -> None:
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(
+    conn: Any, cursor: Any, statement: str, parameters: Any, context: Any, executemany: bool
+) -> None:
+    started = conn.info["query_started"].pop()
+
+    stats = query_stats.get()
+
+    if stats is None:
+        return
+
+    stats.queries += 1
+    stats.duration += time.perf_counter() - started
+    stats.rows += max(cursor.rowcount, 0)
+
+
+def instrument(engine: Engine) -> None:
+    """Record the statements run by an engine in the stats of the current request.
+
+    Args:
+        engine: The engine to instrument. For an asyncio engine, this is its
+            `sync_engine`.
+    """
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
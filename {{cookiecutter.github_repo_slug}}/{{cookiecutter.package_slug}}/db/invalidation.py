@@ -0,0 +1,496 @@
+"""Invalidation of cached reads after writes, across the workers which cache them."""
+import os
+import select
+import socket
+import threading
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+import orjson
+from containerlog import get_logger
+from prometheus_client import Counter  # type: ignore
+from sqlalchemy import text  # type: ignore
+from sqlalchemy.engine import Engine  # type: ignore
+from sqlalchemy.orm import Session  # type: ignore
+
+from ..core.config import settings
+from .exc.catalog import relationship_catalog
+from .session import engine
+
+logger = get_logger()
+
+__all__ = [
+    "Invalidation",
+    "InvalidationBus",
+    "UnixSocketBus",
+    "PostgresBus",
+    "invalidation_bus",
+    "related_keys",
+]
+
+CACHE_INVALIDATIONS_TOTAL = Counter(
+    name="cache_invalidations_total",
+    documentation="Total count of cache invalidation events, by bus and direction",
+    labelnames=("bus", "direction"),
+)
+
+
+class Invalidation:
+    """The cached reads a write made stale.
+
+    Attributes:
+        table_name: The table name of the written resources.
+        resources: The ids of the stale resources, by table name.
+        tables: The table names of the tables whose resources are all stale.
+        everything: Whether every cached read is stale.
+    """
+
+    __slots__ = ("table_name", "resources", "tables", "everything")
+
+    def __init__(
+        self,
+        table_name: str,
+        resources: Optional[Dict[str, List[str]]] = None,
+        tables: Optional[List[str]] = None,
+        everything: bool = False,
+    ) -> None:
+        self.table_name = table_name
+        self.resources = resources or {}
+        self.tables = tables or []
+        self.everything = everything
+
+    @classmethod
+    def from_write(
+        cls,
+        table_name: str,
+        rows: List[Dict[str, Any]],
+        updated: Optional[Set[str]] = None,
+        db: Optional[Session] = None,
+    ) -> "Invalidation":
+        """Get the cached reads a write through the executioner made stale.
+
+        These are the written resources, and the resources on the other side of
+        their relationships whose associations may have changed. Those are found
+        from the written rows, as returned by the executioner. An update only
+        returns the associations it sets, not the ones it removes, so if it
+        changes associations, every resource of the other table is stale.
+
+        Args:
+            table_name: The table name of the written resources.
+            rows: The written resources.
+            updated: For an update, the fields of the payload.
+            db: The database session to use if the relationship catalog needs
+                reloading.
+
+        Returns:
+            The invalidation.
+        """
+        # Table names may be str subclasses, such as the quoted names of reflected
+        # tables, which are not encoded as keys.
+        table_name = str(table_name)
+
+        if table_name == "relationships":
+            return cls(table_name, everything=True)
+
+        resources = {table_name: [str(row["id"]) for row in rows]}
+        tables = []
+
+        for other_table_name, key in related_keys(table_name, db):
+            if updated is not None:
+                if key in updated:
+                    tables.append(str(other_table_name))
+
+                continue
+
+            ids = resources.setdefault(str(other_table_name), [])
+
+            for row in rows:
+                value = row.get(key)
+
+                if isinstance(value, list):
+                    ids.extend(str(item) for item in value)
+                elif value is not None:
+                    ids.append(str(value))
+
+        return cls(table_name, {name: ids for name, ids in resources.items() if ids}, tables)
+
+    def coarsen(self) -> "Invalidation":
+        """Get an invalidation of the whole tables of the stale resources, which is
+        smaller to send.
+
+        Returns:
+            The invalidation.
+        """
+        tables = sorted({*self.tables, *self.resources})
+
+        return Invalidation(self.table_name, tables=tables, everything=self.everything)
+
+    def encode(self, origin: str) -> bytes:
+        """Encode the invalidation to send it to other processes.
+
+        Args:
+            origin: The id of the bus which sends it.
+
+        Returns:
+            The encoded invalidation.
+        """
+        return orjson.dumps(
+            {
+                "origin": origin,
+                "table_name": self.table_name,
+                "resources": self.resources,
+                "tables": self.tables,
+                "everything": self.everything,
+            }
+        )
+
+    @classmethod
+    def decode(cls, data: bytes) -> Tuple[str, "Invalidation"]:
+        """Decode an invalidation sent by another process.
+
+        Args:
+            data: The encoded invalidation.
+
+        Returns:
+            The id of the bus which sent it, and the invalidation.
+        """
+        message = orjson.loads(data)
+
+        return message["origin"], cls(
+            message["table_name"], message["resources"], message["tables"], message["everything"]
+        )
+
+
+def related_keys(table_name: str, db: Optional[Session] = None) -> List[Tuple[str, str]]:
+    """Get the tables whose resources list the resources of a table as associations.
+
+    Args:
+        table_name: The table name.
+        db: The database session to use if the relationship catalog needs reloading.
+
+    Returns:
+        For each such table, its name, and the field of the resources of the table
+        which holds the ids of its stale resources.
+    """
+    keys = []
+
+    for relationship in relationship_catalog.all(db):
+        primary = relationship["primary_table_name"]
+        secondary = relationship["secondary_table_name"]
+        associative = relationship["associative_table_name"]
+
+        if associative is None:
+            # One to many: the secondary resource holds the id of the primary one.
+            if table_name == secondary:
+                keys.append((primary, relationship["primary_table_alias"] or f"{primary}_id"))
+        elif table_name == associative:
+            keys.append((primary, f"{primary}_id"))
+            keys.append((secondary, f"{secondary}_id"))
+        else:
+            # Many to many: each resource lists the resources of the other table.
+            if table_name == primary:
+                keys.append((secondary, secondary))
+
+            if table_name == secondary:
+                keys.append((primary, primary))
+
+    return keys
+
+
+# A subscriber of an invalidation bus, passed each invalidation, and whether it was
+# published by another process.
+Subscriber = Callable[[Invalidation, bool], None]
+
+
+class InvalidationBus:
+    """Bus the executioner publishes invalidations to after writes, which delivers
+    them to the subscribers of every process on the bus, such as the read cache and
+    the catalogs.
+
+    This base bus only delivers invalidations to the subscribers of this process.
+    Subclasses also send them to other processes, and deliver the invalidations they
+    receive from them, from a background thread run between `start` and `stop`.
+    Subscribers are run on the thread which publishes or receives an invalidation.
+    """
+
+    name = "local"
+
+    def __init__(self) -> None:
+        self.origin = uuid.uuid4().hex
+        self._subscribers: List[Subscriber] = []
+
+    def subscribe(self, subscriber: Subscriber) -> None:
+        """Subscribe to the invalidations published by every process on the bus.
+
+        A subscriber is only subscribed once.
+
+        Args:
+            subscriber: The subscriber.
+        """
+        if subscriber not in self._subscribers:
+            self._subscribers.append(subscriber)
+
+    def stage(self, invalidation: Invalidation, db: Session) -> None:
+        """Stage an invalidation in the transaction of the write, before it commits.
+
+        Args:
+            invalidation: The invalidation.
+            db: The database session of the write.
+        """
+
+    def publish(self, invalidation: Invalidation) -> None:
+        """Publish an invalidation, once the write has committed.
+
+        Args:
+            invalidation: The invalidation.
+        """
+        CACHE_INVALIDATIONS_TOTAL.labels(self.name, "published").inc()
+
+        self.deliver(invalidation, remote=False)
+
+    def deliver(self, invalidation: Invalidation, remote: bool) -> None:
+        """Deliver an invalidation to the subscribers of this process.
+
+        Args:
+            invalidation: The invalidation.
+            remote: Whether it was published by another process.
+        """
+        for subscriber in self._subscribers:
+            try:
+                subscriber(invalidation, remote)
+            except Exception as e:
+                logger.error("failed to apply invalidation", bus=self.name, error=str(e))
+
+    def start(self) -> None:
+        """Start receiving the invalidations of other processes."""
+
+    def stop(self) -> None:
+        """Stop receiving the invalidations of other processes."""
+
+    def _received(self, data: bytes) -> None:
+        try:
+            origin, invalidation = Invalidation.decode(data)
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning("received malformed invalidation", bus=self.name, error=str(e))
+            return
+
+        if origin == self.origin:
+            return
+
+        CACHE_INVALIDATIONS_TOTAL.labels(self.name, "received").inc()
+
+        self.deliver(invalidation, remote=True)
+
+    def _dropped(self, error: Exception) -> None:
+        CACHE_INVALIDATIONS_TOTAL.labels(self.name, "dropped").inc()
+        logger.warning("failed to send invalidation", bus=self.name, error=str(error))
+
+
+class UnixSocketBus(InvalidationBus):
+    """Bus of the worker processes of a host, over Unix datagram sockets.
+
+    Each process binds a socket in a shared directory, and sends each invalidation
+    it publishes to the sockets of the others. The sockets of processes which are
+    gone are removed by the next process which fails to send to them.
+    """
+
+    name = "unix"
+
+    # The largest datagram sent. Larger invalidations are sent coarsened, as whole
+    # tables.
+    MAX_DATAGRAM = 65536
+
+    def __init__(self, directory: str, timeout: float = 0.1) -> None:
+        super().__init__()
+        self.directory = directory
+        self.path = os.path.join(directory, f"{os.getpid()}-{self.origin[:8]}.sock")
+        self.timeout = timeout
+        self._socket: Optional[socket.socket] = None
+        self._sender = threading.local()
+
+    def publish(self, invalidation: Invalidation) -> None:
+        super().publish(invalidation)
+
+        try:
+            data = invalidation.encode(self.origin)
+
+            if len(data) > self.MAX_DATAGRAM:
+                data = invalidation.coarsen().encode(self.origin)
+
+            peers = [name for name in os.listdir(self.directory) if name.endswith(".sock")]
+        except (OSError, TypeError) as e:
+            self._dropped(e)
+            return
+
+        sender = self._sender_socket()
+
+        for name in peers:
+            path = os.path.join(self.directory, name)
+
+            if path == self.path:
+                continue
+
+            try:
+                sender.sendto(data, path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                # Nothing is listening: the process is gone.
+                self._remove(path)
+            except OSError as e:
+                self._dropped(e)
+
+    def start(self) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+
+        self._remove(self.path)
+
+        receiver = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        receiver.bind(self.path)
+        self._socket = receiver
+
+        def run() -> None:
+            while True:
+                try:
+                    data = receiver.recv(self.MAX_DATAGRAM)
+                except OSError:
+                    data = b""
+
+                if not data:
+                    # The socket was shut down by `stop`.
+                    return
+
+                self._received(data)
+
+        threading.Thread(target=run, name="invalidation-bus", daemon=True).start()
+
+    def stop(self) -> None:
+        receiver, self._socket = self._socket, None
+
+        if receiver is not None:
+            receiver.shutdown(socket.SHUT_RDWR)
+            receiver.close()
+
+        self._remove(self.path)
+
+    def _sender_socket(self) -> socket.socket:
+        sender = getattr(self._sender, "socket", None)
+
+        if sender is None:
+            sender = self._sender.socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            sender.settimeout(self.timeout)
+
+        return sender
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+class PostgresBus(InvalidationBus):
+    """Bus of every process connected to the database, over LISTEN/NOTIFY.
+
+    Invalidations are sent with NOTIFY in the transaction of the write, so that
+    they are delivered if and only if it commits. Each process listens on a
+    connection of its own. When that connection fails, it is opened again, and
+    every subscriber is sent an invalidation of everything, since invalidations
+    may have been missed in the meantime.
+    """
+
+    name = "postgres"
+
+    # The largest NOTIFY payload. Larger invalidations are sent coarsened, as whole
+    # tables, or as an invalidation of everything.
+    MAX_PAYLOAD = 7999
+
+    NOTIFY = text("SELECT pg_notify(:channel, :payload)")
+
+    def __init__(self, engine: Engine, channel: str, poll_interval: float = 1.0) -> None:
+        super().__init__()
+        self.engine = engine
+        self.channel = channel
+        self.poll_interval = poll_interval
+        self._stopped = threading.Event()
+
+    def stage(self, invalidation: Invalidation, db: Session) -> None:
+        payload = invalidation.encode(self.origin)
+
+        if len(payload) > self.MAX_PAYLOAD:
+            payload = invalidation.coarsen().encode(self.origin)
+
+        if len(payload) > self.MAX_PAYLOAD:
+            payload = Invalidation(invalidation.table_name, everything=True).encode(self.origin)
+
+        db.execute(self.NOTIFY, {"channel": self.channel, "payload": payload.decode()})
+
+    def start(self) -> None:
+        stopped = self._stopped = threading.Event()
+
+        def run() -> None:
+            connected_before = False
+
+            while not stopped.is_set():
+                try:
+                    connection = self._listen()
+                except Exception as e:
+                    logger.error("failed to listen for invalidations", bus=self.name, error=str(e))
+                    stopped.wait(self.poll_interval)
+                    continue
+
+                if connected_before:
+                    self.deliver(Invalidation("*", everything=True), remote=True)
+
+                connected_before = True
+
+                try:
+                    self._receive(connection, stopped)
+                except Exception as e:
+                    logger.error("lost invalidation listener", bus=self.name, error=str(e))
+                finally:
+                    connection.close()
+
+        threading.Thread(target=run, name="invalidation-bus", daemon=True).start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    def _listen(self) -> Any:
+        # A connection of the engine, taken out of its pool for good.
+        fairy = self.engine.raw_connection()
+        fairy.detach()
+
+        connection = fairy.connection
+        connection.autocommit = True
+
+        with connection.cursor() as cursor:
+            cursor.execute('LISTEN "' + self.channel.replace('"', '""') + '"')
+
+        return connection
+
+    def _receive(self, connection: Any, stopped: threading.Event) -> None:
+        while not stopped.is_set():
+            if select.select([connection], [], [], self.poll_interval)[0]:
+                connection.poll()
+
+                while connection.notifies:
+                    self._received(connection.notifies.pop(0).payload.encode())
+
+
+def create_bus() -> InvalidationBus:
+    """Create the invalidation bus, as configured.
+
+    Returns:
+        The bus.
+    """
+    if settings.invalidation_bus == "unix":
+        return UnixSocketBus(settings.invalidation_bus_path)
+
+    if settings.invalidation_bus == "postgres":
+        return PostgresBus(engine, settings.invalidation_bus_channel)
+
+    return InvalidationBus()
+
+
+# Global invalidation bus, as configured.
+invalidation_bus = create_bus()
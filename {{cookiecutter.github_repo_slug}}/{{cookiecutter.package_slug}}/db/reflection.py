@@ -0,0 +1,345 @@
+"""Reflection of the database schema, cached in a snapshot file and reloaded on change."""
+import os
+import pickle
+import tempfile
+import threading
+import time
+from contextvars import ContextVar
+from typing import Callable, List, Mapping, Optional, Tuple
+
+from containerlog import get_logger
+from sqlalchemy import MetaData, Table, text  # type: ignore
+from sqlalchemy.engine import Engine  # type: ignore
+
+from ..core.config import settings
+from .exc.statements import statement_cache
+from .session import engine
+
+logger = get_logger()
+
+__all__ = [
+    "SchemaGeneration",
+    "SchemaReflector",
+    "schema_generation",
+    "schema_reflector",
+]
+
+# A digest of the columns and constraints of the tables in the current schema. It
+# is computed by the server in a single query, which is far cheaper than reflecting
+# the schema, so a snapshot can be checked against the database before it is used.
+FINGERPRINT_QUERY = text(
+    """
+    SELECT md5(coalesce(string_agg(entry, ';' ORDER BY entry), ''))
+    FROM (
+        SELECT concat_ws(',', table_name, column_name, data_type, udt_name, is_nullable,
+                         column_default, ordinal_position) AS entry
+        FROM information_schema.columns
+        WHERE table_schema = current_schema()
+        UNION ALL
+        SELECT concat_ws(',', tc.table_name, tc.constraint_name, tc.constraint_type,
+                         kcu.column_name, kcu.ordinal_position)
+        FROM information_schema.table_constraints tc
+        LEFT JOIN information_schema.key_column_usage kcu
+            ON kcu.constraint_schema = tc.constraint_schema
+            AND kcu.constraint_name = tc.constraint_name
+        WHERE tc.table_schema = current_schema()
+    ) AS schema_entries
+    """
+)
+
+
+class SchemaGeneration:
+    """A version of the database schema.
+
+    A generation is never modified once it is created: when the schema changes, a
+    new generation replaces it. Structures derived from the tables of a generation
+    are kept in the `info` of its metadata or tables, so they are dropped along
+    with it.
+
+    Attributes:
+        number: The number of the generation, counting up from 1 in each process.
+        fingerprint: The fingerprint of the schema the generation was loaded from.
+        metadata: The tables of the schema.
+    """
+
+    __slots__ = ("number", "fingerprint", "metadata")
+
+    def __init__(self, number: int, fingerprint: str, metadata: MetaData) -> None:
+        self.number = number
+        self.fingerprint = fingerprint
+        self.metadata = metadata
+
+
+# The schema generation the request being handled was pinned to, if any. Requests
+# are served from a single generation from start to finish, even if the schema is
+# reloaded while they are in flight.
+schema_generation: ContextVar[Optional[SchemaGeneration]] = ContextVar(
+    "schema_generation", default=None
+)
+
+
+class SchemaReflector:
+    """The database schema, reflected on first use and reloaded when it changes.
+
+    Reflecting a large schema issues several queries per table, and takes seconds.
+    If a snapshot file is configured, the reflected schema is pickled to it along
+    with the fingerprint of the schema it was reflected from, and later loads read
+    the snapshot instead of reflecting.
+
+    Once the application has started, `watch` polls the fingerprint of the schema
+    in the database. When it no longer matches, e.g. after a migration, or because
+    the snapshot was stale, the schema is reflected again and swapped in as a new
+    generation, without restarting the application.
+    """
+
+    def __init__(self, engine: Engine, snapshot_path: Optional[str] = None) -> None:
+        self.engine = engine
+        self.snapshot_path = snapshot_path
+        self.generation: Optional[SchemaGeneration] = None
+        self._reload_callbacks: List[Callable[[SchemaGeneration], None]] = []
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    @property
+    def loaded(self) -> bool:
+        """Whether the schema has been loaded."""
+        return self.generation is not None
+
+    def current(self) -> SchemaGeneration:
+        """Get the schema generation of the request being handled.
+
+        Returns:
+            The generation the request is pinned to or, outside of a request, the
+            latest generation. The schema is loaded if it is not yet.
+        """
+        generation = schema_generation.get() or self.generation
+
+        if generation is None:
+            self.load()
+            generation = self.generation
+
+        return generation  # type: ignore
+
+    @property
+    def metadata(self) -> MetaData:
+        """The metadata of the current schema generation."""
+        return self.current().metadata
+
+    @property
+    def tables(self) -> Mapping[str, Table]:
+        """The tables of the current schema generation, by name."""
+        return self.current().metadata.tables
+
+    def fingerprint(self) -> str:
+        """Get the fingerprint of the schema in the database.
+
+        Returns:
+            The fingerprint.
+        """
+        with self.engine.connect() as conn:
+            return conn.execute(FINGERPRINT_QUERY).scalar()
+
+    def load(self) -> None:
+        """Load the schema, if it has not been loaded yet.
+
+        The schema is read from the snapshot file if there is one, and reflected
+        from the database otherwise.
+        """
+        if self.generation is not None:
+            return
+
+        with self._lock:
+            if self.generation is not None:
+                return
+
+            started = time.perf_counter()
+
+            snapshot = self._read()
+
+            if snapshot is not None:
+                fingerprint, reflected = snapshot
+                source = "snapshot"
+            else:
+                fingerprint, reflected = self._reflect()
+                source = "database"
+
+                self._write(fingerprint, reflected)
+
+            self.generation = SchemaGeneration(1, fingerprint, reflected)
+
+        logger.info(
+            "loaded database schema",
+            source=source,
+            tables=len(reflected.tables),
+            elapsed=round(time.perf_counter() - started, 3),
+        )
+
+    def on_reload(self, callback: Callable[[SchemaGeneration], None]) -> None:
+        """Register a callback which prepares a new schema generation before it is used.
+
+        Callbacks are run with the new generation pinned, before it is swapped in.
+
+        A callback is only registered once.
+
+        Args:
+            callback: The callback, which is passed the new generation.
+        """
+        if callback not in self._reload_callbacks:
+            self._reload_callbacks.append(callback)
+
+    def reload(self) -> SchemaGeneration:
+        """Reflect the schema again, and swap it in as a new generation.
+
+        Requests already in flight finish on the generation they were pinned to.
+
+        Returns:
+            The new generation.
+        """
+        with self._lock:
+            started = time.perf_counter()
+
+            fingerprint, reflected = self._reflect()
+
+            previous = self.generation
+            generation = SchemaGeneration(
+                previous.number + 1 if previous is not None else 1, fingerprint, reflected
+            )
+
+            # Written before the new generation is prepared, since the structures
+            # derived from it are kept in the info of its metadata and tables.
+            self._write(fingerprint, reflected)
+
+            token = schema_generation.set(generation)
+
+            try:
+                statement_cache.warm(reflected.tables.values())
+
+                for callback in self._reload_callbacks:
+                    callback(generation)
+            finally:
+                schema_generation.reset(token)
+
+            self.generation = generation
+
+        logger.info(
+            "reloaded database schema",
+            generation=generation.number,
+            tables=len(reflected.tables),
+            elapsed=round(time.perf_counter() - started, 3),
+        )
+
+        return generation
+
+    def validate(self) -> bool:
+        """Check that the loaded schema matches the schema in the database, and
+        reload it if it does not.
+
+        Returns:
+            True if the loaded schema was up to date.
+        """
+        generation = self.current()
+        fingerprint = self.fingerprint()
+
+        if fingerprint == generation.fingerprint:
+            return True
+
+        logger.warning(
+            "database schema changed",
+            generation=generation.number,
+            loaded=generation.fingerprint,
+            database=fingerprint,
+        )
+
+        self.reload()
+
+        return False
+
+    def watch(self, interval: float) -> threading.Thread:
+        """Watch the database for schema changes in a background thread.
+
+        The executioner's statements are built first, since they are otherwise
+        built on first use, table by table. The schema is then validated, and
+        again every interval, until `stop` is called.
+
+        Args:
+            interval: The number of seconds between checks. If 0, the schema is
+                only validated once.
+
+        Returns:
+            The started thread.
+        """
+        stopped = self._stopped = threading.Event()
+
+        def run() -> None:
+            try:
+                statement_cache.warm(self.tables.values())
+            except Exception as e:
+                logger.error("failed to build statements", error=str(e))
+
+            while True:
+                try:
+                    self.validate()
+                except Exception as e:
+                    logger.error("failed to validate database schema", error=str(e))
+
+                if not interval or stopped.wait(interval):
+                    return
+
+        thread = threading.Thread(target=run, name="schema-watcher", daemon=True)
+        thread.start()
+
+        return thread
+
+    def stop(self) -> None:
+        """Stop watching the database for schema changes."""
+        self._stopped.set()
+
+    def _reflect(self) -> Tuple[str, MetaData]:
+        reflected = MetaData()
+
+        # The fingerprint is taken first, so that a schema change during reflection
+        # makes the snapshot stale rather than silently out of date.
+        fingerprint = self.fingerprint()
+
+        reflected.reflect(bind=self.engine)
+
+        return fingerprint, reflected
+
+    def _read(self) -> Optional[Tuple[str, MetaData]]:
+        if not self.snapshot_path:
+            return None
+
+        try:
+            with open(self.snapshot_path, "rb") as f:
+                snapshot = pickle.load(f)
+
+            return snapshot["fingerprint"], snapshot["metadata"]
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, KeyError, TypeError):
+            return None
+
+    def _write(self, fingerprint: str, reflected: MetaData) -> None:
+        if not self.snapshot_path:
+            return
+
+        # Written to a temporary file and moved into place, so that concurrent
+        # workers never read a partially written file.
+        directory = os.path.dirname(os.path.abspath(self.snapshot_path))
+
+        temp_path = None
+
+        try:
+            fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".schema-")
+
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump({"fingerprint": fingerprint, "metadata": reflected}, f)
+
+            os.replace(temp_path, self.snapshot_path)
+        except OSError as e:
+            logger.warning("failed to write schema snapshot", path=self.snapshot_path, error=str(e))
+
+            if temp_path is not None and os.path.exists(temp_path):
+                os.remove(temp_path)
+
+
+# Global schema of the application's database.
+schema_reflector = SchemaReflector(engine, settings.schema_snapshot_path)
@@ -1,19 +1,49 @@
 """Global database engine and session factory."""
+from typing import Optional
 
-from sqlalchemy import MetaData, create_engine  # type: ignore
+from sqlalchemy import create_engine  # type: ignore
+from sqlalchemy.engine import make_url  # type: ignore
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine  # type: ignore
 from sqlalchemy.orm import sessionmaker  # type: ignore
 
 from ..core.config import settings
+from .instrumentation import instrument
 
 engine = create_engine(
     settings.sqlalchemy_database_uri,
     pool_pre_ping=True,
+    pool_size=settings.db_pool_size,
+    max_overflow=settings.db_max_overflow,
 )
 
+instrument(engine)
+
 SessionLocal = sessionmaker(
     autocommit=False,
     autoflush=False,
     bind=engine,
 )
 
-metadata = MetaData()
+# The asyncio engine and session factory are only created in the async execution
+# mode, since the async driver is otherwise not required. The blocking engine is
+# still used to reflect the schema and load the catalogs at startup.
+async_engine: Optional[AsyncEngine] = None
+AsyncSessionLocal: Optional[sessionmaker] = None
+
+if settings.db_execution_mode == "async":
+    async_engine = create_async_engine(
+        make_url(settings.sqlalchemy_database_uri).set(drivername="postgresql+asyncpg"),
+        pool_pre_ping=True,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+    )
+
+    instrument(async_engine.sync_engine)
+
+    AsyncSessionLocal = sessionmaker(
+        autocommit=False,
+        autoflush=False,
+        expire_on_commit=False,
+        bind=async_engine,
+        class_=AsyncSession,
+    )
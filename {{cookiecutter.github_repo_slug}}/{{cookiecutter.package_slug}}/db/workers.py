@@ -0,0 +1,148 @@
+"""Bounded thread pool for blocking database calls."""
+import asyncio
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from containerlog import get_logger
+from fastapi.exceptions import HTTPException
+
+from ..core.config import settings
+from ..middleware.prometheus import (
+    DB_WORKERS_BUSY,
+    DB_WORKERS_QUEUE_DEPTH,
+    DB_WORKERS_QUEUE_WAIT,
+    DB_WORKERS_REJECTED_TOTAL,
+    DB_WORKERS_SIZE,
+)
+
+logger = get_logger()
+
+__all__ = [
+    "WorkerPool",
+    "db_workers",
+]
+
+
+class WorkerPool:
+    """A fixed number of threads which run blocking database calls off the event loop.
+
+    There are as many threads as the engine can hand out connections, so a call
+    which holds a thread never waits on the connection pool as well. Calls beyond
+    that wait in a bounded queue. When the queue is full, or a call waits in it
+    for longer than the queue timeout, the call is rejected with a 503 instead of
+    piling up behind the slow ones.
+
+    The context of the caller, including context variables, is carried over to
+    the thread which runs the call.
+    """
+
+    def __init__(self, size: int, queue_depth: int, queue_timeout: float) -> None:
+        self.size = size
+        self.queue_depth = queue_depth
+        self.queue_timeout = queue_timeout
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._queued = 0
+        self._lock = threading.Lock()
+
+        DB_WORKERS_SIZE.set(size)
+
+    @property
+    def queued(self) -> int:
+        """The number of calls waiting for a thread."""
+        return self._queued
+
+    async def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        """Run a blocking call on a worker thread.
+
+        Args:
+            func: The blocking function to call.
+            *args: The arguments to call the function with.
+
+        Returns:
+            The result of the call.
+
+        Raises:
+            HTTPException: The call was rejected because the pool is saturated.
+        """
+        with self._lock:
+            if self._queued >= self.queue_depth:
+                DB_WORKERS_REJECTED_TOTAL.labels(reason="queue_full").inc()
+                raise self._saturated()
+
+            self._queued += 1
+
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.size, thread_name_prefix="db-worker"
+                )
+
+            executor = self._executor
+
+        DB_WORKERS_QUEUE_DEPTH.inc()
+
+        context = contextvars.copy_context()
+
+        future = executor.submit(context.run, self._call, time.perf_counter(), func, *args)
+        result = asyncio.wrap_future(future)
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(result), self.queue_timeout)
+        except asyncio.TimeoutError:
+            # A call which has not started yet can still be cancelled, one which is
+            # already running is waited for.
+            if not future.cancel():
+                return await result
+
+            self._dequeue()
+
+            DB_WORKERS_REJECTED_TOTAL.labels(reason="queue_timeout").inc()
+            raise self._saturated()
+
+    def shutdown(self) -> None:
+        """Stop the worker threads once the calls they are running complete.
+
+        The threads are started again by the next call.
+        """
+        with self._lock:
+            executor, self._executor = self._executor, None
+
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def _call(self, enqueued: float, func: Callable[..., Any], *args: Any) -> Any:
+        self._dequeue()
+
+        DB_WORKERS_QUEUE_WAIT.observe(time.perf_counter() - enqueued)
+        DB_WORKERS_BUSY.inc()
+
+        try:
+            return func(*args)
+        finally:
+            DB_WORKERS_BUSY.dec()
+
+    def _dequeue(self) -> None:
+        with self._lock:
+            self._queued -= 1
+
+        DB_WORKERS_QUEUE_DEPTH.dec()
+
+    @staticmethod
+    def _saturated() -> HTTPException:
+        logger.warning("database worker pool is saturated")
+
+        return HTTPException(
+            status_code=503,
+            detail="Service is overloaded, try again later",
+            headers={"Retry-After": "1"},
+        )
+
+
+# Global worker pool for the sync execution mode, sized to the engine's connection pool.
+db_workers = WorkerPool(
+    size=settings.db_pool_size + settings.db_max_overflow,
+    queue_depth=settings.db_workers_queue_depth,
+    queue_timeout=settings.db_workers_queue_timeout,
+)
@@ -0,0 +1,281 @@
+"""Generation and caching of the OpenAPI document."""
+import functools
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+from weakref import WeakKeyDictionary
+
+from containerlog import get_logger
+from fastapi import FastAPI
+from fastapi.openapi.utils import get_openapi
+from sqlalchemy import Table  # type: ignore
+
+from ..core.config import settings
+from ..db.exc.catalog import operations_catalog, relationship_catalog
+from ..db.reflection import schema_reflector
+from ..utils.utils import snake_to_camel
+from .utils import get_paths, get_schemas
+
+logger = get_logger()
+
+__all__ = [
+    "OpenAPICache",
+    "openapi_cache",
+    "build_openapi",
+    "read_tags",
+    "table_fingerprint",
+    "schema_fingerprint",
+    "get_openapi_schema",
+]
+
+# Generic route paths, which are replaced by the paths of each resource.
+GENERIC_PATHS = ("/v1/{full_path}", "/v1/{full_path}/{resource_id}")
+
+
+@functools.lru_cache(maxsize=None)
+def read_tags(path: str = "dev/tags.json") -> Dict[str, str]:
+    """Read the descriptions of the resource tags.
+
+    The file is read once per process.
+
+    Args:
+        path: The path of the tags file.
+
+    Returns:
+        The tag descriptions, by table name.
+    """
+    with open(path) as f:
+        return json.load(f)
+
+
+# Reflected tables are immutable, so their part of the fingerprint is only built once.
+_table_fingerprints: "WeakKeyDictionary[Table, Tuple]" = WeakKeyDictionary()
+
+
+def table_fingerprint(table: Table) -> Tuple:
+    """Get the part of the schema fingerprint for a table.
+
+    Args:
+        table: The table.
+
+    Returns:
+        The name, and the name, type, nullability and server default of each column.
+    """
+    fingerprint = _table_fingerprints.get(table)
+
+    if fingerprint is None:
+        fingerprint = _table_fingerprints[table] = (
+            table.name,
+            tuple(
+                (
+                    column.name,
+                    str(column.type),
+                    column.nullable,
+                    str(column.server_default.arg) if column.server_default else None,
+                )
+                for column in table.columns
+            ),
+        )
+
+    return fingerprint
+
+
+def schema_fingerprint(
+    application: FastAPI,
+    operations: Dict[str, Dict],
+    relationships: List[Dict],
+    tags: Dict[str, str],
+) -> str:
+    """Get a fingerprint of everything the OpenAPI document is generated from.
+
+    Args:
+        application: The application.
+        operations: The operations of every table.
+        relationships: Every relationship.
+        tags: The tag descriptions, by table name.
+
+    Returns:
+        The fingerprint.
+    """
+    tables = [table_fingerprint(table) for table in schema_reflector.tables.values()]
+
+    routes = [
+        (getattr(route, "path", None), sorted(getattr(route, "methods", None) or ()))
+        for route in application.routes
+    ]
+
+    source = {
+        "app": [application.title, application.version, application.description],
+        "routes": routes,
+        "tables": tables,
+        "operations": operations,
+        "relationships": relationships,
+        "tags": tags,
+        "suppress_abstract_table_docs": settings.suppress_abstract_table_docs,
+    }
+
+    encoded = json.dumps(source, sort_keys=True, default=str).encode()
+
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def build_openapi(application: FastAPI, operations: Dict[str, Dict], tags: Dict[str, str]) -> Dict:
+    """Build the OpenAPI document, in a single pass over the tables.
+
+    Args:
+        application: The application.
+        operations: The operations of every table.
+        tags: The tag descriptions, by table name.
+
+    Returns:
+        The OpenAPI document.
+    """
+    openapi_schema = get_openapi(
+        title=application.title,
+        version=application.version,
+        description=application.description,
+        routes=application.routes,
+    )
+
+    paths = openapi_schema["paths"]
+    schemas = openapi_schema["components"]["schemas"]
+
+    for generic_path in GENERIC_PATHS:
+        del paths[generic_path]
+
+    new_tags = []
+
+    for table_name in schema_reflector.tables.keys():
+        for path, definition in get_paths(table_name, operations.get(table_name, {})).items():
+            if path in paths:
+                for method, schema in definition.items():
+                    paths[path].setdefault(method, schema)
+            else:
+                paths[path] = definition
+
+        schemas.update(get_schemas(table_name))
+
+        if table_name in tags:
+            new_tags.append({"name": snake_to_camel(table_name), "description": tags[table_name]})
+
+    openapi_schema["tags"] = new_tags
+
+    return openapi_schema
+
+
+class OpenAPICache:
+    """The OpenAPI document, memoized by the fingerprint of what it is built from.
+
+    The document is only built again when the fingerprint changes, e.g. when the
+    operations of a table are updated. If a cache file is configured, the document
+    is also persisted to it, so that a restarted application with an unchanged
+    schema serves it without building it at all.
+    """
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        self.path = path
+        self._fingerprint: Optional[str] = None
+        self._schema: Optional[Dict] = None
+        self._lock = threading.Lock()
+
+    def get(self, fingerprint: str, build: Callable[[], Dict]) -> Dict:
+        """Get the document for a fingerprint, building it if it is not cached.
+
+        Args:
+            fingerprint: The fingerprint of what the document is built from.
+            build: Builds the document.
+
+        Returns:
+            The OpenAPI document.
+        """
+        if fingerprint == self._fingerprint:
+            return self._schema  # type: ignore
+
+        with self._lock:
+            if fingerprint == self._fingerprint:
+                return self._schema  # type: ignore
+
+            schema = self._read(fingerprint)
+
+            if schema is None:
+                schema = build()
+                self._write(fingerprint, schema)
+
+                logger.info("built openapi document", fingerprint=fingerprint)
+
+            self._schema = schema
+            self._fingerprint = fingerprint
+
+        return schema
+
+    def clear(self) -> None:
+        """Drop the memoized document. The cache file is left in place."""
+        with self._lock:
+            self._fingerprint = None
+            self._schema = None
+
+    def _read(self, fingerprint: str) -> Optional[Dict]:
+        if not self.path:
+            return None
+
+        try:
+            with open(self.path) as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if cached.get("fingerprint") != fingerprint:
+            return None
+
+        return cached.get("openapi")
+
+    def _write(self, fingerprint: str, schema: Dict) -> None:
+        if not self.path:
+            return
+
+        # Written to a temporary file and moved into place, so that concurrent
+        # workers never read a partially written file.
+        directory = os.path.dirname(os.path.abspath(self.path))
+
+        temp_path = None
+
+        try:
+            fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".openapi-")
+
+            with os.fdopen(fd, "w") as f:
+                json.dump({"fingerprint": fingerprint, "openapi": schema}, f)
+
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            logger.warning("failed to write openapi cache file", path=self.path, error=str(e))
+
+            if temp_path is not None and os.path.exists(temp_path):
+                os.remove(temp_path)
+
+
+# Global OpenAPI document cache of the application.
+openapi_cache = OpenAPICache(settings.openapi_cache_path)
+
+
+def get_openapi_schema(application: FastAPI) -> Dict:
+    """Get the OpenAPI document of an application.
+
+    The operations and relationships are read from a single snapshot of their
+    catalogs, which both the fingerprint and the document are built from.
+
+    Args:
+        application: The application.
+
+    Returns:
+        The OpenAPI document.
+    """
+    operations = operations_catalog.all()
+    relationships = relationship_catalog.all()
+    tags = read_tags()
+
+    fingerprint = schema_fingerprint(application, operations, relationships, tags)
+
+    return openapi_cache.get(fingerprint, lambda: build_openapi(application, operations, tags))
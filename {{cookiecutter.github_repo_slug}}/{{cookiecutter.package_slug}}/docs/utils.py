@@ -1,6 +1,6 @@
+from typing import Dict
+
 from ..core.config import settings
-from ..db.exc import executioner
-from ..db.session import SessionLocal
 from ..utils.utils import get_schema_models, snake_to_camel
 
 __all__ = [
@@ -138,11 +138,12 @@ def build_responses(table_name: str, list_response: bool = False):
     }
 
 
-def get_paths(table_name: str):
+def get_paths(table_name: str, operations: Dict):
     """Get custom paths for openapi generation.
 
     Args:
         table_name: The table name to generate endpoint paths for.
+        operations: The operations permitted on the table.
 
     Returns:
         The newly created paths.
@@ -153,6 +154,7 @@ def get_paths(table_name: str):
 
     table_name_camel = snake_to_camel(table_name)
     table_name_hyphenated = table_name.replace("_", "-")
+    payload_schema_ref = f"#/components/schemas/{table_name_camel}Payload"
 
     endpoints = {
         f"/v1/{table_name_hyphenated}": {
@@ -162,7 +164,39 @@ def get_paths(table_name: str):
                 ],
                 "summary": f"Get all {table_name_camel}",
                 "operationId": f"get_{table_name}_v1__get",
-                "parameters": [],
+                "parameters": [
+                    {
+                        "description": "The maximum number of resources to return.",
+                        "required": False,
+                        "schema": {
+                            "title": "Limit",
+                            "type": "integer",
+                            "minimum": 1,
+                        },
+                        "name": "limit",
+                        "in": "query",
+                    },
+                    {
+                        "description": "The X-Next-Cursor value of the previous page.",
+                        "required": False,
+                        "schema": {
+                            "title": "Cursor",
+                            "type": "string",
+                        },
+                        "name": "cursor",
+                        "in": "query",
+                    },
+                    {
+                        "description": "Stream the whole collection as newline delimited JSON.",
+                        "required": False,
+                        "schema": {
+                            "title": "Stream",
+                            "type": "boolean",
+                        },
+                        "name": "stream",
+                        "in": "query",
+                    },
+                ],
                 "requestBody": {
                     "content": {
                         "application/json": {
@@ -177,13 +211,24 @@ def get_paths(table_name: str):
                     table_name_camel,
                 ],
                 "summary": f"Create a new {table_name_camel} resource",
+                "description": "Send a list of payloads to create many resources at once.",
                 "operationId": f"create_{table_name}_v1__post",
                 "parameters": [],
                 "requestBody": {
                     "content": {
                         "application/json": {
                             "schema": {
-                                "$ref": f"#/components/schemas/{table_name_camel}Payload",
+                                "oneOf": [
+                                    {
+                                        "$ref": payload_schema_ref,
+                                    },
+                                    {
+                                        "type": "array",
+                                        "items": {
+                                            "$ref": payload_schema_ref,
+                                        },
+                                    },
+                                ],
                             },
                         },
                     },
@@ -269,10 +314,6 @@ def get_paths(table_name: str):
     if table_name in ["relationships", "operations"]:
         return endpoints
 
-    db = SessionLocal()
-
-    operations = executioner.get_operations(table_name, db)
-
     if operations == {}:
         return {}
 
@@ -289,8 +330,6 @@ def get_paths(table_name: str):
     if not operations.get("delete_op"):
         del endpoints[f"/v1/{table_name_hyphenated}/{{ "{{" }}resource_id{{ "}}" }}"]["delete"]
 
-    db.close()
-
     return endpoints
 
 
@@ -7,18 +7,13 @@ the target for uvicorn.
 import containerlog.proxy.std
 import fastapi_rfc7807.middleware as rfc7807
 from fastapi import FastAPI
-from fastapi.openapi.utils import get_openapi
 
 from . import middleware
 from .api import core, generic
 from .core import events, hooks
 from .core.config import settings
+from .docs.openapi import get_openapi_schema
 from .metadata import tags
-from .utils.utils import (
-    generate_custom_openapi_paths,
-    generate_custom_openapi_schemas,
-    generate_custom_openapi_tags,
-)
 
 # Patch the uvicorn, fastapi, and websockets std loggers to use the containerlog
 # proxy. This gives us not only faster logging, but also consistently formatted
@@ -66,6 +61,7 @@ def get_application() -> FastAPI:
 
     # Register application middleware
     middleware.prometheus.register(application)
+    middleware.schema.register(application)
 
     # Traps exceptions and raises error responses in RFC7807 format.
     rfc7807.register(
@@ -80,39 +76,7 @@ def get_application() -> FastAPI:
     events.register_shutdown(application)
 
     def custom_openapi():
-        if application.openapi_schema:
-            return application.openapi_schema
-
-        openapi_schema = get_openapi(
-            title=application.title,
-            version=application.version,
-            description=application.description,
-            routes=application.routes,
-        )
-
-        del openapi_schema["paths"]["/v1/{full_path}"]
-        del openapi_schema["paths"]["/v1/{full_path}/{resource_id}"]
-
-        new_paths = generate_custom_openapi_paths()
-
-        for path, definition in new_paths.items():
-            if path in openapi_schema["paths"].keys():
-                for method, schema in definition.items():
-                    if method not in openapi_schema["paths"][path].keys():
-                        openapi_schema["paths"][path][method] = schema
-            else:
-                openapi_schema["paths"][path] = definition
-
-        new_schemas = generate_custom_openapi_schemas()
-
-        for schema_name, definition in new_schemas.items():
-            openapi_schema["components"]["schemas"][schema_name] = definition
-
-        new_tags = generate_custom_openapi_tags()
-
-        openapi_schema["tags"] = new_tags
-
-        application.openapi_schema = openapi_schema
+        application.openapi_schema = get_openapi_schema(application)
 
         return application.openapi_schema
 
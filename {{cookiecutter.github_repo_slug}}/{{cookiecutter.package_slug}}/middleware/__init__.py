@@ -1 +1 @@
-from . import prometheus  # noqa
+from . import prometheus, schema  # noqa
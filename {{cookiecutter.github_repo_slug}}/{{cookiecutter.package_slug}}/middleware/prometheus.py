@@ -1,19 +1,44 @@
 """Application metrics export for Prometheus."""
 
+import atexit
+import os
 import time
+import threading
+from typing import Any, Dict, List, Optional, Tuple
 
-from fastapi import FastAPI
-from prometheus_client import Counter, Gauge, Histogram  # type: ignore
-from prometheus_client.core import REGISTRY  # type: ignore
-from prometheus_client.exposition import (  # type: ignore
+# When several worker processes serve the application, each process writes its
+# metrics to files in a shared directory, which are aggregated when scraped. The
+# directory is read by prometheus_client when it is first imported, under a name
+# which changed case between versions, so both spellings are set from either.
+MULTIPROC_DIR: Optional[str] = os.environ.get("PROMETHEUS_MULTIPROC_DIR") or os.environ.get(
+    "prometheus_multiproc_dir"
+)
+
+if MULTIPROC_DIR:
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = os.environ["prometheus_multiproc_dir"] = MULTIPROC_DIR
+
+from containerlog import get_logger  # noqa: E402
+from fastapi import FastAPI  # noqa: E402
+from prometheus_client import (  # type: ignore # noqa: E402
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    multiprocess,
+)
+from prometheus_client.core import REGISTRY  # type: ignore # noqa: E402
+from prometheus_client.exposition import (  # type: ignore # noqa: E402
     CONTENT_TYPE_LATEST,
     generate_latest,
 )
-from starlette.requests import Request
-from starlette.responses import Response
-from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from starlette.requests import Request  # noqa: E402
+from starlette.responses import Response  # noqa: E402
+from starlette.types import ASGIApp, Message, Receive, Scope, Send  # noqa: E402
 
-from ..utils import utils
+from ..core.config import settings  # noqa: E402
+from ..db.instrumentation import QueryStats, query_stats  # noqa: E402
+
+logger = get_logger()
 
 HTTP_REQUESTS_TOTAL = Counter(
     name="http_requests_total",
@@ -34,6 +59,7 @@ HTTP_REQUESTS_ACTIVE = Gauge(
     name="http_requests_active",
     documentation="Number of HTTP requests currently being processed",
     labelnames=("method", "path_template"),
+    multiprocess_mode="livesum",
 )
 
 HTTP_RESPONSES_TOTAL = Counter(
@@ -55,6 +81,329 @@ HTTP_ERRORS_TOTAL = Counter(
 )
 
 
+DB_WORKERS_QUEUE_DEPTH = Gauge(
+    name="db_workers_queue_depth",
+    documentation="Number of database calls waiting for a database worker thread",
+    multiprocess_mode="livesum",
+)
+
+DB_WORKERS_QUEUE_WAIT = Histogram(
+    name="db_workers_queue_wait_sec",
+    documentation="Time database calls wait for a database worker thread (in seconds)",
+)
+
+DB_WORKERS_BUSY = Gauge(
+    name="db_workers_busy",
+    documentation="Number of database worker threads currently running a database call",
+    multiprocess_mode="livesum",
+)
+
+DB_WORKERS_SIZE = Gauge(
+    name="db_workers_size",
+    documentation="Number of database worker threads; saturation is busy / size",
+    multiprocess_mode="livesum",
+)
+
+DB_WORKERS_REJECTED_TOTAL = Counter(
+    name="db_workers_rejected_total",
+    documentation="Total count of database calls rejected by the database worker pool",
+    labelnames=("reason",),
+)
+
+DB_REQUEST_QUERIES = Histogram(
+    name="db_request_queries",
+    documentation="Number of SQL statements run per request",
+    labelnames=("resource", "operation"),
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500),
+)
+
+DB_REQUEST_DURATION = Histogram(
+    name="db_request_duration_sec",
+    documentation="Total time spent running SQL statements per request (in seconds)",
+    labelnames=("resource", "operation"),
+)
+
+DB_REQUEST_ROWS = Histogram(
+    name="db_request_rows",
+    documentation="Number of rows fetched or affected by the SQL statements of a request",
+    labelnames=("resource", "operation"),
+    buckets=(1, 10, 100, 1000, 10000, 100000),
+)
+
+CATALOG_LOOKUPS_TOTAL = Counter(
+    name="catalog_lookups_total",
+    documentation="Total count of in-process catalog lookups, by catalog and cache result",
+    labelnames=("catalog", "result"),
+)
+
+
+# Bound metric children are cached for at most this many (method, path template)
+# pairs. Requests beyond that, e.g. for arbitrary unknown paths, bind per request.
+MAX_BOUND_METRICS = 1000
+
+
+class BoundMetrics:
+    """The children of the HTTP metrics for a (method, path template) pair.
+
+    Looking up the child of a labeled metric hashes the label values and takes
+    the lock of the metric, so the children are bound once and reused.
+    """
+
+    __slots__ = (
+        "method",
+        "path_template",
+        "requests_total",
+        "requests_active",
+        "requests_latency",
+        "responses_bytes",
+        "_responses_total",
+    )
+
+    def __init__(self, method: str, path_template: str) -> None:
+        self.method = method
+        self.path_template = path_template
+        self.requests_total = HTTP_REQUESTS_TOTAL.labels(method=method, path_template=path_template)
+        self.requests_active = HTTP_REQUESTS_ACTIVE.labels(
+            method=method, path_template=path_template
+        )
+        self.requests_latency = HTTP_REQUESTS_LATENCY.labels(
+            method=method, path_template=path_template
+        )
+        self.responses_bytes = HTTP_RESPONSES_BYTES.labels(
+            method=method, path_template=path_template
+        )
+        self._responses_total: Dict[int, Any] = {}
+
+    def responses_total(self, status_code: int) -> Any:
+        """Get the child of the responses counter for a status code."""
+        child = self._responses_total.get(status_code)
+
+        if child is None:
+            child = HTTP_RESPONSES_TOTAL.labels(
+                method=self.method, path_template=self.path_template, status_code=status_code
+            )
+            self._responses_total[status_code] = child
+
+        return child
+
+    def errors_total(self, error_type: str) -> Any:
+        """Get the child of the errors counter for an error type."""
+        return HTTP_ERRORS_TOTAL.labels(
+            method=self.method, path_template=self.path_template, error_type=error_type
+        )
+
+
+_bound_metrics: Dict[Tuple[str, str], BoundMetrics] = {}
+
+
+def bound_metrics(method: str, path_template: str) -> BoundMetrics:
+    """Get the bound HTTP metrics for a (method, path template) pair.
+
+    Args:
+        method: The request method.
+        path_template: The request path template.
+
+    Returns:
+        The bound metrics.
+    """
+    bound = _bound_metrics.get((method, path_template))
+
+    if bound is None:
+        bound = BoundMetrics(method, path_template)
+
+        if len(_bound_metrics) < MAX_BOUND_METRICS:
+            _bound_metrics[(method, path_template)] = bound
+
+    return bound
+
+
+class Recorder:
+    """Records the HTTP metrics of requests as they happen."""
+
+    def request_started(self, bound: BoundMetrics) -> None:
+        bound.requests_total.inc()
+        bound.requests_active.inc()
+
+    def response_started(self, bound: BoundMetrics, status_code: int, latency: float) -> None:
+        bound.requests_latency.observe(latency)
+        bound.responses_total(status_code).inc()
+
+    def response_completed(self, bound: BoundMetrics, body_bytes: int) -> None:
+        bound.responses_bytes.inc(body_bytes)
+
+    def request_failed(self, bound: BoundMetrics, error_type: str) -> None:
+        bound.errors_total(error_type).inc()
+
+    def request_finished(self, bound: BoundMetrics) -> None:
+        bound.requests_active.dec()
+
+    def flush(self) -> None:
+        """Apply any recorded values which are not yet applied to the metrics."""
+
+    def start(self) -> None:
+        """Start applying recorded values in the background, if they are buffered."""
+
+    def stop(self) -> None:
+        """Stop applying recorded values in the background."""
+
+
+class _Pending:
+    """The running totals recorded for a (method, path template) pair by the
+    buffered recorder, and the totals which were already applied to the metrics.
+    """
+
+    __slots__ = ("started", "finished", "body_bytes", "latencies", "responses", "errors", "applied")
+
+    def __init__(self) -> None:
+        self.started = 0
+        self.finished = 0
+        self.body_bytes = 0
+        self.latencies: List[float] = []
+        self.responses: Dict[int, int] = {}
+        self.errors: Dict[str, int] = {}
+        self.applied: Dict[Any, int] = {}
+
+    def delta(self, key: Any, total: int) -> int:
+        """Get the part of a running total which is not yet applied, and mark it applied."""
+        delta = total - self.applied.get(key, 0)
+        self.applied[key] = total
+
+        return delta
+
+
+class BufferedRecorder(Recorder):
+    """Records the HTTP metrics of requests as plain running totals, and applies
+    them to the metrics in bulk.
+
+    Recording a request only updates a few plain integers and appends the latency
+    to a list, without label lookups or locks. Totals are only ever increased by
+    the event loop, and flushing applies the difference to what it last applied,
+    so a scrape running in another thread never loses an update.
+
+    The buffer is flushed before the metrics are scraped, and every flush interval
+    by a background thread run between `start` and `stop`, so scraped values are
+    exact, while the values in between lag by up to the interval, even while no
+    requests are served.
+    """
+
+    def __init__(self, flush_interval: float) -> None:
+        self.flush_interval = flush_interval
+        self._pending: Dict[BoundMetrics, _Pending] = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def _get(self, bound: BoundMetrics) -> _Pending:
+        pending = self._pending.get(bound)
+
+        if pending is None:
+            pending = self._pending[bound] = _Pending()
+
+        return pending
+
+    def request_started(self, bound: BoundMetrics) -> None:
+        self._get(bound).started += 1
+
+    def response_started(self, bound: BoundMetrics, status_code: int, latency: float) -> None:
+        pending = self._get(bound)
+        pending.latencies.append(latency)
+        pending.responses[status_code] = pending.responses.get(status_code, 0) + 1
+
+    def response_completed(self, bound: BoundMetrics, body_bytes: int) -> None:
+        self._get(bound).body_bytes += body_bytes
+
+    def request_failed(self, bound: BoundMetrics, error_type: str) -> None:
+        pending = self._get(bound)
+        pending.errors[error_type] = pending.errors.get(error_type, 0) + 1
+
+    def request_finished(self, bound: BoundMetrics) -> None:
+        self._get(bound).finished += 1
+
+    def start(self) -> None:
+        stopped = self._stopped = threading.Event()
+
+        def run() -> None:
+            while not stopped.wait(self.flush_interval):
+                try:
+                    self.flush()
+                except Exception as e:
+                    logger.error("failed to flush buffered metrics", error=str(e))
+
+        threading.Thread(target=run, name="metrics-flush", daemon=True).start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    def flush(self) -> None:
+        with self._lock:
+            for bound, pending in list(self._pending.items()):
+                started = pending.delta("started", pending.started)
+                finished = pending.delta("finished", pending.finished)
+
+                if started:
+                    bound.requests_total.inc(started)
+
+                if started != finished:
+                    bound.requests_active.inc(started - finished)
+
+                body_bytes = pending.delta("body_bytes", pending.body_bytes)
+
+                if body_bytes:
+                    bound.responses_bytes.inc(body_bytes)
+
+                for status_code, total in list(pending.responses.items()):
+                    count = pending.delta(status_code, total)
+
+                    if count:
+                        bound.responses_total(status_code).inc(count)
+
+                for error_type, total in list(pending.errors.items()):
+                    count = pending.delta(("error", error_type), total)
+
+                    if count:
+                        bound.errors_total(error_type).inc(count)
+
+                latencies = pending.latencies
+                count = len(latencies)
+
+                for latency in latencies[:count]:
+                    bound.requests_latency.observe(latency)
+
+                del latencies[:count]
+
+
+def record_query_stats(stats: QueryStats, path_template: str) -> None:
+    """Record the SQL statements run while handling a request.
+
+    A warning is logged when the request ran more statements than the query budget,
+    which usually means that something is fetched per resource rather than in bulk.
+
+    Args:
+        stats: The stats of the request.
+        path_template: The route template of the request.
+    """
+    if not stats.queries:
+        return
+
+    resource = stats.resource or "none"
+    operation = stats.operation or "none"
+
+    DB_REQUEST_QUERIES.labels(resource=resource, operation=operation).observe(stats.queries)
+    DB_REQUEST_DURATION.labels(resource=resource, operation=operation).observe(stats.duration)
+    DB_REQUEST_ROWS.labels(resource=resource, operation=operation).observe(stats.rows)
+
+    if settings.db_query_budget and stats.queries > settings.db_query_budget:
+        logger.warning(
+            "request exceeded the query budget",
+            path_template=path_template,
+            resource=resource,
+            operation=operation,
+            queries=stats.queries,
+            budget=settings.db_query_budget,
+            duration=round(stats.duration, 6),
+            rows=stats.rows,
+        )
+
+
 def register(app: FastAPI) -> None:
     """Register the PrometheusMiddleware and metrics route with an application."""
     app.add_middleware(PrometheusMiddleware)
@@ -62,13 +411,53 @@ def register(app: FastAPI) -> None:
 
 
 def metrics(request: Request) -> Response:
-    """Request handler for the route which serves Prometheus application metrics."""
-    return Response(generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
+    """Request handler for the route which serves Prometheus application metrics.
+
+    In multiprocess mode, the metrics of all of the live worker processes are
+    aggregated, whichever process serves the scrape. Only this process flushes its
+    buffered metrics first: those of the other processes are included as of their
+    last timed flush, at most a flush interval ago.
+    """
+    recorder.flush()
+
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+
+
+def startup() -> None:
+    """Start flushing buffered metrics every flush interval, if they are buffered.
+
+    In multiprocess mode, the metrics are also flushed to the shared files when the
+    process exits, should it exit without the shutdown event.
+    """
+    recorder.start()
+
+    if MULTIPROC_DIR:
+        atexit.register(recorder.flush)
+
+
+def shutdown() -> None:
+    """Stop flushing buffered metrics, apply any which are left and, in multiprocess
+    mode, retire the metrics of this process.
+
+    The live gauges of a process which exits are no longer aggregated, while its
+    counters and histograms remain part of the totals.
+    """
+    recorder.stop()
+    recorder.flush()
+
+    if MULTIPROC_DIR:
+        multiprocess.mark_process_dead(os.getpid())
 
 
 class PrometheusMiddleware:
     """Application middleware which collects application-level metrics on requests,
-    responses, and errors.
+    responses, errors, and the SQL statements run for them.
     """
 
     def __init__(self, app: ASGIApp) -> None:
@@ -79,11 +468,12 @@ class PrometheusMiddleware:
             await self.app(scope, receive, send)
             return
 
-        method = scope["method"]
-        path_template = utils.get_request_route(scope)
+        bound = bound_metrics(scope["method"], utils.get_request_route(scope))
+
+        recorder.request_started(bound)
 
-        HTTP_REQUESTS_TOTAL.labels(method=method, path_template=path_template).inc()
-        HTTP_REQUESTS_ACTIVE.labels(method=method, path_template=path_template).inc()
+        stats = QueryStats()
+        token = query_stats.set(stats)
 
         before = time.perf_counter()
 
@@ -91,15 +481,7 @@ class PrometheusMiddleware:
             message_type = message["type"]
 
             if message_type == "http.response.start":
-                after = time.perf_counter()
-                status_code = message["status"]
-
-                HTTP_REQUESTS_LATENCY.labels(method=method, path_template=path_template).observe(
-                    after - before
-                )
-                HTTP_RESPONSES_TOTAL.labels(
-                    method=method, path_template=path_template, status_code=status_code
-                ).inc()
+                recorder.response_started(bound, message["status"], time.perf_counter() - before)
 
             elif message_type == "http.response.body":
                 body = message.get("body", b"")
@@ -107,21 +489,26 @@ class PrometheusMiddleware:
 
                 if not more_body:
                     # The response is complete - there is no more body data being streamed.
-                    HTTP_RESPONSES_BYTES.labels(
-                        method=method,
-                        path_template=path_template,
-                    ).inc(len(body))
+                    recorder.response_completed(bound, len(body))
 
             await send(message)  # pragma: nocover
 
         try:
             await self.app(scope, receive, send_wrapper)
         except Exception as exc:
-            HTTP_ERRORS_TOTAL.labels(
-                method=method,
-                path_template=path_template,
-                error_type=type(exc).__name__,
-            ).inc()
+            recorder.request_failed(bound, type(exc).__name__)
             raise exc
         finally:
-            HTTP_REQUESTS_ACTIVE.labels(method=method, path_template=path_template).dec()
+            recorder.request_finished(bound)
+
+            query_stats.reset(token)
+            record_query_stats(stats, bound.path_template)
+
+
+# The recorder used by the middleware, as configured.
+recorder: Recorder = (
+    BufferedRecorder(settings.metrics_flush_interval) if settings.metrics_buffered else Recorder()
+)
+
+
+from ..utils import utils  # noqa: E402
@@ -0,0 +1,37 @@
+"""Pinning of requests to a generation of the database schema."""
+
+from fastapi import FastAPI
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from ..db.reflection import schema_generation, schema_reflector
+
+
+def register(app: FastAPI) -> None:
+    """Register the SchemaGenerationMiddleware with an application.
+
+    It must be registered after any other middleware which uses the schema, so
+    that it wraps them.
+    """
+    app.add_middleware(SchemaGenerationMiddleware)
+
+
+class SchemaGenerationMiddleware:
+    """Application middleware which pins each request to the current generation of
+    the database schema, so that a schema reload never changes the tables, statements
+    or models a request is served with while it is in flight.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        token = schema_generation.set(schema_reflector.current())
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            schema_generation.reset(token)
@@ -0,0 +1,122 @@
+"""In-process registry of the generated schema models of each table."""
+import threading
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from containerlog import get_logger
+
+logger = get_logger()
+
+__all__ = [
+    "SchemaModelRegistry",
+    "schema_model_registry",
+]
+
+
+class SchemaModelRegistry:
+    """Registry of the `ModelReturn`, `ModelPayload` and `ModelOptPayload` models of
+    each table.
+
+    The models of a table are generated once and kept in the `info` of the table,
+    so tables of different schema generations each keep their own models. Each
+    entry records a fingerprint of everything else its models were generated
+    from: whether the table has operations, and its relationships, as read from
+    the in-process catalogs. When a catalog changes, only the entries whose
+    fingerprint no longer matches are generated again.
+
+    Fingerprints are taken from the snapshots the catalogs already hold, so a
+    lookup never reloads a catalog: requests reload them off the event loop
+    beforehand. While a catalog has no snapshot, the existing models are served.
+    """
+
+    def __init__(self) -> None:
+        # The key of the models in the info of a table, unique to the registry.
+        self._key = object()
+        self._lock = threading.Lock()
+
+    def build(self, table_names: Iterable[str]) -> None:
+        """Generate the models of a set of tables ahead of their first use.
+
+        Args:
+            table_names: The names of the tables to generate models for.
+        """
+        count = 0
+
+        for table_name in table_names:
+            self.get(table_name)
+            count += 1
+
+        logger.debug("built schema model registry", count=count)
+
+    def clear(self) -> None:
+        """Drop all of the generated models."""
+        with self._lock:
+            self._key = object()
+
+    def get(self, table_name: str) -> Dict[str, Any]:
+        """Get the models of a table, generating them if they are missing or stale.
+
+        Args:
+            table_name: The name of the table to get the models of.
+
+        Returns:
+            The models of the table, or an empty dict if the table has none.
+        """
+        table = table_from_name(table_name)
+
+        if table is None:
+            return {}
+
+        key = self._key
+        fingerprint = self._fingerprint(table_name)
+
+        entry = table.info.get(key)
+
+        if entry is not None and fingerprint in (None, entry[0]):
+            return entry[1]
+
+        with self._lock:
+            entry = table.info.get(key)
+
+            if entry is not None and fingerprint in (None, entry[0]):
+                return entry[1]
+
+            models = build_schema_models(table_name)
+
+            # Generating the models loads the catalogs they are generated from.
+            table.info[key] = (self._fingerprint(table_name), models)
+
+        logger.debug("generated schema models", table=table_name)
+
+        return models
+
+    @staticmethod
+    def _fingerprint(table_name: str) -> Optional[Tuple[Any, ...]]:
+        operations = operations_catalog.peek()
+        relationship_index = relationship_catalog.peek()
+
+        if operations is None or relationship_index is None:
+            return None
+
+        relationships = tuple(
+            (
+                relationship["primary_table_name"],
+                relationship["secondary_table_name"],
+                relationship["associative_table_name"] is not None,
+            )
+            for relationship in relationship_index.by_table.get(table_name, [])
+        )
+
+        return (
+            settings.suppress_abstract_table_docs,
+            operations.get(table_name, {}) != {},
+            relationships,
+        )
+
+
+# Global registry shared by the generic routes and docs generation.
+schema_model_registry = SchemaModelRegistry()
+
+
+from ...core.config import settings  # noqa: E402
+from ...db.exc.catalog import operations_catalog, relationship_catalog  # noqa: E402
+from ...utils.utils import build_schema_models, table_from_name  # noqa: E402
@@ -0,0 +1,173 @@
+"""Resolution of request paths to the route templates used as metric labels."""
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+from weakref import WeakKeyDictionary
+
+from starlette.routing import Match
+from starlette.types import Scope
+
+__all__ = [
+    "RouteResolver",
+    "resolve_route",
+]
+
+
+class _Node:
+    """A node of the prefix trie of parameterized routes."""
+
+    __slots__ = ("children", "routes")
+
+    def __init__(self) -> None:
+        self.children: Dict[str, "_Node"] = {}
+        self.routes: List[Tuple[int, Any]] = []
+
+
+class RouteResolver:
+    """Resolves request paths to the templates of the routes of an application.
+
+    Routes without path parameters are looked up in a dict by their exact path.
+    Parameterized routes are stored in a trie under the static path segments
+    which precede their first parameter, so only the few routes which share a
+    prefix with the request path are matched against it, rather than every
+    route of the application. Of the candidates, the first route in application
+    order which fully matches wins, as it does in the router.
+
+    Requests handled by the generic routes are labeled with the resource they
+    resolve to, e.g. `/v1/users` or `/v1/users/{id}`, which keeps the number of
+    labels bounded by the number of tables.
+    """
+
+    def __init__(self, routes: List[Any]) -> None:
+        self.route_count = len(routes)
+        self._exact: Dict[str, List[Tuple[int, Any]]] = {}
+        self._root = _Node()
+
+        for index, route in enumerate(routes):
+            # Mounts only have their parameters in the path format.
+            path = getattr(route, "path_format", None) or getattr(route, "path", None)
+
+            if path is None:
+                self._root.routes.append((index, route))
+            elif "{" not in path:
+                self._exact.setdefault(path, []).append((index, route))
+            else:
+                node = self._root
+
+                for segment in path[: path.index("{")].split("/")[1:-1]:
+                    node = node.children.setdefault(segment, _Node())
+
+                node.routes.append((index, route))
+
+    def candidates(self, path: str) -> List[Any]:
+        """Get the routes which may match a path, in application order.
+
+        Args:
+            path: The request path.
+
+        Returns:
+            The candidate routes.
+        """
+        candidates = list(self._exact.get(path, ()))
+
+        node: Optional[_Node] = self._root
+
+        segments = path.split("/")[1:]
+
+        for segment in segments:
+            candidates.extend(node.routes)  # type: ignore
+
+            node = node.children.get(segment)  # type: ignore
+
+            if node is None:
+                break
+        else:
+            candidates.extend(node.routes)  # type: ignore
+
+        candidates.sort(key=lambda candidate: candidate[0])
+
+        return [route for _, route in candidates]
+
+    def resolve(self, scope: Scope) -> Optional[str]:
+        """Get the template of the route which handles a request.
+
+        Args:
+            scope: The request scope.
+
+        Returns:
+            The route template, or None if no route fully matches the request.
+        """
+        for route in self.candidates(scope["path"]):
+            match, child_scope = route.matches(scope)
+
+            if match == Match.FULL:
+                return generic_route_template(route.path, child_scope) or route.path
+
+        return None
+
+
+def generic_route_template(route_path: str, child_scope: Scope) -> Optional[str]:
+    """Get the template of a request to a generic route, by resource.
+
+    Args:
+        route_path: The template of the generic route.
+        child_scope: The scope of the route match.
+
+    Returns:
+        The template for the resource, or None if the route is not a generic route,
+        or the path does not resolve to a resource.
+    """
+    path_params = child_scope.get("path_params", {})
+
+    full_path = path_params.get("full_path")
+
+    if full_path is None:
+        return None
+
+    resource_name, _, rest = full_path.partition("/")
+
+    resource = dispatcher.get(resource_name)
+
+    if resource is None:
+        return None
+
+    prefix = route_path[: route_path.index("{full_path")]
+
+    template = prefix + resource.name
+
+    if rest.rstrip("/") or "resource_id" in path_params:
+        return template + "/{id}"
+
+    return template
+
+
+_resolvers: "WeakKeyDictionary[Any, RouteResolver]" = WeakKeyDictionary()
+_lock = threading.Lock()
+
+
+def resolve_route(app: Any, scope: Scope) -> Optional[str]:
+    """Get the template of the route of an application which handles a request.
+
+    The resolver of an application is built on first use, and rebuilt if routes
+    are added to the application afterwards.
+
+    Args:
+        app: The application.
+        scope: The request scope.
+
+    Returns:
+        The route template, or None if no route fully matches the request.
+    """
+    routes = app.routes
+
+    resolver = _resolvers.get(app)
+
+    if resolver is None or resolver.route_count != len(routes):
+        resolver = RouteResolver(routes)
+
+        with _lock:
+            _resolvers[app] = resolver
+
+    return resolver.resolve(scope)
+
+
+from ..api.generic.dispatch import dispatcher  # noqa: E402
@@ -1,5 +1,4 @@
 """General application utility functions."""
-import json
 from datetime import datetime
 from typing import Any, Dict, List
 from uuid import UUID
@@ -7,14 +6,12 @@ from uuid import UUID
 from containerlog import get_logger
 from pydantic import BaseConfig, create_model
 from pydantic.config import Extra
-from sqlalchemy import and_, or_, select  # type: ignore
 from sqlalchemy.engine import Row  # type: ignore
 from sqlalchemy.sql.elements import TextClause  # type: ignore
-from starlette.routing import Match
 from starlette.types import Scope
 
 from ..core.config import settings
-from ..db.session import SessionLocal, metadata
+from ..db.reflection import schema_reflector
 from ..validators.timestamp import RFC3339Timestamp
 
 logger = get_logger()
@@ -23,16 +20,17 @@ __all__ = [
     "get_request_route",
     "dict_from_row",
     "get_schema_models",
+    "build_schema_models",
     "table_from_name",
-    "generate_custom_openapi_paths",
-    "generate_custom_openapi_schemas",
-    "generate_custom_openapi_tags",
 ]
 
 
 def get_request_route(scope: Scope) -> str:
     """Get the name of the request route or route template.
 
+    Requests to the generic routes get the template of the resource they are
+    for, e.g. `/v1/users/{id}`.
+
     Args:
         scope: The request scope to get the route name/template from.
 
@@ -42,10 +40,9 @@ def get_request_route(scope: Scope) -> str:
     url_path = scope.get("root_path", "") + scope["path"]
     app = scope.get("app")
     if app:
-        for route in app.routes:
-            match, _ = route.matches(scope)
-            if match == Match.FULL:
-                return route.path
+        route_path = resolve_route(app, scope)
+        if route_path is not None:
+            return route_path
     return url_path
 
 
@@ -61,10 +58,12 @@ def dict_from_row(row: Row) -> Dict:
     built_obj = {}
 
     for key in row._fields:
+        # Reflected column names are `quoted_name`s, which are plain strings to
+        # everything but the JSON encoder.
         if isinstance(row[key], datetime):
-            built_obj[key] = row[key].isoformat(sep="T")
+            built_obj[str(key)] = row[key].isoformat(sep="T")
         else:
-            built_obj[key] = row[key]
+            built_obj[str(key)] = row[key]
 
     return built_obj
 
@@ -90,12 +89,27 @@ def table_from_name(table_name: str):
     Returns:
         The fetched table.
     """
-    return metadata.tables.get(table_name)
+    return schema_reflector.tables.get(table_name)
 
 
 def get_schema_models(table_name: str):
     """Get schema models for custom openapi generation.
 
+    Models are served from the schema model registry, and are only generated
+    again when the table, its operations or its relationships change.
+
+    Args:
+        table_name: The table name to get schema models for.
+
+    Returns:
+        The schema models.
+    """
+    return schema_model_registry.get(table_name)
+
+
+def build_schema_models(table_name: str):
+    """Generate the schema models of a table.
+
     Args:
         table_name: The table name to generate schema models from.
 
@@ -106,15 +120,11 @@ def get_schema_models(table_name: str):
         if table_name in ["relationships", "operations"]:
             return {}
 
-    db = SessionLocal()
-
-    operations = executioner.get_operations(table_name, db)
+    operations = operations_catalog.for_table(table_name)
 
     if table_name not in ["relationships", "operations"] and operations == {}:
         return {}
 
-    db.close()
-
     return_fields = {}
     payload_fields = {}
     opt_payload_fields = {}
@@ -126,24 +136,7 @@ def get_schema_models(table_name: str):
     if table == None:
         return {}
 
-    relationships = []
-
-    with SessionLocal() as db:
-        relationships_table = table_from_name("relationships")
-
-        stmt = select(relationships_table).where(
-            or_(
-                relationships_table.c.primary_table_name == table_name,
-                and_(
-                    relationships_table.c.secondary_table_name == table_name,
-                    relationships_table.c.associative_table_name != None,
-                ),
-            ),
-        )
-
-        results = db.execute(stmt).fetchall()
-
-        relationships = [dict_from_row(result) for result in results]
+    relationships = relationship_catalog.for_table(table_name)
 
     for col in table.c:
         col_name = str(col.name)
@@ -236,57 +229,6 @@ def python_type_from_col(col: Any):
     return col.type.python_type
 
 
-def generate_custom_openapi_paths():
-    """Generate custom openapi paths for use in generation.
-
-    Returns:
-        The custom openapi paths.
-    """
-    new_paths = {}
-    for table_name in metadata.tables.keys():
-        for path, definition in get_paths(table_name).items():
-            new_paths[path] = definition
-
-    return new_paths
-
-
-def generate_custom_openapi_schemas():
-    """Generate custom openapi schemas for use in generation.
-
-    Returns:
-        The custom openapi schemas.
-    """
-    new_schemas = {}
-    for table_name in metadata.tables.keys():
-        for schema_name, definition in get_schemas(table_name).items():
-            new_schemas[schema_name] = definition
-
-    return new_schemas
-
-
-def generate_custom_openapi_tags():
-    """Generate custom openapi tags for use in generation.
-
-    Returns:
-        The custom openapi tags.
-    """
-    new_tags = []
-
-    with open("dev/tags.json") as f:
-        tag_json = json.load(f)
-
-    for table_name in metadata.tables.keys():
-        table_name_camel = snake_to_camel(table_name)
-
-        if table_name in tag_json.keys():
-            new_tags.append({
-                "name": table_name_camel,
-                "description": tag_json[table_name],
-            })
-
-    return new_tags
-
-
 def split_rtrim(text: str, delimiter: str):
     """Split and trim the right of a string.
 
@@ -305,5 +247,6 @@ def split_rtrim(text: str, delimiter: str):
     return split_text
 
 
-from ..db.exc import executioner # noqa: E402
-from ..docs.utils import get_paths, get_schemas  # noqa: E402
+from ..db.exc.catalog import operations_catalog, relationship_catalog  # noqa: E402
+from ..schema.v1.registry import schema_model_registry  # noqa: E402
+from .routing import resolve_route  # noqa: E402